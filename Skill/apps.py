@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SkillConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Skill'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,159 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Skill
+
+
+# In-memory prefix and trigram index over Skill.name. The skill table is small
+# and read on every keystroke, so each process keeps its own copy: it is marked
+# stale by the receivers in Skill.signals and rebuilt at most every
+# SKILL_INDEX_TTL seconds to pick up changes made by other processes.
+
+MIN_SIMILARITY = 0.25
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SkillIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stale = True
+        self.built_at = 0.0
+        self.skills = {}
+        self.prefixes = []
+        self.grams = {}
+        self.terms = {}
+
+    def invalidate(self):
+        self.stale = True
+
+    def ensure_built(self):
+        if self.stale or time.monotonic() - self.built_at > settings.SKILL_INDEX_TTL:
+            with self.lock:
+                if self.stale or time.monotonic() - self.built_at > settings.SKILL_INDEX_TTL:
+                    self.build()
+
+    def build(self):
+        # Clear the flag first so a change made while building marks it stale again
+        self.stale = False
+        rows = Skill.objects.annotate(user_count=Count('users_offering')).values_list('id', 'name', 'user_count')
+
+        skills = {}
+        prefixes = []
+        grams = defaultdict(list)
+        terms = {}
+        for skill_id, name, user_count in rows:
+            key = normalize(name)
+            skills[skill_id] = (name, key, user_count)
+            # Match the whole name and every word in it: "des" finds "Web Design"
+            words = key.split()
+            prefixes.extend((' '.join(words[i:]), skill_id) for i in range(len(words)))
+            # Typos are scored per word (and against the whole name for
+            # multi-word queries) so long names are not penalised
+            for term in set(words + [key]):
+                if term not in terms:
+                    term_grams = trigrams(term)
+                    for gram in term_grams:
+                        grams[gram].append(term)
+                    terms[term] = (len(term_grams), [])
+                terms[term][1].append(skill_id)
+
+        prefixes.sort()
+        self.skills, self.prefixes, self.grams, self.terms = skills, prefixes, dict(grams), terms
+        self.built_at = time.monotonic()
+
+    def prefix_matches(self, query):
+        matches = set()
+        position = bisect_left(self.prefixes, (query,))
+        while position < len(self.prefixes) and self.prefixes[position][0].startswith(query):
+            matches.add(self.prefixes[position][1])
+            position += 1
+        return matches
+
+    def fuzzy_matches(self, query):
+        """
+        Skill ids whose names share enough trigrams with ``query``, with their
+        similarity; this is what catches typos.
+        """
+        query_grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for term in self.grams.get(gram, ()):
+                shared[term] += 1
+
+        matches = {}
+        for term, count in shared.items():
+            term_grams, skill_ids = self.terms[term]
+            similarity = count / (len(query_grams) + term_grams - count)
+            if similarity < MIN_SIMILARITY:
+                continue
+            for skill_id in skill_ids:
+                if similarity > matches.get(skill_id, 0):
+                    matches[skill_id] = similarity
+        return matches
+
+    def complete(self, query, limit=10):
+        """
+        Top ``limit`` skills for an autocomplete box as (id, name, user_count),
+        prefix matches first, then close misspellings.
+        """
+        self.ensure_built()
+        query = normalize(query)
+        if not query:
+            return []
+
+        prefix = self.prefix_matches(query)
+        ranked = heapq.nsmallest(limit, prefix, key=lambda skill_id: (-self.skills[skill_id][2], self.skills[skill_id][0]))
+
+        if len(ranked) < limit:
+            fuzzy = self.fuzzy_matches(query)
+            ranked += heapq.nsmallest(
+                limit - len(ranked),
+                (skill_id for skill_id in fuzzy if skill_id not in prefix),
+                key=lambda skill_id: (-fuzzy[skill_id], -self.skills[skill_id][2]),
+            )
+
+        return [(skill_id, self.skills[skill_id][0], self.skills[skill_id][2]) for skill_id in ranked[:limit]]
+
+    def resolve(self, query):
+        """
+        Skill ids for a free-text skill search: every name containing the query,
+        or the closest misspellings when nothing contains it.
+        """
+        self.ensure_built()
+        query = normalize(query)
+        if not query:
+            return list(self.skills)
+
+        matches = [skill_id for skill_id, (_, key, _) in self.skills.items() if query in key]
+        if not matches:
+            matches = list(self.fuzzy_matches(query))
+        return matches
+
+    def names(self, skill_ids):
+        """
+        Names of ``skill_ids``, from the index when it knows them.
+        """
+        self.ensure_built()
+        names = {skill_id: self.skills[skill_id][0] for skill_id in skill_ids if skill_id in self.skills}
+        unknown = set(skill_ids) - names.keys()
+        if unknown:
+            # Created by another process since the last build
+            names.update(Skill.objects.filter(id__in=unknown).values_list('id', 'name'))
+        return [names[skill_id] for skill_id in skill_ids if skill_id in names]
+
+
+skill_index = SkillIndex()
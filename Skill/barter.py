@@ -0,0 +1,142 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cycles import find_cycles, scan_rows
+from .matchmaking import get_executor, match_engine
+from .models import BarterCycle, BarterCycleMember, BarterCycleScan
+
+logger = logging.getLogger(__name__)
+
+
+# Stored barter cycles (see Skill.cycles for the search). Each user's cycles
+# are cached in BarterCycle with a BarterCycleScan row recording the search.
+# A skill change drops the scans of the user and of everyone whose cycles
+# include them, and scans older than BARTER_CYCLE_TTL expire. A request that
+# finds its scan missing or expired gets the cycles stored last time and
+# queues a new search on the matchmaking worker, so no request waits for the
+# match matrix to build. find_barter_cycles searches every user at once across
+# a process pool.
+
+
+def invalidate_cycles(user_ids):
+    owners = BarterCycleMember.objects.filter(user_id__in=user_ids).values('cycle__user_id')
+    BarterCycleScan.objects.filter(Q(user_id__in=user_ids) | Q(user_id__in=owners)).delete()
+
+
+def _cycle_objects(user_id, cycles, ids):
+    # ``cycles`` hold matrix rows; ``ids`` maps them to users
+    return [
+        (BarterCycle(user_id=user_id, length=len(cycle)), [int(ids[row]) for row in cycle])
+        for cycle in cycles
+    ]
+
+
+def _store(user_ids, objects, scanned_at):
+    BarterCycle.objects.filter(user_id__in=user_ids).delete()
+    BarterCycle.objects.bulk_create([cycle for cycle, _ in objects], batch_size=1000)
+    BarterCycleMember.objects.bulk_create([
+        BarterCycleMember(cycle=cycle, user_id=member_id, position=position)
+        for cycle, member_ids in objects
+        for position, member_id in enumerate(member_ids)
+    ], batch_size=1000)
+    BarterCycleScan.objects.bulk_create(
+        [BarterCycleScan(user_id=user_id, scanned_at=scanned_at) for user_id in user_ids],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['scanned_at'],
+    )
+
+
+def scan_user(user_id):
+    """
+    Search ``user_id``'s cycles now and store them.
+    """
+    match_engine.ensure_built()
+    # Other users' skills may lag by up to MATCH_INDEX_TTL, but never the user's own
+    match_engine.reload_user(user_id)
+    ids, rows, offered, needed = match_engine.snapshot()
+
+    row = rows.get(user_id)
+    cycles = find_cycles(row, offered, needed, settings.BARTER_CYCLES_PER_USER) if row is not None else []
+    with transaction.atomic():
+        _store([user_id], _cycle_objects(user_id, cycles, ids), timezone.now())
+
+
+_scanning = set()
+_scanning_lock = threading.Lock()
+
+
+def _run_scan(user_id):
+    close_old_connections()
+    try:
+        scan_user(user_id)
+    except Exception:
+        logger.exception('Barter cycle scan failed for user %s', user_id)
+    finally:
+        with _scanning_lock:
+            _scanning.discard(user_id)
+        close_old_connections()
+
+
+def schedule_scan(user_id):
+    """
+    Search ``user_id``'s cycles on the matchmaking worker once the current
+    transaction commits, unless a search for them is already queued.
+    """
+    def submit():
+        with _scanning_lock:
+            if user_id in _scanning:
+                return
+            _scanning.add(user_id)
+        get_executor().submit(_run_scan, user_id)
+
+    transaction.on_commit(submit)
+
+
+def get_cycles(user):
+    """
+    ``user``'s stored cycles, queueing a new search if they are missing or stale.
+    """
+    fresh_after = timezone.now() - timedelta(seconds=settings.BARTER_CYCLE_TTL)
+    if not BarterCycleScan.objects.filter(user=user, scanned_at__gte=fresh_after).exists():
+        schedule_scan(user.id)
+    return BarterCycle.objects.filter(user=user)
+
+
+def rebuild_cycles(workers=1, batch_size=1000):
+    """
+    Search every user's cycles. Returns the number of users with cycles.
+    """
+    with match_engine.lock:
+        match_engine.build()
+    ids, _, offered, needed = match_engine.snapshot()
+
+    # Only users who offer and need something can be in a cycle
+    rows = [int(row) for row in (offered.any(axis=1) & needed.any(axis=1)).nonzero()[0]]
+    scanned_at = timezone.now()
+
+    with transaction.atomic():
+        BarterCycle.objects.all().delete()
+        BarterCycleScan.objects.all().delete()
+
+    users = 0
+    user_ids, objects = [], []
+    for row, cycles in scan_rows(rows, offered, needed, settings.BARTER_CYCLES_PER_USER, workers=workers):
+        user_id = int(ids[row])
+        users += bool(cycles)
+        user_ids.append(user_id)
+        objects.extend(_cycle_objects(user_id, cycles, ids))
+        if len(user_ids) >= batch_size:
+            with transaction.atomic():
+                _store(user_ids, objects, scanned_at)
+            user_ids, objects = [], []
+    with transaction.atomic():
+        _store(user_ids, objects, scanned_at)
+    return users
@@ -0,0 +1,27 @@
+import numpy as np
+
+
+# Packed bit matrices over skill bitsets (see Skill.skillsets): one row per
+# user, padded to whole 64-bit words. Plain numpy with no Django imports, so
+# pool worker processes can load it on their own.
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(matrix):
+        # Rows are padded to whole 64-bit words, so count a word at a time
+        return np.bitwise_count(matrix.view(np.uint64)).sum(axis=-1, dtype=np.int64)
+else:
+    POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+    def popcount(matrix):
+        return POPCOUNT[matrix].sum(axis=-1, dtype=np.int64)
+
+
+def row_width(size):
+    return max(-(-size // 8) * 8, 8)
+
+
+def as_row(bits, width):
+    row = np.zeros(width, dtype=np.uint8)
+    data = np.frombuffer(bytes(bits or b''), dtype=np.uint8)[:width]
+    row[:len(data)] = data
+    return row
@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from .bitmatrix import popcount
+
+
+# Multi-party barter cycles. User A "can serve" user B when A offers a skill B
+# needs; a cycle A -> B -> C -> A is a barter that closes even though no two
+# of its members match each other. The graph is never materialised: its edges
+# are read off the packed offered/needed matrices of Skill.bitmatrix, one AND
+# per expansion. A search starts with a backwards breadth-first pass from the
+# user, one matrix operation per hop, so the depth-first walk only steps onto
+# users that can still get back in the hops left. Shorter cycles come first and
+# stronger links (more skills exchanged) are tried first.
+#
+# Like Skill.bitmatrix this module imports nothing from Django: the batch scan
+# hands the matrices to a process pool once, in the worker initializer, and the
+# workers send back rows. Skill.barter maps rows to users and stores results.
+
+MIN_LENGTH = 3
+MAX_LENGTH = 5
+# Expansions per search before settling for the cycles found so far
+SEARCH_BUDGET = 5000
+
+
+def distances_to(row, offered, needed, depth):
+    """
+    Fewest "can serve" hops from every user to ``row``, up to ``depth``; -1
+    for users further away.
+    """
+    distance = np.full(len(offered), -1, dtype=np.int8)
+    distance[row] = 0
+    # Serving anyone in the frontier means offering one of their combined needs
+    frontier_needs = needed[row]
+    for hops in range(1, depth + 1):
+        reached = np.flatnonzero((offered & frontier_needs).any(axis=1) & (distance < 0))
+        if not len(reached):
+            break
+        distance[reached] = hops
+        frontier_needs = np.bitwise_or.reduce(needed[reached], axis=0)
+    return distance
+
+
+def find_cycles(row, offered, needed, limit, min_length=MIN_LENGTH, max_length=MAX_LENGTH):
+    """
+    Up to ``limit`` cycles through ``row``, each a list of rows starting with
+    ``row`` where every member serves the next and the last serves ``row``.
+    """
+    if not offered[row].any() or not needed[row].any():
+        return []
+
+    distance = distances_to(row, offered, needed, max_length - 1)
+    near = np.flatnonzero(distance > 0)
+    near_distance = distance[near]
+    near_needed = needed[near]
+
+    cycles = []
+    budget = SEARCH_BUDGET
+    path = [row]
+
+    def walk(node, steps):
+        # ``steps`` edges are left, the last one back to ``row``
+        nonlocal budget
+        if steps == 1:
+            cycles.append(list(path))
+            return
+        budget -= 1
+        if budget < 0:
+            return
+
+        reachable = near_distance <= steps - 1
+        links = popcount(near_needed[reachable] & offered[node])
+        candidates = near[reachable]
+        order = np.flatnonzero(links)
+        order = order[np.argsort(-links[order], kind='stable')]
+        for candidate in candidates[order]:
+            candidate = int(candidate)
+            if candidate in path:
+                continue
+            path.append(candidate)
+            walk(candidate, steps - 1)
+            path.pop()
+            if len(cycles) >= limit or budget < 0:
+                return
+
+    for length in range(min_length, max_length + 1):
+        if len(cycles) >= limit or budget < 0:
+            break
+        walk(row, length)
+    return cycles[:limit]
+
+
+_graph = None
+
+
+def _init_worker(offered, needed):
+    global _graph
+    _graph = offered, needed
+
+
+def _scan(rows, limit):
+    offered, needed = _graph
+    return [(row, find_cycles(row, offered, needed, limit)) for row in rows]
+
+
+def scan_rows(rows, offered, needed, limit, workers=1, chunk_size=100):
+    """
+    Yield (row, cycles) for every row in ``rows``, searching chunks of rows in
+    ``workers`` processes.
+    """
+    chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+    if workers <= 1:
+        _init_worker(offered, needed)
+        for chunk in chunks:
+            yield from _scan(chunk, limit)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(offered, needed)) as pool:
+        for results in pool.map(_scan, chunks, repeat(limit)):
+            yield from results
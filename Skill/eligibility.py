@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import OpenTradeSkill, Trade
+from .skillsets import skill_ids
+
+
+# Trades a user can apply to. OpenTradeSkill inverts Trade.desired_skills for
+# pending trades only: one row per (desired skill, trade), each carrying how
+# many skills the trade desires. A user qualifies for a trade when the rows of
+# the skills they offer hit it that many times, so the lookup reads the index
+# entries of at most ten skills and groups them, rather than checking every
+# pending trade. Rows are written when a trade is created or its desired skills
+# change and dropped when it leaves Pending; rebuild_open_trade_index refills
+# the table.
+
+
+def open_trade_rows(trade_id, desired_skill_ids):
+    desired_skill_ids = list(desired_skill_ids)
+    return [
+        OpenTradeSkill(trade_id=trade_id, skill_id=skill_id, required_count=len(desired_skill_ids))
+        for skill_id in desired_skill_ids or [None]
+    ]
+
+
+def index_open_trades(trade_ids):
+    """
+    Rewrite the index rows of ``trade_ids`` from their current status and desired skills.
+    """
+    trade_ids = set(trade_ids)
+    if not trade_ids:
+        return
+    desired = {
+        trade_id: [] for trade_id in Trade.objects.filter(id__in=trade_ids, status='Pending').values_list('id', flat=True)
+    }
+    for trade_id, skill_id in Trade.desired_skills.through.objects.filter(trade_id__in=desired).values_list('trade_id', 'skill_id'):
+        desired[trade_id].append(skill_id)
+
+    with transaction.atomic():
+        OpenTradeSkill.objects.filter(trade_id__in=trade_ids).delete()
+        OpenTradeSkill.objects.bulk_create(
+            [row for trade_id, skills in desired.items() for row in open_trade_rows(trade_id, skills)],
+            batch_size=1000,
+        )
+
+
+def close_trade(trade_id):
+    OpenTradeSkill.objects.filter(trade_id=trade_id).delete()
+
+
+def eligible_trade_ids(user):
+    """
+    A subquery of the ids of pending trades whose desired skills ``user`` all offers.
+    """
+    return (
+        OpenTradeSkill.objects
+        .filter(Q(skill_id__in=skill_ids(user.skills_offered_bits)) | Q(skill__isnull=True))
+        .values('trade_id', 'required_count')
+        .annotate(hits=Count('skill_id'))
+        .filter(hits=F('required_count'))
+        .values('trade_id')
+    )
+
+
+def rebuild_open_trade_index(batch_size=1000):
+    """
+    Index every pending trade again. Returns the number of trades indexed.
+    """
+    with transaction.atomic():
+        OpenTradeSkill.objects.all().delete()
+    indexed = 0
+    last_id = 0
+    pending = Trade.objects.filter(status='Pending').order_by('id').values_list('id', flat=True)
+    while True:
+        trade_ids = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not trade_ids:
+            return indexed
+        last_id = trade_ids[-1]
+        index_open_trades(trade_ids)
+        indexed += len(trade_ids)
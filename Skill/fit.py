@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.utils import timezone
+
+from base.geo import distance_km
+from .models import Queue, RatingAggregate, Trade
+from .ratings import bayesian_score
+from .skillsets import skill_count, to_bits, to_int
+
+
+# Applicant fit. When a user applies or is invited, their queue row gets a
+# score from 0 to 1 that the initiator's queue is sorted by, so the queue page
+# is an indexed read rather than a ranking done per request. It blends, with
+# QUEUE_FIT_WEIGHTS:
+#   skills     the share of the desired skills the user offers, averaged with
+#              the share of the trade's offered skills the user needs
+#   rating     the user's Bayesian rating (see Skill.ratings) out of 5
+#   proximity  QUEUE_FIT_PROXIMITY_KM / (QUEUE_FIT_PROXIMITY_KM + distance to
+#              the initiator); 0 when either has no coordinates
+# The score is taken when the user joins the queue; score_queue_entries
+# recomputes it for open trades.
+
+
+def share(wanted, offered):
+    if not wanted:
+        return 1.0
+    return skill_count(wanted & offered) / skill_count(wanted)
+
+
+def fit_score(trade, initiator, user, initiator_skills=None, rating=None):
+    """
+    How well ``user`` suits ``trade`` of ``initiator``. ``initiator_skills``
+    (ids) and ``rating`` (Bayesian score) are looked up unless given.
+    """
+    weights = settings.QUEUE_FIT_WEIGHTS
+    if initiator_skills is None:
+        initiator_skills = trade.initiator_skills.values_list('id', flat=True)
+    if rating is None:
+        rating = RatingAggregate.objects.filter(user_id=user.id).values_list('bayesian_score', flat=True).first()
+        if rating is None:
+            rating = bayesian_score(0, 0)
+
+    offered = to_int(user.skills_offered_bits)
+    skills = (
+        share(to_int(trade.desired_skills_bits), offered)
+        + (share(to_int(to_bits(initiator_skills)), to_int(user.skills_needed_bits)) if initiator_skills else 0.0)
+    ) / 2
+
+    proximity = 0.0
+    if None not in (initiator.latitude, initiator.longitude, user.latitude, user.longitude):
+        distance = distance_km(initiator.latitude, initiator.longitude, user.latitude, user.longitude)
+        proximity = settings.QUEUE_FIT_PROXIMITY_KM / (settings.QUEUE_FIT_PROXIMITY_KM + distance)
+
+    score = weights['skills'] * skills + weights['rating'] * min(rating / 5, 1.0) + weights['proximity'] * proximity
+    return round(score, 6)
+
+
+def rescore_queues(batch_size=1000):
+    """
+    Recompute the fit of every queue entry of a pending trade. Returns the
+    number of entries scored.
+    """
+    entries = Queue.objects.filter(trade__status='Pending').select_related('trade__initiator', 'user').order_by('id')
+    scored = 0
+    last_id = 0
+    while True:
+        batch = list(entries.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return scored
+        last_id = batch[-1].id
+        trade_ids = {entry.trade_id for entry in batch}
+        user_ids = {entry.user_id for entry in batch}
+
+        initiator_skills = {trade_id: [] for trade_id in trade_ids}
+        for trade_id, skill_id in Trade.initiator_skills.through.objects.filter(trade_id__in=trade_ids).values_list('trade_id', 'skill_id'):
+            initiator_skills[trade_id].append(skill_id)
+        ratings = dict(RatingAggregate.objects.filter(user_id__in=user_ids).values_list('user_id', 'bayesian_score'))
+
+        now = timezone.now()
+        for entry in batch:
+            entry.fit_score = fit_score(
+                entry.trade,
+                entry.trade.initiator,
+                entry.user,
+                initiator_skills=initiator_skills[entry.trade_id],
+                rating=ratings.get(entry.user_id, bayesian_score(0, 0)),
+            )
+            entry.updated_at = now
+        Queue.objects.bulk_update(batch, ['fit_score', 'updated_at'])
+        scored += len(batch)
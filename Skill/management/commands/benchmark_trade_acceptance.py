@@ -0,0 +1,70 @@
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+from base.models import CustomUser
+from Skill.models import Queue, Trade
+from Skill.transitions import TradeConflict, accept
+
+
+class Command(BaseCommand):
+    help = 'Race applicants to accept the same trades and report throughput and conflicts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trades', type=int, default=20)
+        parser.add_argument('--applicants', type=int, default=8, help='Queue entries racing for each trade')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and trades')
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        initiator = CustomUser.objects.create(username=prefix, email=f'{prefix}@example.com')
+        applicants = CustomUser.objects.bulk_create([
+            CustomUser(username=f'{prefix}-{index}', email=f'{prefix}-{index}@example.com')
+            for index in range(options['applicants'])
+        ])
+        trades = Trade.objects.bulk_create([
+            Trade(initiator=initiator, title=f'{prefix} {index}') for index in range(options['trades'])
+        ])
+        entries = Queue.objects.bulk_create([
+            Queue(trade=trade, user=applicant) for trade in trades for applicant in applicants
+        ])
+
+        try:
+            # Queue entries of the same trade are adjacent, so they run at the same time
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                outcomes = Counter(pool.map(self.attempt, [entry.id for entry in entries]))
+            elapsed = time.monotonic() - started
+
+            accepted = Trade.objects.filter(id__in=[trade.id for trade in trades], status='Accepted')
+            winners = Queue.objects.filter(trade__in=trades, status='Accepted').count()
+            self.stdout.write(
+                f'{len(entries)} attempts on {len(trades)} trades with {options["threads"]} threads in {elapsed:.2f}s '
+                f'({len(entries) / elapsed:.0f} attempts/s)'
+            )
+            self.stdout.write(', '.join(f'{outcome}: {count}' for outcome, count in sorted(outcomes.items())))
+
+            if accepted.count() == winners == len(trades):
+                self.stdout.write(self.style.SUCCESS('Every trade was accepted exactly once'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{accepted.count()} trades accepted, {winners} accepted queue entries'))
+        finally:
+            if not options['keep']:
+                CustomUser.objects.filter(username__startswith=prefix).delete()
+
+    def attempt(self, entry_id):
+        try:
+            queue_entry = Queue.objects.select_related('trade', 'user').get(id=entry_id)
+            accept(queue_entry.trade, queue_entry, 'benchmark')
+            return 'accepted'
+        except (TradeConflict, Queue.DoesNotExist):
+            # Lost the race, before or after loading the entry
+            return 'conflict'
+        except OperationalError:
+            return 'database error'
+        finally:
+            close_old_connections()
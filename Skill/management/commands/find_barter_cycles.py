@@ -0,0 +1,16 @@
+import os
+
+from django.core.management.base import BaseCommand
+from Skill.barter import rebuild_cycles
+
+
+class Command(BaseCommand):
+    help = 'Search every user\'s multi-party barter cycles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Search processes')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = rebuild_cycles(workers=options['workers'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored barter cycles for {users} users'))
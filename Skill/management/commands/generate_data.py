@@ -0,0 +1,265 @@
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from base.geo import encode_geohash
+from base.models import CustomUser, Post
+from Skill import synthetic
+from Skill.eligibility import rebuild_open_trade_index
+from Skill.fit import rescore_queues
+from Skill.models import Message, Queue, Review, Skill, Trade
+from Skill.rankings import rebuild_rankings
+from Skill.ratings import rebuild_ratings
+from Skill.skillsets import to_bits
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a large, reproducible synthetic marketplace for performance work'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--skills', type=int, default=200, help='Skills users draw from, created if missing')
+        parser.add_argument('--skills-per-user', type=int, default=5, help='Most skills a user offers, and needs')
+        parser.add_argument('--trades', type=int, default=20000)
+        parser.add_argument('--queue-entries', type=int, default=40000, help='Applications and invitations to pending trades')
+        parser.add_argument('--messages', type=int, default=50000)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--reviews', type=int, default=5000, help='At most one per completed trade')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default='password', help='Password of every generated user')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows drawn and inserted at a time')
+        parser.add_argument('--workers', type=int, default=1, help='Processes drawing rows; this one does the writing')
+        parser.add_argument('--skip-derived', action='store_true', help='Leave ratings, rankings, indexes and queue scores stale')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['skills_per_user'] <= 10:
+            raise CommandError('--skills-per-user must be from 1 to 10, the most skills a user can offer.')
+        if options['users'] < 2 or options['skills'] < 1:
+            raise CommandError('Generate at least two users and one skill.')
+        if not options['trades'] and (options['queue_entries'] or options['messages'] or options['reviews']):
+            raise CommandError('Queue entries, messages and reviews need trades.')
+
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        self.context = {
+            'users': options['users'],
+            'skills': options['skills'],
+            'skills_per_user': options['skills_per_user'],
+            'trades': options['trades'],
+        }
+        self.now = timezone.now()
+
+        self.skill_ids = self.create_skills(options['skills'])
+        # Users and trades get explicit ids so rows can point at them without reading them back
+        self.user_base = (CustomUser.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        self.trade_base = (Trade.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            self.timed('users', options['users'], lambda: self.write_users(options['users'], make_password(options['password'])))
+            completed = []
+            self.timed('trades', options['trades'], lambda: self.write_trades(options['trades'], completed))
+            self.timed('queue entries', options['queue_entries'], lambda: self.write_queue(options['queue_entries']))
+            self.timed('messages', options['messages'], lambda: self.write_messages(options['messages']))
+            self.timed('posts', options['posts'], lambda: self.write_posts(options['posts']))
+
+            if len(completed) > options['reviews']:
+                completed = sorted(random.Random(self.seed).sample(completed, options['reviews']))
+            self.timed('reviews', len(completed), lambda: self.write_reviews(completed))
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+
+        if options['skip_derived']:
+            return
+        # Everything bulk_create skipped the signals for
+        self.timed('rating aggregates', None, rebuild_ratings)
+        self.timed('skill rankings', None, lambda: rebuild_rankings(batch_size=self.batch_size))
+        self.timed('pending trades indexed', None, lambda: rebuild_open_trade_index(batch_size=self.batch_size))
+        self.timed('queue fit scores', None, lambda: rescore_queues(batch_size=self.batch_size))
+        call_command('rebuild_search_index', batch_size=self.batch_size, stdout=self.stdout)
+        self.stdout.write('Trade matches and barter cycles are computed on request, or by rebuild_trade_matches and find_barter_cycles.')
+
+    def timed(self, label, count, write):
+        started = time.monotonic()
+        written = write()
+        count = written if count is None else count
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'{count} {label} in {elapsed:.1f}s ({count / max(elapsed, 1e-6):.0f}/s)'))
+
+    def create_skills(self, count):
+        names = [synthetic.skill_name(position) for position in range(count)]
+        Skill.objects.bulk_create([Skill(name=name) for name in names], batch_size=self.batch_size, ignore_conflicts=True)
+        ids = dict(Skill.objects.filter(name__in=names).values_list('name', 'id'))
+        return [ids[name] for name in names]
+
+    def drawn(self, table, numbers):
+        """
+        Yield (numbers, rows) for ``numbers`` a batch at a time, drawn here or
+        in the pool with a few batches in flight.
+        """
+        batches = (numbers[start:start + self.batch_size] for start in range(0, len(numbers), self.batch_size))
+        if self.pool is None:
+            for batch in batches:
+                yield batch, synthetic.draw(table, self.seed, batch, self.context)
+            return
+
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, self.pool.submit(synthetic.draw, table, self.seed, batch, self.context)))
+            if len(pending) > self.workers * 2:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+    def skills(self, positions):
+        return [self.skill_ids[position] for position in positions]
+
+    def write_users(self, count, password):
+        Offered = CustomUser.skills_offered.through
+        Needed = CustomUser.skills_needed.through
+        for numbers, rows in self.drawn(synthetic.USERS, range(count)):
+            users, offered, needed = [], [], []
+            for number, (offered_at, needed_at, first_name, last_name, bio, place, is_verified, is_private) in zip(numbers, rows):
+                user_id = self.user_base + number
+                offered_ids, needed_ids = self.skills(offered_at), self.skills(needed_at)
+                location, latitude, longitude = place or ('', None, None)
+                geohash = encode_geohash(latitude, longitude) if place else ''
+                users.append((
+                    user_id, f'user{user_id}', f'user{user_id}@example.com', password, first_name, last_name, bio,
+                    location, latitude, longitude, geohash, is_verified, is_private, to_bits(offered_ids), to_bits(needed_ids),
+                ))
+                offered.extend((user_id, skill_id) for skill_id in offered_ids)
+                needed.extend((user_id, skill_id) for skill_id in needed_ids)
+
+            with transaction.atomic():
+                self.insert(CustomUser, [
+                    'id', 'username', 'email', 'password', 'first_name', 'last_name', 'bio', 'location', 'latitude',
+                    'longitude', 'geohash', 'is_verified', 'isPrivate', 'skills_offered_bits', 'skills_needed_bits',
+                ], users)
+                self.insert(Offered, ['customuser', 'skill'], offered)
+                self.insert(Needed, ['customuser', 'skill'], needed)
+        self.reset_sequence(CustomUser)
+
+    def write_trades(self, count, completed):
+        InitiatorSkill = Trade.initiator_skills.through
+        ResponderSkill = Trade.responder_skills.through
+        DesiredSkill = Trade.desired_skills.through
+        now = self.db_now()
+        for numbers, rows in self.drawn(synthetic.TRADES, range(count)):
+            trades, responders = [], []
+            links = {InitiatorSkill: [], DesiredSkill: [], ResponderSkill: []}
+            for number, row in zip(numbers, rows):
+                initiator, responder, status, initiator_at, desired_at, responder_at, title, description, initiator_terms, responder_terms = row
+                trade_id = self.trade_base + number
+                desired_ids = self.skills(desired_at)
+                responder_id = None if responder is None else self.user_base + responder
+                trades.append((
+                    trade_id, self.user_base + initiator, responder_id, status, title, description, initiator_terms,
+                    responder_terms, now if status == 'Completed' else None, to_bits(desired_ids),
+                ))
+                for model, skill_ids in ((InitiatorSkill, self.skills(initiator_at)), (DesiredSkill, desired_ids), (ResponderSkill, self.skills(responder_at))):
+                    links[model].extend((trade_id, skill_id) for skill_id in skill_ids)
+                if responder is not None:
+                    # accept() keeps only the accepted entry of the queue
+                    responders.append((trade_id, responder_id, 'Accepted', now))
+                if status == 'Completed':
+                    completed.append(number)
+
+            with transaction.atomic():
+                self.insert(Trade, [
+                    'id', 'initiator', 'responder', 'status', 'title', 'description', 'initiator_terms',
+                    'responder_terms', 'completed_at', 'desired_skills_bits',
+                ], trades)
+                for model, rows in links.items():
+                    self.insert(model, ['trade', 'skill'], rows)
+                self.insert(Queue, ['trade', 'user', 'status', 'accepted_at'], responders)
+        self.reset_sequence(Trade)
+
+    def write_queue(self, count):
+        now = self.db_now()
+        for _, rows in self.drawn(synthetic.QUEUE, range(count)):
+            self.insert(Queue, ['trade', 'user', 'status', 'invited_at'], [
+                (self.trade_base + trade, self.user_base + user, status, now if status == 'Invited' else None)
+                for trade, user, status in rows
+            ])
+
+    def write_messages(self, count):
+        for _, rows in self.drawn(synthetic.MESSAGES, range(count)):
+            self.insert(Message, ['trade', 'sender', 'receiver', 'content'], [
+                (self.trade_base + trade, self.user_base + sender, self.user_base + receiver, content)
+                for trade, sender, receiver, content in rows
+            ])
+
+    def write_posts(self, count):
+        for _, rows in self.drawn(synthetic.POSTS, range(count)):
+            posts = []
+            for user, caption, description, is_slice, price, place in rows:
+                location, latitude, longitude = place or (None, None, None)
+                geohash = encode_geohash(latitude, longitude) if place else ''
+                posts.append((
+                    self.user_base + user, caption, description, is_slice, Decimal(price) / 100,
+                    location, latitude, longitude, geohash,
+                ))
+            self.insert(Post, [
+                'user', 'caption', 'description', 'isSlice', 'price', 'location', 'latitude', 'longitude', 'geohash',
+            ], posts)
+
+    def write_reviews(self, trades):
+        for _, rows in self.drawn(synthetic.REVIEWS, trades):
+            self.insert(Review, ['trade', 'reviewer', 'reviewee', 'rating', 'feedback'], [
+                (self.trade_base + trade, self.user_base + reviewer, self.user_base + reviewee, Decimal(rating), feedback)
+                for trade, reviewer, reviewee, rating, feedback in rows
+            ])
+
+    def db_now(self):
+        return connection.ops.adapt_datetimefield_value(self.now)
+
+    def insert(self, model, fields, rows):
+        """
+        INSERT ``rows``, tuples of database-ready values for ``fields``, into
+        ``model``'s table. Unlike bulk_create this builds no model instances and
+        compiles no SQL per row, which is most of its cost at this scale. The
+        other columns get their defaults (auto_now ones the current time).
+        """
+        if not rows:
+            return
+        template = model()
+        others = [field for field in model._meta.concrete_fields if field.name not in fields and not field.primary_key]
+        defaults = tuple(field.get_db_prep_save(field.pre_save(template, True), connection) for field in others)
+        columns = [model._meta.get_field(name).column for name in fields] + [field.column for field in others]
+
+        quote = connection.ops.quote_name
+        sql = f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) VALUES '
+        placeholders = f'({", ".join(["%s"] * len(columns))})'
+        rows = [row + defaults for row in rows]
+        # In autocommit SQLite would commit every row of the executemany
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # One prepared statement run for every row
+                cursor.executemany(sql + placeholders, rows)
+                return
+            per_statement = len(rows)
+            if connection.features.max_query_params:
+                per_statement = max(connection.features.max_query_params // len(columns), 1)
+            for start in range(0, len(rows), per_statement):
+                batch = rows[start:start + per_statement]
+                cursor.execute(sql + ', '.join([placeholders] * len(batch)), [value for row in batch for value in row])
+
+    def reset_sequence(self, model):
+        # Inserting explicit ids leaves sequences (e.g. PostgreSQL's) behind
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+                cursor.execute(sql)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from Skill.eligibility import rebuild_open_trade_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the index of pending trades by desired skill'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        trades = rebuild_open_trade_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {trades} pending trades'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from Skill.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute every user\'s rating aggregate and average rating from their reviews'
+
+    def handle(self, *args, **options):
+        users = rebuild_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {users} users'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from base.models import CustomUser
+from Skill.models import Trade
+from Skill.skillsets import refresh_trade_bits, refresh_user_bits
+
+
+class Command(BaseCommand):
+    help = 'Recompute the skill bitsets of every user and trade from their skill relations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        user_ids = list(CustomUser.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(user_ids), batch_size):
+            with transaction.atomic():
+                refresh_user_bits(user_ids[start:start + batch_size])
+        self.stdout.write(f'Refreshed skill bitsets for {len(user_ids)} users')
+
+        # Apply and invite check applicants against these
+        trade_ids = list(Trade.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(trade_ids), batch_size):
+            with transaction.atomic():
+                refresh_trade_bits(trade_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed desired skill bitsets for {len(trade_ids)} trades'))
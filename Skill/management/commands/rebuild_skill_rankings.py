@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from Skill.rankings import rebuild_rankings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-skill lists of users ranked by rating'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = rebuild_rankings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Ranked {rows} user skills'))
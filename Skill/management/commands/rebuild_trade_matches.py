@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from Skill.matchmaking import rebuild_matches
+
+
+class Command(BaseCommand):
+    help = 'Recompute every user\'s best trade partners from the stored skill bitsets (see rebuild_skill_bitsets)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = rebuild_matches(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Stored trade partners for {users} users'))
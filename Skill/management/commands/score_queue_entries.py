@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from Skill.fit import rescore_queues
+
+
+class Command(BaseCommand):
+    help = 'Recompute the applicant fit score of every queue entry of an open trade'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        scored = rescore_queues(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Scored {scored} queue entries'))
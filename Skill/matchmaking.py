@@ -0,0 +1,297 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min, Window
+from django.db.models.functions import RowNumber
+
+from base.models import CustomUser
+from .bitmatrix import as_row, popcount, row_width
+from .models import TradeMatch
+
+logger = logging.getLogger(__name__)
+
+
+# Complementary matchmaking. Every active user's offered and needed skills are
+# held as rows of two packed bit matrices (see Skill.skillsets), so scoring one
+# user against everyone is an AND plus a popcount over the matrices. Two users
+# match when each offers something the other needs; the score is the product
+# of the two overlaps, which favours balanced barters. The best
+# TRADE_MATCHES_PER_USER partners of every user are stored in TradeMatch so
+# the matches endpoint is an indexed read. A skill change rescores the user
+# against everyone on a background thread and patches the other users' lists;
+# rebuild_trade_matches recomputes all lists from scratch.
+
+# Bytes of intermediate result per block when scoring many users at once
+BLOCK_BYTES = 1 << 24
+CHUNK_SIZE = 5000
+
+
+class MatchEngine:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.stale = True
+        self.built_at = 0.0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.rows = {}
+        self.offered = np.zeros((0, 0), dtype=np.uint8)
+        self.needed = np.zeros((0, 0), dtype=np.uint8)
+
+    def ensure_built(self):
+        if self.stale or time.monotonic() - self.built_at > settings.MATCH_INDEX_TTL:
+            with self.lock:
+                if self.stale or time.monotonic() - self.built_at > settings.MATCH_INDEX_TTL:
+                    self.build()
+
+    def build(self):
+        self.stale = False
+        users = list(
+            CustomUser.objects.filter(is_active=True)
+            .values_list('id', 'skills_offered_bits', 'skills_needed_bits')
+            .order_by('id').iterator(chunk_size=CHUNK_SIZE)
+        )
+        width = row_width(max([len(offered or b'') for _, offered, _ in users] + [len(needed or b'') for _, _, needed in users] + [1]))
+
+        ids = np.zeros(len(users), dtype=np.int64)
+        offered_matrix = np.zeros((len(users), width), dtype=np.uint8)
+        needed_matrix = np.zeros((len(users), width), dtype=np.uint8)
+        for row, (user_id, offered, needed) in enumerate(users):
+            ids[row] = user_id
+            offered_matrix[row] = as_row(offered, width)
+            needed_matrix[row] = as_row(needed, width)
+
+        self.ids, self.offered, self.needed = ids, offered_matrix, needed_matrix
+        self.rows = {int(user_id): row for row, user_id in enumerate(ids)}
+        self.built_at = time.monotonic()
+
+    def set_user(self, user_id, offered, needed):
+        """
+        Patch one user's row in place after a skill change.
+        """
+        with self.lock:
+            width = row_width(max(len(offered or b''), len(needed or b''), self.offered.shape[1]))
+            if width > self.offered.shape[1]:
+                padding = ((0, 0), (0, width - self.offered.shape[1]))
+                self.offered = np.pad(self.offered, padding)
+                self.needed = np.pad(self.needed, padding)
+
+            row = self.rows.get(user_id)
+            if row is None:
+                row = len(self.ids)
+                self.ids = np.append(self.ids, user_id)
+                self.offered = np.vstack([self.offered, np.zeros((1, width), dtype=np.uint8)])
+                self.needed = np.vstack([self.needed, np.zeros((1, width), dtype=np.uint8)])
+                self.rows[user_id] = row
+            self.offered[row] = as_row(offered, width)
+            self.needed[row] = as_row(needed, width)
+
+    def snapshot(self):
+        with self.lock:
+            return self.ids, self.rows, self.offered, self.needed
+
+    def reload_user(self, user_id):
+        user = CustomUser.objects.filter(id=user_id, is_active=True).values_list('skills_offered_bits', 'skills_needed_bits').first()
+        self.set_user(user_id, *(user or (b'', b'')))
+
+    def overlaps(self, user_id):
+        """
+        (gets, gives) arrays over all users: how many skills each of them
+        offers that ``user_id`` needs, and how many of their needs it offers.
+        """
+        row = self.rows.get(user_id)
+        if row is None:
+            empty = np.zeros(len(self.ids), dtype=np.int64)
+            return empty, empty
+        gets = popcount(self.offered & self.needed[row])
+        gives = popcount(self.needed & self.offered[row])
+        gets[row] = gives[row] = 0
+        return gets, gives
+
+    def top_matches(self, user_id, limit):
+        """
+        Best partners for ``user_id`` as [(partner_id, score, gets, gives)].
+        """
+        gets, gives = self.overlaps(user_id)
+        return self.ranked(gets, gives, limit)
+
+    def ranked(self, gets, gives, limit):
+        scores = gets * gives
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        # Highest score first, then the newest account
+        candidates = candidates[np.lexsort((-self.ids[candidates], -scores[candidates]))]
+        return [
+            (int(self.ids[row]), int(scores[row]), int(gets[row]), int(gives[row]))
+            for row in candidates
+        ]
+
+    def all_top_matches(self, limit):
+        """
+        Yield (user_id, matches) for every user that can match at all, scoring
+        blocks of users against everyone with one broadcast per block.
+        """
+        active = np.flatnonzero(self.offered.any(axis=1) & self.needed.any(axis=1))
+        if not len(active):
+            return
+        block = max(1, BLOCK_BYTES // max(len(self.ids) * self.offered.shape[1], 1))
+        for start in range(0, len(active), block):
+            rows = active[start:start + block]
+            gets = popcount(self.offered[None, :, :] & self.needed[rows, None, :])
+            gives = popcount(self.needed[None, :, :] & self.offered[rows, None, :])
+            for index, row in enumerate(rows):
+                gets[index, row] = gives[index, row] = 0
+                yield int(self.ids[row]), self.ranked(gets[index], gives[index], limit)
+
+
+match_engine = MatchEngine()
+
+
+def store_matches(user_id, matches):
+    with transaction.atomic():
+        TradeMatch.objects.filter(user_id=user_id).delete()
+        TradeMatch.objects.bulk_create([
+            TradeMatch(user_id=user_id, partner_id=partner_id, score=score, gets=gets, gives=gives)
+            for partner_id, score, gets, gives in matches
+        ])
+
+
+def patch_partner_lists(user_id, gets, gives):
+    """
+    Put ``user_id`` into (or take it out of) the lists of everyone else after
+    its skills changed. Scores are symmetric, so its own overlaps give theirs.
+    """
+    limit = settings.TRADE_MATCHES_PER_USER
+    scores = gets * gives
+    rows = np.flatnonzero(scores)
+    candidates = {int(match_engine.ids[row]): row for row in rows}
+
+    with transaction.atomic():
+        listed = set(TradeMatch.objects.filter(partner_id=user_id).values_list('user_id', flat=True))
+
+        # Lists it no longer belongs in shrink until the next rebuild
+        stale = [owner_id for owner_id in listed if owner_id not in candidates]
+        for start in range(0, len(stale), CHUNK_SIZE):
+            TradeMatch.objects.filter(partner_id=user_id, user_id__in=stale[start:start + CHUNK_SIZE]).delete()
+
+        ids = list(candidates)
+        updates = []
+        for start in range(0, len(ids), CHUNK_SIZE):
+            chunk = ids[start:start + CHUNK_SIZE]
+            lists = {
+                owner_id: (count, lowest)
+                for owner_id, count, lowest in
+                TradeMatch.objects.filter(user_id__in=chunk).values_list('user_id').annotate(count=Count('id'), lowest=Min('score')).order_by()
+            }
+            for owner_id in chunk:
+                count, lowest = lists.get(owner_id, (0, 0))
+                row = candidates[owner_id]
+                if owner_id in listed or count < limit or scores[row] > lowest:
+                    # The partner's view: what this user offers them is what they get
+                    updates.append(TradeMatch(user_id=owner_id, partner_id=user_id, score=int(scores[row]), gets=int(gives[row]), gives=int(gets[row])))
+
+        TradeMatch.objects.bulk_create(
+            updates,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['user', 'partner'],
+            update_fields=['score', 'gets', 'gives'],
+        )
+
+        # Trim the lists that grew past the limit
+        owners = [match.user_id for match in updates]
+        for start in range(0, len(owners), CHUNK_SIZE):
+            overflow = (
+                TradeMatch.objects.filter(user_id__in=owners[start:start + CHUNK_SIZE])
+                .annotate(rank=Window(RowNumber(), partition_by=[F('user_id')], order_by=[F('score').desc(), F('id').desc()]))
+                .filter(rank__gt=limit)
+                .values_list('id', flat=True)
+            )
+            TradeMatch.objects.filter(id__in=list(overflow)).delete()
+
+
+def refresh_matches(user_ids):
+    """
+    Rescore ``user_ids`` after their skills changed and update every list they appear in.
+    """
+    match_engine.ensure_built()
+    for user_id in user_ids:
+        match_engine.reload_user(user_id)
+    for user_id in user_ids:
+        gets, gives = match_engine.overlaps(user_id)
+        store_matches(user_id, match_engine.ranked(gets, gives, settings.TRADE_MATCHES_PER_USER))
+        patch_partner_lists(user_id, gets, gives)
+
+
+def swap_lists(user_ids, matches, batch_size=1000):
+    # Readers see each user's old list or their new one, never an empty one in between
+    with transaction.atomic():
+        TradeMatch.objects.filter(user_id__in=user_ids).delete()
+        TradeMatch.objects.bulk_create(matches, batch_size=batch_size)
+
+
+def rebuild_matches(batch_size=1000):
+    """
+    Recompute every user's list. Returns the number of users with matches.
+    """
+    with match_engine.lock:
+        match_engine.build()
+
+    users = 0
+    rebuilt = set()
+    owners = []
+    batch = []
+    for user_id, matches in match_engine.all_top_matches(settings.TRADE_MATCHES_PER_USER):
+        if matches:
+            users += 1
+        rebuilt.add(user_id)
+        owners.append(user_id)
+        batch.extend(
+            TradeMatch(user_id=user_id, partner_id=partner_id, score=score, gets=gets, gives=gives)
+            for partner_id, score, gets, gives in matches
+        )
+        if len(batch) >= batch_size or len(owners) >= batch_size:
+            swap_lists(owners, batch, batch_size)
+            owners = []
+            batch = []
+    swap_lists(owners, batch, batch_size)
+
+    # Users who can no longer match anyone keep no list
+    stale = [
+        user_id for user_id in TradeMatch.objects.values_list('user_id', flat=True).distinct().order_by()
+        if user_id not in rebuilt
+    ]
+    for start in range(0, len(stale), CHUNK_SIZE):
+        TradeMatch.objects.filter(user_id__in=stale[start:start + CHUNK_SIZE]).delete()
+    return users
+
+
+_executor = None
+
+
+def get_executor():
+    # One worker: refreshes apply in order and never race each other
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='matchmaking')
+    return _executor
+
+
+def _run(user_ids):
+    close_old_connections()
+    try:
+        refresh_matches(user_ids)
+    except Exception:
+        logger.exception('Match refresh failed for users %s', user_ids)
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh(user_ids):
+    user_ids = sorted(set(user_ids))
+    if user_ids:
+        transaction.on_commit(lambda: get_executor().submit(_run, user_ids))
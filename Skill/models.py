@@ -29,6 +29,8 @@ class Trade(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)  # Set when trade is completed
     title = models.CharField(max_length=255, blank=True, null=True)  # Title of the trade
     description = models.TextField(blank=True, null=True)  # Description of the trade
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Delta sync, see base.sync
+    desired_skills_bits = models.BinaryField(default=b'', editable=False)  # See Skill.skillsets
 
     def __str__(self):
         return f"Trade between {self.initiator} and {self.responder}"
@@ -48,6 +50,13 @@ class Queue(models.Model):
     invited_at = models.DateTimeField(null=True, blank=True)
     accepted_at = models.DateTimeField(null=True, blank=True)
     rejected_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    fit_score = models.FloatField(default=0)  # How well the user suits the trade, see Skill.fit
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trade', '-fit_score', '-id']),
+        ]
 
     def __str__(self):
         return f"Queue for trade {self.trade.id} by user {self.user.username}"
@@ -58,6 +67,7 @@ class Review(models.Model):
     reviewee = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='reviews_received', on_delete=models.CASCADE)
     rating = models.DecimalField(max_digits=3, decimal_places=2)
     feedback = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Review by {self.reviewer.username} for {self.reviewee.username}"
@@ -68,6 +78,88 @@ class Message(models.Model):
     receiver = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='received_messages_trade', on_delete=models.CASCADE)
     content = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Message from {self.sender.username} to {self.receiver.username} in trade {self.trade.id}"
+
+
+class TradeMatch(models.Model):
+    # Precomputed best trade partners for ``user``, kept by Skill.matchmaking
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='trade_matches', on_delete=models.CASCADE)
+    partner = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    score = models.PositiveIntegerField()
+    gets = models.PositiveSmallIntegerField()  # Skills the partner offers that the user needs
+    gives = models.PositiveSmallIntegerField()  # Skills the user offers that the partner needs
+
+    class Meta:
+        unique_together = ('user', 'partner')
+        indexes = [
+            models.Index(fields=['user', '-score', '-id']),
+        ]
+
+
+class BarterCycle(models.Model):
+    # A ring of users that can serve one another, found for ``user`` by Skill.barter
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='barter_cycles', on_delete=models.CASCADE)
+    length = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'length', 'id']),
+        ]
+
+
+class BarterCycleMember(models.Model):
+    cycle = models.ForeignKey(BarterCycle, related_name='members', on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='barter_cycle_memberships', on_delete=models.CASCADE)
+    position = models.PositiveSmallIntegerField()  # Serves the member at the next position; the last serves the first
+
+    class Meta:
+        unique_together = ('cycle', 'position')
+
+
+class BarterCycleScan(models.Model):
+    # When ``user``'s cycles were last searched; removed when they go stale
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='barter_cycle_scan', on_delete=models.CASCADE)
+    scanned_at = models.DateTimeField()
+
+
+class RatingAggregate(models.Model):
+    # Running totals of the reviews ``user`` received, kept by Skill.ratings
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='rating_aggregate', on_delete=models.CASCADE)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    bayesian_score = models.FloatField(default=0, db_index=True)  # Average pulled towards RATING_PRIOR_MEAN
+
+
+class OpenTradeSkill(models.Model):
+    # Pending trades by desired skill, kept by Skill.eligibility. A trade that
+    # desires nothing has one row with no skill.
+    skill = models.ForeignKey(Skill, related_name='+', on_delete=models.CASCADE, null=True)
+    trade = models.ForeignKey(Trade, related_name='+', on_delete=models.CASCADE)
+    required_count = models.PositiveSmallIntegerField()  # How many skills the trade desires
+
+    class Meta:
+        indexes = [
+            # Covers the eligibility query, which reads nothing else
+            models.Index(fields=['skill', 'trade', 'required_count']),
+        ]
+
+
+class SkillRanking(models.Model):
+    # ``user`` offers ``skill``; kept with their rating by Skill.rankings
+    skill = models.ForeignKey(Skill, related_name='+', on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    rating = models.DecimalField(max_digits=3, decimal_places=2)
+
+    class Meta:
+        unique_together = ('user', 'skill')
+        indexes = [
+            models.Index(fields=['skill', '-rating', '-user']),
+        ]
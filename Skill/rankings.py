@@ -0,0 +1,117 @@
+import heapq
+from itertools import groupby, islice
+
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from base.models import CustomUser
+from .models import SkillRanking
+
+
+# Users by skill, best rated first. SkillRanking holds a row per user per skill
+# they offer, with the user's rating, indexed by (skill, -rating, -user), so the
+# users of a skill are one index range already in page order. A search for
+# several skills reads the head of each skill's range and merges them with
+# heapq, dropping users listed under more than one of the skills: a page costs
+# about a page of rows per skill, not a join, DISTINCT and sort over every user.
+# Rows follow skills_offered (Skill.signals) and ratings (Skill.ratings);
+# rebuild_skill_rankings refills the table.
+
+
+def refresh_user_rankings(user_ids):
+    """
+    Rewrite the rows of ``user_ids`` from the skills they offer and their rating.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    ratings = dict(CustomUser.objects.filter(id__in=user_ids).values_list('id', 'rating'))
+    offered = CustomUser.skills_offered.through.objects.filter(customuser_id__in=ratings).values_list('customuser_id', 'skill_id')
+    with transaction.atomic():
+        SkillRanking.objects.filter(user_id__in=user_ids).delete()
+        SkillRanking.objects.bulk_create(
+            [SkillRanking(skill_id=skill_id, user_id=user_id, rating=ratings[user_id]) for user_id, skill_id in offered],
+            batch_size=1000,
+        )
+
+
+def sync_ranking_ratings(user_ids=None):
+    """
+    Copy the current rating of ``user_ids`` (everyone by default) to their rows.
+    """
+    rows = SkillRanking.objects.all() if user_ids is None else SkillRanking.objects.filter(user_id__in=user_ids)
+    rows.update(rating=Subquery(CustomUser.objects.filter(id=OuterRef('user_id')).values('rating')[:1]))
+
+
+def rebuild_rankings(batch_size=1000):
+    """
+    Rewrite the rows of every user. Returns the number of rows.
+    """
+    with transaction.atomic():
+        SkillRanking.objects.all().delete()
+    last_id = 0
+    users = CustomUser.objects.order_by('id').values_list('id', flat=True)
+    while True:
+        user_ids = list(users.filter(id__gt=last_id)[:batch_size])
+        if not user_ids:
+            return SkillRanking.objects.count()
+        last_id = user_ids[-1]
+        refresh_user_rankings(user_ids)
+
+
+def _after(position):
+    if position is None:
+        return Q()
+    rating, user_id = position
+    return Q(rating__lt=rating) | Q(rating=rating, user_id__lt=user_id)
+
+
+def merge_rankings(skill_ids, limit, position=None):
+    """
+    The first ``limit`` (rating, user id) pairs of the users offering any of
+    ``skill_ids``, best rated first and then by id descending, after ``position``.
+    """
+    # A user is in each list at most once, so ``limit`` rows per list always
+    # hold the first ``limit`` distinct users
+    lists = [
+        SkillRanking.objects.filter(_after(position), skill_id=skill_id)
+        .order_by('-rating', '-user_id').values_list('rating', 'user_id')[:limit]
+        for skill_id in set(skill_ids)
+    ]
+    # A user under several skills has equal rows, which merge side by side
+    merged = heapq.merge(*lists, reverse=True)
+    return [row for row, _ in islice(groupby(merged), limit)]
+
+
+class RankedUsers:
+    """
+    The users offering any of ``skill_ids`` in ``('-rating', '-id')`` order, as
+    a sequence the paginators can count, slice and (for keyset pages) seek.
+    """
+    model = CustomUser
+    ordered = True
+
+    def __init__(self, skill_ids, position=None):
+        self.skill_ids = list(skill_ids)
+        self.position = position
+
+    def after(self, position):
+        return RankedUsers(self.skill_ids, position)
+
+    def count(self):
+        rows = SkillRanking.objects.filter(_after(self.position), skill_id__in=self.skill_ids)
+        return rows.values('user_id').distinct().count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('RankedUsers only supports slicing.')
+        rows = merge_rankings(self.skill_ids, index.stop, self.position)[index.start or 0:]
+        users = CustomUser.objects.in_bulk([user_id for _, user_id in rows])
+        page = []
+        for rating, user_id in rows:
+            if user_id in users:
+                user = users[user_id]
+                # The rating the user was ranked by, which keyset cursors continue from
+                user.rating = rating
+                page.append(user)
+        return page
@@ -0,0 +1,150 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from base.models import CustomUser
+from .models import RatingAggregate, Review
+from .rankings import sync_ranking_ratings
+
+
+# Running rating aggregates. Every user's received reviews are summarised in a
+# RatingAggregate row (sum, count, reviews per star and a Bayesian score), and
+# CustomUser.rating (and its copy in SkillRanking) holds the plain average. A
+# review change adjusts both with a few UPDATEs in the transaction that changes the review, instead of
+# averaging every review of the user again. rebuild_rating_aggregates
+# recomputes them from Review.
+
+STARS = range(1, 6)
+
+
+def parse_rating(value):
+    """
+    A review rating from request data as a Decimal, or None when it is not a
+    number from 0 to 5.
+    """
+    try:
+        rating = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return None
+    return rating if 0 <= rating <= 5 else None
+
+
+def star(rating):
+    # Ratings are decimals; each counts towards its nearest whole star
+    return min(max(int(Decimal(rating) + Decimal('0.5')), 1), 5)
+
+
+def average(total, count):
+    return (Decimal(total) / count).quantize(Decimal('0.01')) if count else Decimal('0.00')
+
+
+def bayesian_score(total, count):
+    weight = settings.RATING_PRIOR_WEIGHT
+    return (weight * settings.RATING_PRIOR_MEAN + float(total)) / (weight + count)
+
+
+def record_rating(user_id, added=None, removed=None):
+    """
+    Apply a review change to ``user_id``'s aggregate and rating: ``added`` is
+    the rating of a new review, ``removed`` that of a deleted one, and an edit
+    passes both. Call it in the transaction that changes the review.
+    """
+    added = Decimal(added) if added is not None else None
+    removed = Decimal(removed) if removed is not None else None
+    changes = {
+        'total': F('total') + (added or 0) - (removed or 0),
+        'count': F('count') + (added is not None) - (removed is not None),
+    }
+    stars = defaultdict(int)
+    if added is not None:
+        stars[star(added)] += 1
+    if removed is not None:
+        stars[star(removed)] -= 1
+    for value, delta in stars.items():
+        if delta:
+            changes[f'stars_{value}'] = F(f'stars_{value}') + delta
+
+    with transaction.atomic():
+        aggregates = RatingAggregate.objects.filter(user_id=user_id)
+        if not aggregates.update(**changes):
+            # No aggregate yet: the review change is already visible, so count from scratch
+            rebuild_ratings([user_id])
+            return
+
+        # The UPDATE above holds the row until commit, so this reads our own totals
+        total, count = aggregates.values_list('total', 'count').get()
+        aggregates.update(bayesian_score=bayesian_score(total, count))
+        CustomUser.objects.filter(id=user_id).update(rating=average(total, count), updated_at=timezone.now())
+        sync_ranking_ratings([user_id])
+
+
+def rebuild_ratings(user_ids=None):
+    """
+    Recompute the aggregates and ratings of ``user_ids`` (everyone by default)
+    from Review. Returns the number of users with reviews.
+    """
+    reviews = Review.objects.all() if user_ids is None else Review.objects.filter(reviewee_id__in=user_ids)
+    # Same buckets as star(): a rating counts towards its nearest whole star
+    buckets = {
+        f'stars_{value}': Count('id', filter=(Q(rating__gte=value - 0.5) if value > 1 else Q()) & (Q(rating__lt=value + 0.5) if value < 5 else Q()))
+        for value in STARS
+    }
+    rows = reviews.values('reviewee_id').annotate(total=Sum('rating'), count=Count('id'), **buckets).order_by()
+
+    aggregates = [
+        RatingAggregate(
+            user_id=row['reviewee_id'],
+            total=row['total'],
+            count=row['count'],
+            bayesian_score=bayesian_score(row['total'], row['count']),
+            **{f'stars_{value}': row[f'stars_{value}'] for value in STARS},
+        )
+        for row in rows
+    ]
+    reviewed = {aggregate.user_id for aggregate in aggregates}
+    if user_ids is not None:
+        # Keep a zero row for the others so record_rating can update it
+        aggregates.extend(
+            RatingAggregate(user_id=user_id, bayesian_score=bayesian_score(0, 0))
+            for user_id in set(user_ids) - reviewed
+        )
+
+    now = timezone.now()
+    with transaction.atomic():
+        stale = RatingAggregate.objects.all() if user_ids is None else RatingAggregate.objects.filter(user_id__in=user_ids)
+        stale.delete()
+        # Upsert: a concurrent review of the same user may have recreated its row
+        RatingAggregate.objects.bulk_create(
+            aggregates,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['total', 'count', 'bayesian_score'] + [f'stars_{value}' for value in STARS],
+        )
+
+        for aggregate in aggregates:
+            if aggregate.user_id in reviewed:
+                CustomUser.objects.filter(id=aggregate.user_id).update(rating=average(aggregate.total, aggregate.count), updated_at=now)
+        unrated = CustomUser.objects.exclude(id__in=reviews.values('reviewee_id')).exclude(rating=0)
+        if user_ids is not None:
+            unrated = unrated.filter(id__in=user_ids)
+        unrated.update(rating=0, updated_at=now)
+        sync_ranking_ratings(user_ids)
+    return len(reviewed)
+
+
+def rating_distribution(user_id):
+    """
+    ``user_id``'s average, review count, Bayesian score and reviews per star.
+    """
+    aggregate = RatingAggregate.objects.filter(user_id=user_id).first() or RatingAggregate(user_id=user_id, bayesian_score=bayesian_score(0, 0))
+    return {
+        'average': average(aggregate.total, aggregate.count),
+        'count': aggregate.count,
+        'bayesian_score': round(aggregate.bayesian_score, 4),
+        'stars': {str(value): getattr(aggregate, f'stars_{value}') for value in STARS},
+    }
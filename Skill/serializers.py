@@ -39,6 +39,15 @@ class TradeSerializer(serializers.ModelSerializer):
 
         return trade
 
+class NewTradeSerializer(serializers.ModelSerializer):
+    # Skill ids are checked all at once by Skill.trades, not with a query each
+    initiator_skills = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=50)
+    desired_skills = serializers.ListField(child=serializers.IntegerField(min_value=1), max_length=50)
+
+    class Meta:
+        model = Trade
+        fields = ['title', 'description', 'initiator_terms', 'initiator_skills', 'desired_skills']
+
 class ReviewSerializer(serializers.ModelSerializer):
     reviewer = serializers.ReadOnlyField(source='reviewer.username')
     reviewee = serializers.ReadOnlyField(source='reviewee.username')
@@ -80,4 +89,48 @@ class QueueResponseSerializer(serializers.Serializer):
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class TradeMatchSerializer(serializers.ModelSerializer):
+    partner_name = serializers.CharField(source='partner.first_name', read_only=True)
+    partner_email = serializers.CharField(source='partner.email', read_only=True)
+    partner_avi = serializers.ImageField(source='partner.avi', read_only=True)
+    partner_rating = serializers.DecimalField(source='partner.rating', max_digits=3, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = TradeMatch
+        fields = ['partner', 'partner_name', 'partner_email', 'partner_avi', 'partner_rating', 'score', 'gets', 'gives']
+
+
+from .skillsets import skill_ids, to_int
+
+
+class BarterCycleMemberSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='user.first_name', read_only=True)
+    email = serializers.CharField(source='user.email', read_only=True)
+    avi = serializers.ImageField(source='user.avi', read_only=True)
+    rating = serializers.DecimalField(source='user.rating', max_digits=3, decimal_places=2, read_only=True)
+    gives = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BarterCycleMember
+        fields = ['user', 'name', 'email', 'avi', 'rating', 'gives']
+
+    def get_gives(self, obj):
+        return obj.gives
+
+
+class BarterCycleSerializer(serializers.ModelSerializer):
+    members = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BarterCycle
+        fields = ['id', 'length', 'members']
+
+    def get_members(self, obj):
+        members = sorted(obj.members.all(), key=lambda member: member.position)
+        for index, member in enumerate(members):
+            # Skills this member offers that the next one needs, from the stored bitsets
+            receiver = members[(index + 1) % len(members)].user
+            member.gives = skill_ids(to_int(member.user.skills_offered_bits) & to_int(receiver.skills_needed_bits))
+        return BarterCycleMemberSerializer(members, many=True, context=self.context).data
@@ -0,0 +1,138 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from base.models import CustomUser
+from base.realtime import publish
+from .autocomplete import skill_index
+from .barter import invalidate_cycles
+from .eligibility import index_open_trades
+from .matchmaking import schedule_refresh
+from .models import Queue, Skill, Trade
+from .rankings import refresh_user_rankings, sync_ranking_ratings
+from .skillsets import refresh_trade_bits, refresh_user_bits
+from .trades import trade_event
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def skill_changed(sender, **kwargs):
+    skill_index.invalidate()
+
+
+@receiver(m2m_changed, sender=CustomUser.skills_offered.through)
+def skills_offered_changed(sender, action, **kwargs):
+    # User counts shown next to each skill
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        skill_index.invalidate()
+
+
+def changed_owner_ids(sender, instance, action, reverse, pk_set, column, **kwargs):
+    """
+    Ids of the users or trades whose skills an m2m_changed signal changed, or
+    None for the pre_* actions. ``column`` is their column in the through table.
+    """
+    if reverse:
+        # Changed from the Skill side: pk_set holds the owners
+        if action == 'pre_clear':
+            instance.__dict__.setdefault('_cleared_owner_ids', {})[sender] = list(
+                sender.objects.filter(skill_id=instance.pk).values_list(column, flat=True)
+            )
+        if action == 'post_clear':
+            return instance.__dict__.get('_cleared_owner_ids', {}).pop(sender, [])
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return None
+    if reverse:
+        return pk_set or []
+    return [instance.pk]
+
+
+def user_skills_updated(user_ids):
+    refresh_user_bits(user_ids)
+    refresh_user_rankings(user_ids)
+    schedule_refresh(user_ids)
+    invalidate_cycles(user_ids)
+
+
+@receiver(m2m_changed, sender=CustomUser.skills_offered.through)
+@receiver(m2m_changed, sender=CustomUser.skills_needed.through)
+def user_skills_changed(sender, **kwargs):
+    user_ids = changed_owner_ids(sender, column='customuser_id', **kwargs)
+    if user_ids is not None:
+        user_skills_updated(user_ids)
+
+
+@receiver(m2m_changed, sender=Trade.desired_skills.through)
+def trade_desired_skills_changed(sender, **kwargs):
+    trade_ids = changed_owner_ids(sender, column='trade_id', **kwargs)
+    if trade_ids is not None:
+        refresh_trade_bits(trade_ids)
+        index_open_trades(trade_ids)
+
+
+@receiver(pre_delete, sender=Skill)
+def skill_deleting(sender, instance, **kwargs):
+    # The cascade removes the M2M rows without sending m2m_changed
+    instance._user_ids = set(CustomUser.skills_offered.through.objects.filter(skill=instance).values_list('customuser_id', flat=True))
+    instance._user_ids.update(CustomUser.skills_needed.through.objects.filter(skill=instance).values_list('customuser_id', flat=True))
+    instance._trade_ids = list(Trade.desired_skills.through.objects.filter(skill=instance).values_list('trade_id', flat=True))
+
+
+@receiver(post_delete, sender=Skill)
+def skill_deleted(sender, instance, **kwargs):
+    user_skills_updated(instance.__dict__.pop('_user_ids', ()))
+    trade_ids = instance.__dict__.pop('_trade_ids', ())
+    refresh_trade_bits(trade_ids)
+    index_open_trades(trade_ids)
+
+
+def queue_event(queue_entry, deleted=False):
+    initiator_id = Trade.objects.filter(id=queue_entry.trade_id).values_list('initiator_id', flat=True).first()
+    publish([initiator_id, queue_entry.user_id], 'queue', {
+        'id': queue_entry.id,
+        'trade': queue_entry.trade_id,
+        'user': queue_entry.user_id,
+        'status': queue_entry.status,
+        'deleted': deleted,
+    })
+
+
+@receiver(post_save, sender=Queue)
+def queue_saved(sender, instance, **kwargs):
+    queue_event(instance)
+
+
+@receiver(post_delete, sender=Queue)
+def queue_deleted(sender, instance, **kwargs):
+    queue_event(instance, deleted=True)
+
+
+@receiver(post_init, sender=Trade)
+def trade_loaded(sender, instance, **kwargs):
+    # Remember the stored status so trade_saved only reports transitions
+    instance._published_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Trade)
+def trade_saved(sender, instance, created, **kwargs):
+    if not created and instance.status == instance._published_status:
+        return
+
+    instance._published_status = instance.status
+    trade_event(instance)
+    index_open_trades([instance.id])
+
+
+@receiver(post_init, sender=CustomUser)
+def user_loaded(sender, instance, **kwargs):
+    instance._ranked_rating = instance.__dict__.get('rating')
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # A rating saved on the user, e.g. from the admin; Skill.ratings syncs the
+    # ratings it updates itself
+    if created or 'rating' not in instance.__dict__ or (update_fields is not None and 'rating' not in update_fields):
+        return
+    if instance.rating != instance._ranked_rating:
+        sync_ranking_ratings([instance.id])
+        instance._ranked_rating = instance.rating
@@ -0,0 +1,92 @@
+from django.utils import timezone
+
+from base.models import CustomUser
+from .models import Trade
+
+
+# Compact skill sets. A set of skill ids is stored as a little-endian bitset
+# where bit ``id`` is set for every skill in it, so "does A cover B" and "how
+# many skills do A and B share" are integer operations instead of queries.
+# CustomUser keeps one for skills_offered and one for skills_needed, and Trade
+# one for desired_skills, refreshed by the m2m_changed receivers in
+# Skill.signals. Eligibility checks are then a subset test on the loaded rows.
+# rebuild_skill_bitsets recomputes them all, e.g. after a deploy that adds one.
+
+
+def to_bits(skill_ids):
+    value = 0
+    for skill_id in skill_ids:
+        value |= 1 << skill_id
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def to_int(bits):
+    return int.from_bytes(bytes(bits or b''), 'little')
+
+
+def skill_ids(bits):
+    # Also takes an int, e.g. the AND of two sets
+    value = bits if isinstance(bits, int) else to_int(bits)
+    ids = []
+    while value:
+        low = value & -value
+        ids.append(low.bit_length() - 1)
+        value ^= low
+    return ids
+
+
+def refresh_user_bits(user_ids):
+    """
+    Recompute the offered/needed bitsets of ``user_ids`` from the M2M tables.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    offered = {user_id: [] for user_id in user_ids}
+    needed = {user_id: [] for user_id in user_ids}
+    for user_id, skill_id in CustomUser.skills_offered.through.objects.filter(customuser_id__in=user_ids).values_list('customuser_id', 'skill_id'):
+        offered[user_id].append(skill_id)
+    for user_id, skill_id in CustomUser.skills_needed.through.objects.filter(customuser_id__in=user_ids).values_list('customuser_id', 'skill_id'):
+        needed[user_id].append(skill_id)
+
+    now = timezone.now()
+    for user_id in user_ids:
+        CustomUser.objects.filter(id=user_id).update(
+            skills_offered_bits=to_bits(offered[user_id]),
+            skills_needed_bits=to_bits(needed[user_id]),
+            updated_at=now,
+        )
+
+
+def has_skill(bits, skill_id):
+    return bool(to_int(bits) >> int(skill_id) & 1)
+
+
+def skill_count(bits):
+    value = bits if isinstance(bits, int) else to_int(bits)
+    return bin(value).count('1')
+
+
+def missing_skills(required_bits, offered_bits):
+    """
+    Ids of the skills in ``required_bits`` that ``offered_bits`` lacks.
+    """
+    return skill_ids(to_int(required_bits) & ~to_int(offered_bits))
+
+
+def refresh_trade_bits(trade_ids):
+    """
+    Recompute the desired skills bitset of ``trade_ids`` from the M2M table.
+    """
+    trade_ids = set(trade_ids)
+    if not trade_ids:
+        return
+
+    desired = {trade_id: [] for trade_id in trade_ids}
+    for trade_id, skill_id in Trade.desired_skills.through.objects.filter(trade_id__in=trade_ids).values_list('trade_id', 'skill_id'):
+        desired[trade_id].append(skill_id)
+
+    now = timezone.now()
+    for trade_id in trade_ids:
+        Trade.objects.filter(id=trade_id).update(desired_skills_bits=to_bits(desired[trade_id]), updated_at=now)
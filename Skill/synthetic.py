@@ -0,0 +1,210 @@
+import random
+
+
+# Synthetic marketplace data for generate_data. Every row is drawn from its own
+# RNG, seeded with (seed, table, row number), so a dataset comes out the same
+# however it is chunked or spread over processes, and any row can be drawn
+# again where it is needed: a trade redraws its initiator's skills rather than
+# reading them back. Users and trades are numbered from 0 here; the command
+# maps numbers to ids and skill positions to skill ids.
+#
+# Like Skill.cycles this module imports nothing from Django, so a process pool
+# can draw chunks of rows and send them back as plain tuples to be written.
+
+USERS, TRADES, QUEUE, MESSAGES, POSTS, REVIEWS = range(6)
+
+CATEGORIES = [
+    'Programming', 'Design', 'Writing', 'Marketing', 'Sales',
+    'Management', 'Finance', 'Engineering', 'Healthcare', 'Education',
+]
+WORDS = [
+    'Web', 'Mobile', 'Data', 'Cloud', 'Brand', 'Content', 'Product', 'Project',
+    'Audio', 'Video', 'Print', 'Retail', 'Social', 'Tax', 'Budget', 'Civil',
+    'Solar', 'Dental', 'Nursing', 'Language', 'Music', 'Math', 'Science', 'Art',
+    'Legal', 'Event', 'Travel', 'Food', 'Fitness', 'Garden', 'Repair', 'Craft',
+]
+FIRST_NAMES = [
+    'Amina', 'Brian', 'Chloe', 'David', 'Esther', 'Faith', 'George', 'Halima',
+    'Ian', 'Joy', 'Kevin', 'Lucy', 'Mark', 'Njeri', 'Otieno', 'Purity',
+    'Quinn', 'Ruth', 'Samuel', 'Tabitha', 'Umar', 'Vera', 'Wanjiku', 'Yusuf',
+]
+LAST_NAMES = [
+    'Achieng', 'Barasa', 'Chebet', 'Kamau', 'Kariuki', 'Kiprop', 'Mutua',
+    'Mwangi', 'Njoroge', 'Ochieng', 'Odhiambo', 'Omondi', 'Onyango', 'Wafula',
+]
+# (name, latitude, longitude)
+CITIES = [
+    ('Nairobi', -1.286, 36.817), ('Mombasa', -4.043, 39.668), ('Kisumu', -0.091, 34.768),
+    ('Nakuru', -0.303, 36.080), ('Eldoret', 0.514, 35.270), ('Kampala', 0.347, 32.582),
+    ('Dar es Salaam', -6.792, 39.208), ('Kigali', -1.944, 30.062), ('Lagos', 6.524, 3.379),
+    ('Accra', 5.603, -0.187), ('London', 51.507, -0.128), ('New York', 40.713, -74.006),
+]
+STATUSES = ['Pending', 'Accepted', 'Completed', 'Cancelled']
+STATUS_WEIGHTS = [50, 15, 30, 5]
+STARS = [1, 2, 3, 4, 5]
+STAR_WEIGHTS = [3, 5, 12, 35, 45]
+
+
+def rng(seed, table, number):
+    return random.Random(((seed * 8 + table) << 40) | number)
+
+
+def skill_name(position):
+    word = WORDS[position % len(WORDS)]
+    category = CATEGORIES[position // len(WORDS) % len(CATEGORIES)]
+    repeat = position // (len(WORDS) * len(CATEGORIES))
+    return f'{word} {category} {repeat + 1}' if repeat else f'{word} {category}'
+
+
+def _skills(r, skill_count, count, exclude=()):
+    # Positions skewed towards the low ones, so some skills are far more common
+    picked = set()
+    for _ in range(count * 4):
+        if len(picked) == count:
+            break
+        position = int(skill_count * r.random() ** 2)
+        if position not in exclude:
+            picked.add(position)
+    return sorted(picked)
+
+
+def _other(r, count, number):
+    # Any number below ``count`` but ``number``
+    other = r.randrange(count - 1)
+    return other + (other >= number)
+
+
+def _sentence(r, words=8):
+    return ' '.join(r.choice(WORDS).lower() for _ in range(words)).capitalize() + '.'
+
+
+def _place(r):
+    name, latitude, longitude = r.choice(CITIES)
+    return name, round(latitude + r.uniform(-0.1, 0.1), 6), round(longitude + r.uniform(-0.1, 0.1), 6)
+
+
+def user_skills(r, context):
+    """
+    Skill positions a user offers and needs, drawn first from their RNG.
+    """
+    per_user = context['skills_per_user']
+    offered = _skills(r, context['skills'], r.randint(1, per_user))
+    needed = _skills(r, context['skills'], r.randint(0, per_user), exclude=offered)
+    return offered, needed
+
+
+def user_row(seed, number, context):
+    r = rng(seed, USERS, number)
+    offered, needed = user_skills(r, context)
+    place = _place(r) if r.random() < 0.7 else None
+    return (
+        offered,
+        needed,
+        r.choice(FIRST_NAMES),
+        r.choice(LAST_NAMES),
+        _sentence(r, 12),
+        place,
+        r.random() < 0.3,  # is_verified
+        r.random() < 0.1,  # isPrivate
+    )
+
+
+def trade_parties(seed, number, context):
+    """
+    The RNG of a trade with its initiator, status and responder, drawn first so
+    rows pointing at a trade can stop there.
+    """
+    r = rng(seed, TRADES, number)
+    initiator = r.randrange(context['users'])
+    status = r.choices(STATUSES, STATUS_WEIGHTS)[0]
+    responder = _other(r, context['users'], initiator) if status in ('Accepted', 'Completed') else None
+    return r, initiator, status, responder
+
+
+def trade_row(seed, number, context):
+    r, initiator, status, responder = trade_parties(seed, number, context)
+    offered, _ = user_skills(rng(seed, USERS, initiator), context)
+    initiator_skills = sorted(r.sample(offered, r.randint(1, len(offered))))
+    desired = _skills(r, context['skills'], r.randint(0, 3), exclude=offered)
+    # Accepting a trade records everything the responder offers
+    responder_skills = user_skills(rng(seed, USERS, responder), context)[0] if responder is not None else []
+
+    title = f'{r.choice(WORDS)} for {r.choice(WORDS).lower()}'
+    return (
+        initiator,
+        responder,
+        status,
+        initiator_skills,
+        desired,
+        responder_skills,
+        title,
+        _sentence(r, 16),
+        _sentence(r, 6),
+        _sentence(r, 6) if responder is not None else '',
+    )
+
+
+def queue_row(seed, number, context):
+    # An application or invitation to a pending trade
+    r = rng(seed, QUEUE, number)
+    for _ in range(20):
+        trade = r.randrange(context['trades'])
+        _, initiator, status, _ = trade_parties(seed, trade, context)
+        if status == 'Pending':
+            break
+    return trade, _other(r, context['users'], initiator), 'Applied' if r.random() < 0.8 else 'Invited'
+
+
+def message_row(seed, number, context):
+    # Between the two sides of a trade, or someone asking its initiator about it
+    r = rng(seed, MESSAGES, number)
+    trade = r.randrange(context['trades'])
+    _, initiator, _, responder = trade_parties(seed, trade, context)
+    if responder is None:
+        sender, receiver = _other(r, context['users'], initiator), initiator
+    elif r.random() < 0.5:
+        sender, receiver = initiator, responder
+    else:
+        sender, receiver = responder, initiator
+    return trade, sender, receiver, _sentence(r, r.randint(3, 20))
+
+
+def post_row(seed, number, context):
+    r = rng(seed, POSTS, number)
+    is_slice = r.random() < 0.2
+    return (
+        r.randrange(context['users']),
+        f'{r.choice(WORDS)} {r.choice(CATEGORIES).lower()}',
+        _sentence(r, r.randint(5, 25)),
+        is_slice,
+        r.randint(100, 500000) if is_slice else 0,  # Price in cents
+        _place(r) if r.random() < 0.5 else None,
+    )
+
+
+def review_row(seed, trade, context):
+    # Numbered by the completed trade it reviews; the responder rates the initiator
+    r = rng(seed, REVIEWS, trade)
+    _, initiator, _, responder = trade_parties(seed, trade, context)
+    stars = r.choices(STARS, STAR_WEIGHTS)[0]
+    # Half stars count towards the star above, as in Skill.ratings
+    rating = stars - r.choice([0, 0, 0.5]) if stars > 1 else stars
+    return trade, responder, initiator, f'{rating:.2f}', _sentence(r, r.randint(3, 15))
+
+
+ROWS = {
+    USERS: user_row,
+    TRADES: trade_row,
+    QUEUE: queue_row,
+    MESSAGES: message_row,
+    POSTS: post_row,
+    REVIEWS: review_row,
+}
+
+
+def draw(table, seed, numbers, context):
+    """
+    The rows of ``table`` numbered ``numbers``, in order.
+    """
+    row = ROWS[table]
+    return [row(seed, number, context) for number in numbers]
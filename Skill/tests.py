@@ -1,3 +1,296 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from base.models import CustomUser
+from . import barter
+from .autocomplete import SkillIndex, skill_index
+from .eligibility import eligible_trade_ids, rebuild_open_trade_index
+from .fit import fit_score, rescore_queues
+from .matchmaking import patch_partner_lists, rebuild_matches
+from .models import BarterCycle, OpenTradeSkill, Queue, Skill, SkillRanking, Trade, TradeMatch
+from .rankings import RankedUsers, rebuild_rankings
+from .transitions import TradeConflict, accept
+
+
+class AcceptConflictTests(TestCase):
+    def setUp(self):
+        self.initiator = CustomUser.objects.create(username='initiator', email='initiator@example.com')
+        self.first = CustomUser.objects.create(username='first', email='first@example.com')
+        self.second = CustomUser.objects.create(username='second', email='second@example.com')
+        self.trade = Trade.objects.create(initiator=self.initiator, title='trade')
+        self.trade.desired_skills.set([Skill.objects.create(name='Design')])
+        self.first_entry = Queue.objects.create(trade=self.trade, user=self.first)
+        self.second_entry = Queue.objects.create(trade=self.trade, user=self.second)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.initiator)
+
+    def post_accept(self, entry):
+        return self.client.post('/api/v2/accept/', {
+            'queue_id': entry.id, 'action': 'accept', 'responder_terms': 'terms',
+        }, format='json')
+
+    def assert_accepted_by_first(self):
+        trade = Trade.objects.get(id=self.trade.id)
+        self.assertEqual((trade.status, trade.responder_id), ('Accepted', self.first.id))
+        self.assertEqual(list(Queue.objects.filter(trade=trade).values_list('id', 'status')), [(self.first_entry.id, 'Accepted')])
+        self.assertFalse(OpenTradeSkill.objects.filter(trade_id=trade.id).exists())
+
+    def test_second_accept_gets_409(self):
+        self.assertTrue(OpenTradeSkill.objects.filter(trade_id=self.trade.id).exists())
+
+        self.assertEqual(self.post_accept(self.first_entry).status_code, status.HTTP_200_OK)
+        # The rest of the queue is gone, so a second accept can only come from a resubmit
+        response = self.post_accept(self.first_entry)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assert_accepted_by_first()
+
+    def test_racing_accept_loses_on_the_conditional_update(self):
+        # Both requests loaded the trade while it was still Pending
+        stale = Trade.objects.get(id=self.trade.id)
+        accept(self.trade, self.first_entry, 'terms')
+
+        with self.assertRaises(TradeConflict):
+            accept(stale, Queue.objects.get(id=self.first_entry.id), 'other terms')
+
+        self.assert_accepted_by_first()
+
+
+class RebuildMatchesTests(TestCase):
+    def test_replaces_every_list(self):
+        design, writing = Skill.objects.create(name='Design'), Skill.objects.create(name='Writing')
+        first, second, idle = [CustomUser.objects.create(username=name, email=f'{name}@example.com') for name in ('first', 'second', 'idle')]
+        first.skills_offered.add(design)
+        first.skills_needed.add(writing)
+        second.skills_offered.add(writing)
+        second.skills_needed.add(design)
+        # Left over from before: idle no longer matches anyone, first's list is out of date
+        TradeMatch.objects.create(user=idle, partner=first, score=1, gets=1, gives=1)
+        TradeMatch.objects.create(user=first, partner=idle, score=4, gets=2, gives=2)
+
+        self.assertEqual(rebuild_matches(), 2)
+        self.assertEqual(
+            set(TradeMatch.objects.values_list('user_id', 'partner_id', 'score')),
+            {(first.id, second.id, 1), (second.id, first.id, 1)},
+        )
+
+
+class PatchPartnerListsTests(TestCase):
+    @mock.patch('Skill.matchmaking.CHUNK_SIZE', 2)
+    def test_drops_the_user_from_lists_it_left_in_chunks(self):
+        user, *owners = [CustomUser.objects.create(username=str(index), email=f'{index}@example.com') for index in range(6)]
+        TradeMatch.objects.bulk_create([
+            TradeMatch(user=owner, partner=user, score=1, gets=1, gives=1) for owner in owners
+        ])
+        engine = SimpleNamespace(ids=np.array([owner.id for owner in owners]))
+
+        # Only the first owner still overlaps with the user
+        with mock.patch('Skill.matchmaking.match_engine', engine):
+            patch_partner_lists(user.id, np.array([2, 0, 0, 0, 0]), np.array([3, 0, 0, 0, 0]))
+
+        self.assertEqual(
+            list(TradeMatch.objects.filter(partner=user).values_list('user_id', 'score', 'gets', 'gives')),
+            [(owners[0].id, 6, 3, 2)],
+        )
+
+
+class NewTradeSkillTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='user', email='user@example.com')
+        self.skill = Skill.objects.create(name='Design')
+        self.user.skills_offered.add(self.skill)
+        self.user.refresh_from_db()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_trade(self, initiator_skills, desired_skills=()):
+        return self.client.post('/api/v2/new/', {
+            'title': 'trade', 'description': 'description', 'initiator_terms': 'terms',
+            'initiator_skills': initiator_skills, 'desired_skills': list(desired_skills),
+        }, format='json')
+
+    def test_rejects_ids_that_are_not_skills(self):
+        self.assertEqual(self.post_trade([-1]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post_trade([self.skill.id], [0]).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.post_trade([10 ** 9])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'error': f'Skill with ID {10 ** 9} does not exist.'})
+
+    def test_creates_a_trade_from_offered_skills(self):
+        self.assertEqual(self.post_trade([self.skill.id]).status_code, status.HTTP_201_CREATED)
+
+
+class BarterCycleTests(TestCase):
+    @mock.patch('Skill.barter.get_executor')
+    def test_stale_cycles_are_served_while_a_search_is_queued(self, get_executor):
+        user = CustomUser.objects.create(username='user', email='user@example.com')
+        cycle = BarterCycle.objects.create(user=user, length=3)
+        self.addCleanup(barter._scanning.discard, user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(list(barter.get_cycles(user)), [cycle])
+            self.assertEqual(list(barter.get_cycles(user)), [cycle])
+
+        # Searched on the worker, once
+        get_executor.return_value.submit.assert_called_once_with(barter._run_scan, user.id)
+
+
+class SkillAutocompleteTests(TestCase):
+    def setUp(self):
+        self.web, self.graphic, self.python = [
+            Skill.objects.create(name=name) for name in ('Web Design', 'Graphic Design', 'Python')
+        ]
+        user = CustomUser.objects.create(username='user', email='user@example.com')
+        user.skills_offered.add(self.graphic)
+        self.index = SkillIndex()
+
+    def test_prefixes_of_any_word_rank_by_popularity(self):
+        self.assertEqual(
+            self.index.complete('des'),
+            [(self.graphic.id, 'Graphic Design', 1), (self.web.id, 'Web Design', 0)],
+        )
+        self.assertEqual([row[0] for row in self.index.complete('web d')], [self.web.id])
+
+    def test_misspellings_fall_back_to_trigrams(self):
+        self.assertEqual([row[0] for row in self.index.complete('pyhton')], [self.python.id])
+        self.assertEqual(self.index.resolve('pithon'), [self.python.id])
+        self.assertEqual(sorted(self.index.resolve('sign')), sorted([self.web.id, self.graphic.id]))
+
+    def test_skill_changes_mark_the_index_stale(self):
+        skill_index.ensure_built()
+        Skill.objects.create(name='Rust')
+        self.assertTrue(skill_index.stale)
+
+
+@override_settings(QUEUE_FIT_WEIGHTS={'skills': 0.6, 'rating': 0.3, 'proximity': 0.1}, QUEUE_FIT_PROXIMITY_KM=10)
+class FitScoreTests(TestCase):
+    def setUp(self):
+        teaching, design, writing = [Skill.objects.create(name=name) for name in ('Teaching', 'Design', 'Writing')]
+        self.initiator = self.user('initiator', offered=[teaching], latitude=-1.29, longitude=36.82)
+        self.trade = Trade.objects.create(initiator=self.initiator, title='trade')
+        self.trade.initiator_skills.set([teaching])
+        self.trade.desired_skills.set([design, writing])
+        self.trade.refresh_from_db()
+
+        self.match = self.user('match', offered=[design, writing], needed=[teaching], latitude=-1.29, longitude=36.82)
+        self.partial = self.user('partial', offered=[design])
+
+    def user(self, name, offered=(), needed=(), **fields):
+        user = CustomUser.objects.create(username=name, email=f'{name}@example.com', **fields)
+        user.skills_offered.set(offered)
+        user.skills_needed.set(needed)
+        user.refresh_from_db()
+        return user
+
+    def test_blends_skills_rating_and_proximity(self):
+        self.assertEqual(fit_score(self.trade, self.initiator, self.match, rating=5), 1.0)
+        # Half the desired skills and none of the offered ones, rated 2.5 and no location
+        self.assertEqual(fit_score(self.trade, self.initiator, self.partial, rating=2.5), 0.3)
+
+    def test_rescoring_matches_the_score_taken_on_joining(self):
+        entries = [Queue.objects.create(trade=self.trade, user=user) for user in (self.partial, self.match)]
+
+        self.assertEqual(rescore_queues(batch_size=1), 2)
+
+        for entry in entries:
+            entry.refresh_from_db()
+            self.assertEqual(entry.fit_score, fit_score(self.trade, self.initiator, entry.user))
+        self.assertGreater(entries[1].fit_score, entries[0].fit_score)
+
+
+class EligibleTradeTests(TestCase):
+    def setUp(self):
+        self.design, self.writing, self.cooking = [Skill.objects.create(name=name) for name in ('Design', 'Writing', 'Cooking')]
+        self.initiator = CustomUser.objects.create(username='initiator', email='initiator@example.com')
+        self.user = CustomUser.objects.create(username='user', email='user@example.com')
+        self.user.skills_offered.set([self.design, self.writing])
+        self.user.refresh_from_db()
+
+        self.anything = self.trade([])
+        self.design_only = self.trade([self.design])
+        self.both = self.trade([self.design, self.writing])
+        self.cooking_too = self.trade([self.design, self.cooking])
+
+    def trade(self, desired):
+        trade = Trade.objects.create(initiator=self.initiator, title='trade')
+        trade.desired_skills.set(desired)
+        return trade
+
+    def eligible(self, user):
+        return set(Trade.objects.filter(id__in=eligible_trade_ids(user)))
+
+    def test_trades_whose_desired_skills_the_user_all_offers(self):
+        self.assertEqual(self.eligible(self.user), {self.anything, self.design_only, self.both})
+        # Someone offering nothing can still take a trade that desires nothing
+        self.assertEqual(self.eligible(self.initiator), {self.anything})
+
+    def test_index_follows_desired_skills_and_status(self):
+        self.cooking_too.desired_skills.remove(self.cooking)
+        self.both.status = 'Cancelled'
+        self.both.save()
+
+        self.assertEqual(self.eligible(self.user), {self.anything, self.design_only, self.cooking_too})
+        self.assertEqual(rebuild_open_trade_index(batch_size=2), 3)
+        self.assertEqual(self.eligible(self.user), {self.anything, self.design_only, self.cooking_too})
+
+    def test_view_leaves_out_joined_trades(self):
+        Queue.objects.create(trade=self.design_only, user=self.user)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/v2/trades/eligible/')
+
+        self.assertEqual([trade['id'] for trade in response.data['results']], [self.both.id, self.anything.id])
+
+
+class RankedUsersTests(TestCase):
+    def setUp(self):
+        self.design, self.writing, self.cooking = [Skill.objects.create(name=name) for name in ('Design', 'Writing', 'Cooking')]
+        self.viewer = CustomUser.objects.create(username='viewer', email='viewer@example.com')
+        # Three users tie on 4.50, two of them listed under both searched skills
+        self.users = []
+        for index, (rating, skills) in enumerate([
+            ('4.50', [self.design]),
+            ('4.50', [self.design, self.writing]),
+            ('4.50', [self.writing, self.design]),
+            ('3.00', [self.writing]),
+            ('5.00', [self.design]),
+            ('4.00', [self.cooking]),
+        ]):
+            user = CustomUser.objects.create(username=f'user{index}', email=f'user{index}@example.com', rating=rating)
+            user.skills_offered.set(skills)
+            self.users.append(user)
+        offering = [user for user in self.users if {self.design, self.writing} & set(user.skills_offered.all())]
+        self.expected = [user.id for user in sorted(offering, key=lambda user: (user.rating, user.id), reverse=True)]
+
+    def test_slices_merge_skills_without_duplicates(self):
+        users = RankedUsers([self.design.id, self.writing.id])
+
+        self.assertEqual(users.count(), 5)
+        self.assertEqual([user.id for user in users[1:4]], self.expected[1:4])
+
+    def test_cursor_pages_cover_every_user_once(self):
+        client = APIClient()
+        client.force_authenticate(self.viewer)
+        seen = []
+        url = f'/api/v2/users/?skill_ids={self.design.id},{self.writing.id}&pagination=cursor&page_size=2'
+        while url:
+            response = client.get(url)
+            seen.extend(user['id'] for user in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, self.expected)
+
+    def test_rebuild_refills_the_rows(self):
+        rows = set(SkillRanking.objects.values_list('skill_id', 'user_id', 'rating'))
+        SkillRanking.objects.all().delete()
+
+        self.assertEqual(rebuild_rankings(batch_size=2), len(rows))
+        self.assertEqual(set(SkillRanking.objects.values_list('skill_id', 'user_id', 'rating')), rows)
@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+
+from base.realtime import publish
+from base.search import index_objects
+from .eligibility import open_trade_rows
+from .models import OpenTradeSkill, Skill, Trade
+from .skillsets import missing_skills, to_bits
+
+
+# Creating trades in bulk. Every skill id of a batch is checked with a single
+# query and ownership against the initiator's skill bitset; trades and their
+# skill rows are then written with bulk inserts in one transaction. Neither
+# bulk_create nor the bulk M2M inserts send signals, so what the receivers would
+# do per row (search index, desired skills bitset, open trade index, realtime
+# event) happens here.
+
+TRADE_BATCH_LIMIT = 100
+
+
+def trade_event(trade):
+    publish([trade.initiator_id, trade.responder_id], 'trade', {
+        'id': trade.id,
+        'status': trade.status,
+        'initiator': trade.initiator_id,
+        'responder': trade.responder_id,
+    })
+
+
+def check_trade_skills(user, items):
+    """
+    {index: error} for the validated NewTradeSerializer payloads in ``items``
+    whose skills do not exist or, for the initiator's, are not in ``user``'s profile.
+    """
+    skill_ids = {skill_id for item in items for skill_id in item['initiator_skills'] + item['desired_skills']}
+    known = set(Skill.objects.filter(id__in=skill_ids).values_list('id', flat=True))
+
+    errors = {}
+    for index, item in enumerate(items):
+        unknown = [skill_id for skill_id in item['initiator_skills'] if skill_id not in known]
+        if unknown:
+            errors[index] = f"Skill with ID {unknown[0]} does not exist."
+            continue
+
+        # Only ids of real skills reach to_bits, which sizes the bitset by the largest id
+        not_offered = missing_skills(to_bits(item['initiator_skills']), user.skills_offered_bits)
+        unknown_desired = [skill_id for skill_id in item['desired_skills'] if skill_id not in known]
+        if not_offered:
+            errors[index] = f"You do not have the skill with ID {not_offered[0]} in your profile."
+        elif unknown_desired:
+            errors[index] = f"Desired skill with ID {unknown_desired[0]} does not exist."
+    return errors
+
+
+def create_trades(user, items):
+    """
+    Create a pending trade initiated by ``user`` for every checked payload in
+    ``items`` and return them with their skills loaded.
+    """
+    trades = []
+    skills = []
+    for item in items:
+        item = dict(item)
+        initiator_skills = list(dict.fromkeys(item.pop('initiator_skills')))
+        desired_skills = list(dict.fromkeys(item.pop('desired_skills')))
+        trades.append(Trade(initiator=user, status='Pending', desired_skills_bits=to_bits(desired_skills), **item))
+        skills.append((initiator_skills, desired_skills))
+
+    InitiatorSkill = Trade.initiator_skills.through
+    DesiredSkill = Trade.desired_skills.through
+    with transaction.atomic():
+        Trade.objects.bulk_create(trades)
+        InitiatorSkill.objects.bulk_create([
+            InitiatorSkill(trade_id=trade.id, skill_id=skill_id)
+            for trade, (initiator_skills, _) in zip(trades, skills)
+            for skill_id in initiator_skills
+        ])
+        DesiredSkill.objects.bulk_create([
+            DesiredSkill(trade_id=trade.id, skill_id=skill_id)
+            for trade, (_, desired_skills) in zip(trades, skills)
+            for skill_id in desired_skills
+        ])
+        OpenTradeSkill.objects.bulk_create([
+            row
+            for trade, (_, desired_skills) in zip(trades, skills)
+            for row in open_trade_rows(trade.id, desired_skills)
+        ])
+
+        index_objects(Trade, trades)
+        for trade in trades:
+            trade_event(trade)
+
+    prefetch_related_objects(trades, 'initiator_skills', 'responder_skills', 'desired_skills')
+    return trades
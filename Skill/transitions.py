@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .eligibility import close_trade
+from .models import Queue, Trade
+from .skillsets import skill_ids
+from .trades import trade_event
+
+
+# Trade state machine. A trade goes Pending -> Accepted -> Completed, and can
+# be Cancelled before it completes. Every transition is one conditional
+# UPDATE ... WHERE status = <the status the caller saw>, so of two requests
+# racing to accept (or complete, or cancel) the same trade exactly one changes
+# the row; the other gets TradeConflict, which the views turn into a 409.
+# QuerySet.update() sends no post_save, so the realtime trade event and open
+# trade index update that Skill.signals would do are done here.
+
+TRANSITIONS = {
+    'Pending': {'Accepted', 'Cancelled'},
+    'Accepted': {'Completed', 'Cancelled'},
+}
+
+
+class TradeConflict(Exception):
+    pass
+
+
+def transition(trade, status, **values):
+    """
+    Move ``trade`` from the status it was loaded with to ``status``, setting
+    ``values`` with it. Raises TradeConflict if that transition is not allowed
+    or the trade has changed since it was loaded.
+    """
+    if status not in TRANSITIONS.get(trade.status, ()):
+        raise TradeConflict(f"A trade cannot go from {trade.status} to {status}.")
+
+    values = {'status': status, 'updated_at': timezone.now(), **values}
+    if not Trade.objects.filter(id=trade.id, status=trade.status).update(**values):
+        raise TradeConflict("This trade has already been updated by someone else.")
+
+    for field, value in values.items():
+        setattr(trade, field, value)
+    trade._published_status = status
+    trade_event(trade)
+    # Every transition leaves Pending
+    close_trade(trade.id)
+
+
+def accept(trade, queue_entry, responder_terms):
+    """
+    Make ``queue_entry``'s user the responder of ``trade`` and drop the rest of the queue.
+    """
+    responder = queue_entry.user
+    with transaction.atomic():
+        transition(trade, 'Accepted', responder_id=responder.id, responder_terms=responder_terms)
+        trade.responder_skills.set(skill_ids(responder.skills_offered_bits))
+
+        queue_entry.status = 'Accepted'
+        queue_entry.accepted_at = timezone.now()
+        queue_entry.save()
+
+        Queue.objects.filter(trade=trade).exclude(id=queue_entry.id).delete()
+
+
+def complete(trade):
+    transition(trade, 'Completed', completed_at=timezone.now())
+
+
+def cancel(trade):
+    transition(trade, 'Cancelled')
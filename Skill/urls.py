@@ -3,6 +3,9 @@ from .views import *
 
 urlpatterns = [
     path('users/', UserListView.as_view(), name='user-list'),#
+    path('skills/autocomplete/', SkillAutocompleteView.as_view(), name='skill-autocomplete'),
+    path('matches/', TradeMatchListView.as_view(), name='trade-matches'),
+    path('cycles/', BarterCycleListView.as_view(), name='barter-cycles'),
     path('new/', CreateTradeView.as_view(), name='new-trade'),#
     path('add-skill/', AddSkillView.as_view(), name='add-skill'),#
     path('remove-skill/', RemoveSkillView.as_view(), name='remove-skill'),#
@@ -13,6 +16,7 @@ urlpatterns = [
     path('remove-from-trade/', RemoveFromTradeView.as_view(), name='remove-from-trade'),
     path('remove-self-from-trade/', RemoveSelfFromTradeView.as_view(), name='remove-self-from-trade'),
     path('complete-trade/', CompleteTradeView.as_view(), name='complete-trade'),
+    path('cancel-trade/', CancelTradeView.as_view(), name='cancel-trade'),
     path('create-message/', CreateMessageView.as_view(), name='create-message'),
     path('list-messages/', ListMessagesView.as_view(), name='list-messages'),
     path('delete-message/', DeleteMessageView.as_view(), name='delete-message'),
@@ -20,7 +24,9 @@ urlpatterns = [
     path('update-review/', UpdateReviewView.as_view(), name='update-review'),
     path('delete-review/', DeleteReviewView.as_view(), name='delete-review'),
     path('list-reviews/', ListReviewsView.as_view(), name='list-reviews'),
+    path('ratings/<int:user_id>/', RatingDistributionView.as_view(), name='rating-distribution'),
     path('trades/', TradeListView.as_view(), name='trade-list'),
+    path('trades/eligible/', EligibleTradeListView.as_view(), name='eligible-trades'),
     path('trades/<int:pk>/', TradeDetailView.as_view(), name='trade-detail'),
     path('trades/<int:trade_id>/queues/', QueueListView.as_view(), name='queue-list'),
 
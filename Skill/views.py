@@ -7,9 +7,26 @@ from .serializers import SkillSerializer, TradeSerializer, QueueSerializer, Queu
 from base.models import *
 from django.utils import timezone
 
-from django.db.models import Avg
+from django.db import transaction
 from rest_framework.pagination import PageNumberPagination
 from base.serializers import *
+from base.pagination import SizedPageNumberPagination, get_paginator
+from base.search import search
+from base.geo import apply_geo_filter, has_geo_filter
+from base.realtime import publish
+
+# The star imports above shadow the trade Message model and its serializer with
+# the direct-message ones from base; the trade views need these
+from .models import Message
+from .serializers import MessageSerializer
+from .autocomplete import skill_index
+from .serializers import NewTradeSerializer
+from .skillsets import has_skill, missing_skills, skill_count
+from .trades import TRADE_BATCH_LIMIT, check_trade_skills, create_trades
+from .ratings import parse_rating, rating_distribution, record_rating
+from .transitions import TradeConflict, accept, cancel, complete
+from .fit import fit_score
+from .rankings import RankedUsers
 
 
 class AddSkillView(APIView):
@@ -27,14 +44,14 @@ class AddSkillView(APIView):
         except Skill.DoesNotExist:
             return Response({"error": "Skill does not exist."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if user.skills_offered.count() >= 10:
+        if skill_count(user.skills_offered_bits) >= 10:
             return Response({"error": "You cannot add more than 10 skills."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if user.skills_offered.filter(id=skill.id).exists():
+        if has_skill(user.skills_offered_bits, skill.id):
             return Response({"error": "You have already added this skill."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # No save(): it would write back the skill bitsets loaded before the change
         user.skills_offered.add(skill)
-        user.save()
 
         return Response({"message": f"Skill '{skill.name}' added successfully."}, status=status.HTTP_201_CREATED)
 
@@ -55,70 +72,66 @@ class RemoveSkillView(APIView):
         except Skill.DoesNotExist:
             return Response({"error": "Skill does not exist."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not user.skills_offered.filter(id=skill.id).exists():
+        if not has_skill(user.skills_offered_bits, skill.id):
             return Response({"error": "You do not have this skill in your profile."}, status=status.HTTP_400_BAD_REQUEST)
 
         user.skills_offered.remove(skill)
-        user.save()
 
         return Response({"message": f"Skill '{skill.name}' removed successfully."}, status=status.HTTP_200_OK)
 
 class CreateTradeView(APIView):
+    """
+    Create a trade offering some of the user's skills for ``desired_skills``.
+    A JSON list (or ``{"trades": [...]}``) creates a batch; valid items are
+    created and invalid ones reported by index.
+    """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         user = request.user
         data = request.data
 
+        if isinstance(data, list) or isinstance(data.get('trades'), list):
+            return self.create_batch(request, data if isinstance(data, list) else data['trades'])
+
         # Validate the input data
-        serializer = TradeSerializer(data=data)
+        serializer = NewTradeSerializer(data=data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Get the initiator skills from the user's skills
-        initiator_skills = data.get('initiator_skills', [])
-        if not initiator_skills:
-            return Response({"error": "Initiator skills are required."}, status=status.HTTP_400_BAD_REQUEST)
+        error = check_trade_skills(user, [serializer.validated_data]).get(0)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
 
-        for skill_id in initiator_skills:
-            try:
-                skill = Skill.objects.get(id=skill_id)
-            except Skill.DoesNotExist:
-                return Response({"error": f"Skill with ID {skill_id} does not exist."}, status=status.HTTP_400_BAD_REQUEST)
+        trade, = create_trades(user, [serializer.validated_data])
 
-            if not user.skills_offered.filter(id=skill.id).exists():
-                return Response({"error": f"You do not have the skill with ID {skill_id} in your profile."}, status=status.HTTP_400_BAD_REQUEST)
+        # Serialize the created trade object
+        trade_serializer = TradeSerializer(trade)
+        return Response(trade_serializer.data, status=status.HTTP_201_CREATED)
 
-        # Get the desired skills
-        desired_skills = data.get('desired_skills', [])
-        for skill_id in desired_skills:
-            try:
-                skill = Skill.objects.get(id=skill_id)
-            except Skill.DoesNotExist:
-                return Response({"error": f"Desired skill with ID {skill_id} does not exist."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Create the trade object
-        trade = Trade.objects.create(
-            initiator=user,
-            title=data.get('title'),
-            description=data.get('description'),
-            initiator_terms=data.get('initiator_terms'),
-            status='Pending'
-        )
+    def create_batch(self, request, items):
+        if len(items) > TRADE_BATCH_LIMIT:
+            return Response({"error": f"At most {TRADE_BATCH_LIMIT} trades can be created at once."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Add the initiator skills to the trade
-        for skill_id in initiator_skills:
-            skill = Skill.objects.get(id=skill_id)
-            trade.initiator_skills.add(skill)
+        valid = []
+        errors = []
+        for index, item in enumerate(items):
+            serializer = NewTradeSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
 
-        # Add the desired skills to the trade
-        for skill_id in desired_skills:
-            skill = Skill.objects.get(id=skill_id)
-            trade.desired_skills.add(skill)
+        skill_errors = check_trade_skills(request.user, [item for _, item in valid])
+        errors.extend({'index': valid[position][0], 'errors': {'error': error}} for position, error in skill_errors.items())
+        errors.sort(key=lambda error: error['index'])
+        valid = [item for position, (_, item) in enumerate(valid) if position not in skill_errors]
 
-        # Serialize the created trade object
-        trade_serializer = TradeSerializer(trade)
-        return Response(trade_serializer.data, status=status.HTTP_201_CREATED)
+        trades = create_trades(request.user, valid) if valid else []
+        return Response({
+            'trades': TradeSerializer(trades, many=True).data,
+            'errors': errors,
+        }, status=status.HTTP_201_CREATED if trades else status.HTTP_400_BAD_REQUEST)
 
 
 
@@ -133,23 +146,23 @@ class ApplyToTradeView(APIView):
             return Response({"error": "Trade ID is required."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            trade = Trade.objects.get(id=trade_id)
+            trade = Trade.objects.select_related('initiator').get(id=trade_id)
         except Trade.DoesNotExist:
             return Response({"error": "Trade does not exist."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if the user has the required skills
-        desired_skills = trade.desired_skills.all()
-        user_skills = user.skills_offered.all()
+        if trade.status != 'Pending':
+            return Response({"error": "This trade is no longer open."}, status=status.HTTP_400_BAD_REQUEST)
 
-        missing_skills = desired_skills.difference(user_skills)
-        if missing_skills.exists():
-            missing_skill_names = [skill.name for skill in missing_skills]
+        # Check if the user has the required skills
+        missing_skill_ids = missing_skills(trade.desired_skills_bits, user.skills_offered_bits)
+        if missing_skill_ids:
+            missing_skill_names = skill_index.names(missing_skill_ids)
             return Response({"error": f"You do not have the required skills: {', '.join(missing_skill_names)}."}, status=status.HTTP_400_BAD_REQUEST)
 
         if Queue.objects.filter(trade=trade, user=user).exists():
             return Response({"error": "You have already applied to this trade."}, status=status.HTTP_400_BAD_REQUEST)
 
-        queue_entry = Queue.objects.create(trade=trade, user=user, status='Applied')
+        queue_entry = Queue.objects.create(trade=trade, user=user, status='Applied', fit_score=fit_score(trade, trade.initiator, user))
 
         serializer = QueueSerializer(queue_entry)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -183,19 +196,19 @@ class InviteToTradeView(APIView):
         except CustomUser.DoesNotExist:
             return Response({"error": "Invitee does not exist."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if the invitee has the required skills
-        desired_skills = trade.desired_skills.all()
-        invitee_skills = invitee.skills_offered.all()
+        if trade.status != 'Pending':
+            return Response({"error": "This trade is no longer open."}, status=status.HTTP_400_BAD_REQUEST)
 
-        missing_skills = desired_skills.difference(invitee_skills)
-        if missing_skills.exists():
-            missing_skill_names = [skill.name for skill in missing_skills]
+        # Check if the invitee has the required skills
+        missing_skill_ids = missing_skills(trade.desired_skills_bits, invitee.skills_offered_bits)
+        if missing_skill_ids:
+            missing_skill_names = skill_index.names(missing_skill_ids)
             return Response({"error": f"The invitee does not have the required skills: {', '.join(missing_skill_names)}."}, status=status.HTTP_400_BAD_REQUEST)
 
         if Queue.objects.filter(trade=trade, user=invitee).exists():
             return Response({"error": "This user has already been invited or applied to this trade."}, status=status.HTTP_400_BAD_REQUEST)
 
-        queue_entry = Queue.objects.create(trade=trade, user=invitee, status='Invited', invited_at=datetime.now())
+        queue_entry = Queue.objects.create(trade=trade, user=invitee, status='Invited', invited_at=datetime.now(), fit_score=fit_score(trade, initiator, invitee))
 
         serializer = QueueSerializer(queue_entry)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -214,7 +227,7 @@ class RespondToInvitationView(APIView):
             return Response({"error": "Queue ID and action are required."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            queue_entry = Queue.objects.get(id=queue_id, user=user)
+            queue_entry = Queue.objects.select_related('trade', 'user').get(id=queue_id, user=user)
         except Queue.DoesNotExist:
             return Response({"error": "Queue entry does not exist or you are not the invitee."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -224,20 +237,10 @@ class RespondToInvitationView(APIView):
             if not responder_terms:
                 return Response({"error": "Responder terms are required for acceptance."}, status=status.HTTP_400_BAD_REQUEST)
 
-            responder_skills = user.skills_offered.all()
-
-            trade.responder = user
-            trade.responder_terms = responder_terms
-            trade.status = 'Accepted'
-            trade.save()
-
-            trade.responder_skills.set(responder_skills)
-
-            queue_entry.status = 'Accepted'
-            queue_entry.accepted_at = datetime.now()
-            queue_entry.save()
-
-            Queue.objects.filter(trade=trade).exclude(id=queue_entry.id).delete()
+            try:
+                accept(trade, queue_entry, responder_terms)
+            except TradeConflict as error:
+                return Response({"error": str(error)}, status=status.HTTP_409_CONFLICT)
         elif action == 'decline':
             queue_entry.status = 'Rejected'
             queue_entry.rejected_at = datetime.now()
@@ -264,34 +267,23 @@ class AcceptApplicationView(APIView):
             return Response({"error": "Queue ID and action are required."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            queue_entry = Queue.objects.get(id=queue_id)
+            queue_entry = Queue.objects.select_related('trade', 'user').get(id=queue_id)
         except Queue.DoesNotExist:
             return Response({"error": "Queue entry does not exist."}, status=status.HTTP_400_BAD_REQUEST)
 
         trade = queue_entry.trade
 
-        if trade.initiator != initiator:
+        if trade.initiator_id != initiator.id:
             return Response({"error": "You are not the initiator of this trade."}, status=status.HTTP_400_BAD_REQUEST)
 
         if action == 'accept':
             if not responder_terms:
                 return Response({"error": "Responder terms are required for acceptance."}, status=status.HTTP_400_BAD_REQUEST)
 
-            responder = queue_entry.user
-            responder_skills = responder.skills_offered.all()
-
-            trade.responder = responder
-            trade.responder_terms = responder_terms
-            trade.status = 'Accepted'
-            trade.save()
-
-            trade.responder_skills.set(responder_skills)
-
-            queue_entry.status = 'Accepted'
-            queue_entry.accepted_at = datetime.now()
-            queue_entry.save()
-
-            Queue.objects.filter(trade=trade).exclude(id=queue_entry.id).delete()
+            try:
+                accept(trade, queue_entry, responder_terms)
+            except TradeConflict as error:
+                return Response({"error": str(error)}, status=status.HTTP_409_CONFLICT)
         elif action == 'decline':
             queue_entry.status = 'Rejected'
             queue_entry.rejected_at = datetime.now()
@@ -381,13 +373,41 @@ class CompleteTradeView(APIView):
         if trade.status != 'Accepted':
             return Response({"error": "Trade must be accepted before it can be completed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        trade.status = 'Completed'
-        trade.completed_at = timezone.now()
-        trade.save()
+        try:
+            complete(trade)
+        except TradeConflict as error:
+            return Response({"error": str(error)}, status=status.HTTP_409_CONFLICT)
 
         serializer = TradeSerializer(trade)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
+class CancelTradeView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        trade_id = request.data.get('trade_id')
+
+        if not trade_id:
+            return Response({"error": "Trade ID is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            trade = Trade.objects.get(id=trade_id)
+        except Trade.DoesNotExist:
+            return Response({"error": "Trade does not exist."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The initiator can withdraw a trade; once accepted, the responder can back out too
+        if user.id != trade.initiator_id and not (trade.status == 'Accepted' and user.id == trade.responder_id):
+            return Response({"error": "You cannot cancel this trade."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            cancel(trade)
+        except TradeConflict as error:
+            return Response({"error": str(error)}, status=status.HTTP_409_CONFLICT)
+
+        serializer = TradeSerializer(trade)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 class CreateMessageView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -424,6 +444,7 @@ class CreateMessageView(APIView):
         )
 
         serializer = MessageSerializer(message)
+        publish([receiver.id, user.id], 'trade_message', serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
 class ListMessagesView(APIView):
@@ -453,8 +474,7 @@ class ListMessagesView(APIView):
             messages = messages.filter(content__icontains=search_query)
 
         # Pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of items per page
+        paginator = get_paginator(request, ordering=('sent_at', 'id'))
         result_page = paginator.paginate_queryset(messages, request)
 
         # Serialize the messages
@@ -495,6 +515,10 @@ class CreateReviewView(APIView):
         if not trade_id or not rating:
             return Response({"error": "Trade ID and rating are required."}, status=status.HTTP_400_BAD_REQUEST)
 
+        rating = parse_rating(rating)
+        if rating is None:
+            return Response({"error": "Rating must be a number from 0 to 5."}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             trade = Trade.objects.get(id=trade_id)
         except Trade.DoesNotExist:
@@ -509,24 +533,19 @@ class CreateReviewView(APIView):
         if Review.objects.filter(trade=trade).exists():
             return Response({"error": "A review for this trade already exists."}, status=status.HTTP_400_BAD_REQUEST)
 
-        review = Review.objects.create(
-            trade=trade,
-            reviewer=user,
-            reviewee=trade.initiator,
-            rating=rating,
-            feedback=feedback
-        )
-
-        self.update_initiator_rating(trade.initiator)
+        with transaction.atomic():
+            review = Review.objects.create(
+                trade=trade,
+                reviewer=user,
+                reviewee_id=trade.initiator_id,
+                rating=rating,
+                feedback=feedback
+            )
+            record_rating(review.reviewee_id, added=rating)
 
         serializer = ReviewSerializer(review)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    def update_initiator_rating(self, initiator):
-        average_rating = Review.objects.filter(reviewee=initiator).aggregate(Avg('rating'))['rating__avg']
-        initiator.rating = average_rating if average_rating is not None else 0.00
-        initiator.save()
-
 class UpdateReviewView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -539,6 +558,10 @@ class UpdateReviewView(APIView):
         if not review_id or not rating:
             return Response({"error": "Review ID and rating are required."}, status=status.HTTP_400_BAD_REQUEST)
 
+        rating = parse_rating(rating)
+        if rating is None:
+            return Response({"error": "Rating must be a number from 0 to 5."}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             review = Review.objects.get(id=review_id)
         except Review.DoesNotExist:
@@ -547,20 +570,16 @@ class UpdateReviewView(APIView):
         if user != review.reviewer:
             return Response({"error": "You are not the author of this review."}, status=status.HTTP_400_BAD_REQUEST)
 
+        previous_rating = review.rating
         review.rating = rating
         review.feedback = feedback
-        review.save()
-
-        self.update_initiator_rating(review.reviewee)
+        with transaction.atomic():
+            review.save()
+            record_rating(review.reviewee_id, added=rating, removed=previous_rating)
 
         serializer = ReviewSerializer(review)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def update_initiator_rating(self, initiator):
-        average_rating = Review.objects.filter(reviewee=initiator).aggregate(Avg('rating'))['rating__avg']
-        initiator.rating = average_rating if average_rating is not None else 0.00
-        initiator.save()
-
 class DeleteReviewView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -579,18 +598,12 @@ class DeleteReviewView(APIView):
         if user != review.reviewer:
             return Response({"error": "You are not the author of this review."}, status=status.HTTP_400_BAD_REQUEST)
 
-        initiator = review.reviewee
-        review.delete()
-
-        self.update_initiator_rating(initiator)
+        with transaction.atomic():
+            review.delete()
+            record_rating(review.reviewee_id, removed=review.rating)
 
         return Response({"message": "Review deleted successfully."}, status=status.HTTP_200_OK)
 
-    def update_initiator_rating(self, initiator):
-        average_rating = Review.objects.filter(reviewee=initiator).aggregate(Avg('rating'))['rating__avg']
-        initiator.rating = average_rating if average_rating is not None else 0.00
-        initiator.save()
-
 class ListReviewsView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -614,8 +627,7 @@ class ListReviewsView(APIView):
             reviews = reviews.filter(feedback__icontains=search_query)
 
         # Pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of items per page
+        paginator = get_paginator(request, ordering=('-id',))
         result_page = paginator.paginate_queryset(reviews, request)
 
         # Serialize the reviews
@@ -632,12 +644,13 @@ class TradeListView(APIView):
 
         # Filter trades based on the search query parameter
         search_query = request.query_params.get('search')
-        if search_query is not None:
-            trades = trades.filter(title__icontains=search_query) | trades.filter(description__icontains=search_query)
-
-        # Pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of items per page
+        if search_query:
+            # Relevance-ranked through the full-text index, paged by number
+            trades = search(trades, search_query)
+            paginator = SizedPageNumberPagination()
+        else:
+            # Pagination
+            paginator = get_paginator(request, ordering=('-created_at', '-id'))
         result_page = paginator.paginate_queryset(trades, request)
 
         # Serialize the trades
@@ -675,8 +688,8 @@ class QueueListView(APIView):
         if request.user != trade.initiator:
             return Response({"detail": "You do not have permission to view this queue."}, status=status.HTTP_403_FORBIDDEN)
 
-        # Get all queues related to the trade
-        queues = Queue.objects.filter(trade=trade)
+        # Best fitting applicants first; the score is stored when they join
+        queues = Queue.objects.filter(trade=trade).order_by('-fit_score', '-id')
 
         # Filter queues based on the search query parameter
         search_query = request.query_params.get('search')
@@ -684,8 +697,7 @@ class QueueListView(APIView):
             queues = queues.filter(user__username__icontains=search_query)
 
         # Pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of items per page
+        paginator = get_paginator(request, ordering=('-fit_score', '-id'))
         result_page = paginator.paginate_queryset(queues, request)
 
         # Serialize the queues
@@ -697,20 +709,140 @@ class UserListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
-        # Filter users based on the search query parameter (skills offered)
+        # Filter users based on the skills they offer: ids picked from the
+        # autocomplete endpoint, or a free-text search resolved by the skill index
+        skill_ids = request.query_params.get('skill_ids')
         search_query = request.query_params.get('search')
-        if search_query is not None:
-            skills = Skill.objects.filter(name__icontains=search_query)
-            users = CustomUser.objects.filter(skills_offered__in=skills).distinct().order_by('-rating')
+        if skill_ids:
+            try:
+                skills = [int(skill_id) for skill_id in skill_ids.split(',')]
+            except ValueError:
+                return Response({"error": "skill_ids must be a comma-separated list of IDs."}, status=status.HTTP_400_BAD_REQUEST)
+        elif search_query is not None:
+            skills = skill_index.resolve(search_query)
+        else:
+            skills = None
+
+        if skills is not None:
+            # Each skill's users merged from their ranked lists
+            users = RankedUsers(skills)
         else:
             users = CustomUser.objects.all().order_by('-rating')
 
         # Pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of items per page
+        paginator = get_paginator(request, ordering=('-rating', '-id'))
+
+        if has_geo_filter(request.query_params):
+            # ?lat=&lng=&radius= or ?bbox=, closest first and paged by number
+            if skills is not None:
+                users = CustomUser.objects.filter(id__in=SkillRanking.objects.filter(skill_id__in=skills).values('user_id'))
+            try:
+                users = apply_geo_filter(users, request.query_params)
+            except (KeyError, ValueError):
+                return Response({"error": "Invalid location filter."}, status=status.HTTP_400_BAD_REQUEST)
+            paginator = SizedPageNumberPagination()
         result_page = paginator.paginate_queryset(users, request)
 
         # Serialize the users
         serializer = UserSerializer(result_page, many=True)
 
-        return paginator.get_paginated_response(serializer.data)
\ No newline at end of file
+        return paginator.get_paginated_response(serializer.data)
+
+
+class SkillAutocompleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '')
+
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return Response({"error": "Limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+
+        skills = skill_index.complete(query, limit=limit)
+        return Response([
+            {"id": skill_id, "name": name, "user_count": user_count}
+            for skill_id, name, user_count in skills
+        ], status=status.HTTP_200_OK)
+
+
+from .models import TradeMatch
+from .serializers import TradeMatchSerializer
+
+
+class TradeMatchListView(APIView):
+    """
+    Best trade partners for the current user: people offering skills they need
+    who need skills they offer, best balanced barters first.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        matches = TradeMatch.objects.filter(user=request.user).select_related('partner').order_by('-score', '-id')
+
+        paginator = get_paginator(request, ordering=('-score', '-id'))
+        result_page = paginator.paginate_queryset(matches, request)
+        serializer = TradeMatchSerializer(result_page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+
+from django.db.models import Prefetch
+from .barter import get_cycles
+from .serializers import BarterCycleSerializer
+
+
+class BarterCycleListView(APIView):
+    """
+    Barters the current user can close as a ring of three to five people, each
+    offering a skill the next one needs. Shortest rings first.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        cycles = get_cycles(request.user).prefetch_related(
+            Prefetch('members', queryset=BarterCycleMember.objects.select_related('user'))
+        ).order_by('length', 'id')
+
+        paginator = get_paginator(request, ordering=('length', 'id'))
+        result_page = paginator.paginate_queryset(cycles, request)
+        serializer = BarterCycleSerializer(result_page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+
+class RatingDistributionView(APIView):
+    """
+    A user's average rating, review count, Bayesian score and reviews per star.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, user_id):
+        if not CustomUser.objects.filter(id=user_id).exists():
+            return Response({"error": "User does not exist."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(rating_distribution(user_id), status=status.HTTP_200_OK)
+
+
+from .eligibility import eligible_trade_ids
+
+
+class EligibleTradeListView(APIView):
+    """
+    Open trades of other users whose desired skills the current user all
+    offers and that they have not joined yet, newest first.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        trades = (
+            Trade.objects.filter(id__in=eligible_trade_ids(user))
+            .exclude(initiator=user)
+            .exclude(queue__user=user)
+            .prefetch_related('initiator_skills', 'responder_skills', 'desired_skills')
+            .order_by('-created_at', '-id')
+        )
+
+        paginator = get_paginator(request, ordering=('-created_at', '-id'))
+        result_page = paginator.paginate_queryset(trades, request)
+        serializer = TradeSerializer(result_page, many=True)
+        return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,134 @@
+import math
+import uuid
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+from django.db import transaction
+from django.utils.text import get_valid_filename
+
+from .models import PostImage, UploadSession, Video
+from .timeline import fan_out_post
+
+
+# Presigned multipart uploads: the client PUTs the parts straight to the
+# bucket, so app servers only sign URLs and record the result. A session is
+# started with the file's size and type, and completed with the part ETags the
+# bucket returned; completing attaches the object to the post by its key.
+
+MAX_PARTS = 10000
+CONTENT_TYPE_PREFIXES = {'image': 'image/', 'video': 'video/'}
+
+
+class UploadError(ValueError):
+    pass
+
+
+def is_enabled():
+    return bool(settings.AWS_STORAGE_BUCKET_NAME)
+
+
+def get_client():
+    return boto3.client(
+        's3',
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+        region_name=settings.AWS_S3_REGION_NAME,
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        config=Config(signature_version='s3v4'),
+    )
+
+
+def part_count(size):
+    return max(math.ceil(size / settings.DIRECT_UPLOAD_PART_SIZE), 1)
+
+
+def start_upload(user, post, kind, filename, size, content_type):
+    """
+    Open a multipart upload and return the session with a presigned URL per part.
+    """
+    if kind not in CONTENT_TYPE_PREFIXES:
+        raise UploadError('kind must be image or video')
+    if not content_type.startswith(CONTENT_TYPE_PREFIXES[kind]):
+        raise UploadError(f'content_type must be {CONTENT_TYPE_PREFIXES[kind]}*')
+    if size <= 0 or size > settings.MAX_UPLOAD_SIZE:
+        raise UploadError('size is out of range')
+    if part_count(size) > MAX_PARTS:
+        raise UploadError('file has too many parts')
+
+    client = get_client()
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    key = f'uploads/{uuid.uuid4().hex}/{get_valid_filename(filename)[-100:] or "file"}'
+    upload = client.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+
+    session = UploadSession.objects.create(
+        user=user,
+        post=post,
+        kind=kind,
+        key=key,
+        upload_id=upload['UploadId'],
+        size=size,
+        content_type=content_type,
+    )
+
+    urls = [
+        client.generate_presigned_url(
+            'upload_part',
+            Params={'Bucket': bucket, 'Key': key, 'UploadId': session.upload_id, 'PartNumber': number},
+            ExpiresIn=settings.DIRECT_UPLOAD_URL_EXPIRY,
+        )
+        for number in range(1, part_count(size) + 1)
+    ]
+    return session, urls
+
+
+def complete_upload(session, parts):
+    """
+    Assemble the uploaded ``parts`` ([{'part_number', 'etag'}]), check the
+    object against the session and attach it to the post as a PostImage or Video.
+    """
+    try:
+        parts = sorted(
+            ({'PartNumber': int(part['part_number']), 'ETag': str(part['etag'])} for part in parts),
+            key=lambda part: part['PartNumber'],
+        )
+    except (KeyError, TypeError, ValueError):
+        raise UploadError('parts must be a list of part_number and etag')
+    if not parts:
+        raise UploadError('parts must be a list of part_number and etag')
+
+    client = get_client()
+    bucket = settings.AWS_STORAGE_BUCKET_NAME
+    client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=session.key,
+        UploadId=session.upload_id,
+        MultipartUpload={'Parts': parts},
+    )
+
+    head = client.head_object(Bucket=bucket, Key=session.key)
+    if head['ContentLength'] != session.size:
+        client.delete_object(Bucket=bucket, Key=session.key)
+        session.delete()
+        raise UploadError('uploaded size does not match the session')
+
+    with transaction.atomic():
+        # The object is already in the bucket: store its key without writing it again
+        post = session.post
+        if session.kind == 'image':
+            media = PostImage.objects.create(post=post, album=session.key)
+            # The first image is what puts a post in feeds, as in base.publishing
+            transaction.on_commit(lambda: fan_out_post(post))
+        else:
+            media = Video.objects.create(post=post, video=session.key)
+        session.delete()
+    return media
+
+
+def abort_upload(session):
+    get_client().abort_multipart_upload(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=session.key,
+        UploadId=session.upload_id,
+    )
+    session.delete()
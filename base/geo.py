@@ -0,0 +1,345 @@
+import json
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import GeocodeCache
+
+logger = logging.getLogger(__name__)
+
+
+# "Near me" queries without a GIS extension. Rows store latitude/longitude
+# next to their free-text location plus a geohash; a radius query narrows the
+# candidates to the 3x3 block of geohash cells around the centre with indexed
+# prefix lookups, then computes great-circle distances in SQL and sorts on them.
+#
+# Free-text locations are geocoded off the request: a location seen before is
+# answered from GeocodeCache, anything else is looked up on a small thread pool
+# after the row is saved and its coordinates filled in when the answer comes
+# back. With GEOCODER_WORKERS = 0 the lookup runs inline on commit instead.
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+GEOHASH_PRECISION = 12
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        if even:
+            middle = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= middle:
+                bits = bits * 2 + 1
+                lng_range[0] = middle
+            else:
+                bits = bits * 2
+                lng_range[1] = middle
+        else:
+            middle = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= middle:
+                bits = bits * 2 + 1
+                lat_range[0] = middle
+            else:
+                bits = bits * 2
+                lat_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(geohash)
+
+
+def cell_size(precision):
+    """
+    (height, width) in degrees of a geohash cell of ``precision`` characters.
+    """
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle: the cell holding
+    the centre and its eight neighbours, at the finest precision whose cells
+    are still at least as large as the radius.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    lng_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+
+    precision = 0
+    while precision < GEOHASH_PRECISION:
+        height, width = cell_size(precision + 1)
+        if height < lat_delta or width < lng_delta:
+            break
+        precision += 1
+    if precision == 0:
+        return []
+
+    height, width = cell_size(precision)
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        for lng_step in (-1, 0, 1):
+            lat = min(max(latitude + lat_step * height, -90.0), 90.0)
+            lng = (longitude + lng_step * width + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lng, precision))
+    return sorted(cells)
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    # The same haversine distance in Python, for two known points
+    half_lat = math.radians(other_latitude - latitude) / 2
+    half_lng = math.radians(other_longitude - longitude) / 2
+    a = math.sin(half_lat) ** 2 + math.cos(math.radians(latitude)) * math.cos(math.radians(other_latitude)) * math.sin(half_lng) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def distance_expression(latitude, longitude):
+    # Haversine distance in km from (latitude, longitude) to each row
+    half_lat = Radians(F('latitude') - Value(latitude)) / 2
+    half_lng = Radians(F('longitude') - Value(longitude)) / 2
+    a = Power(Sin(half_lat), 2) + Value(math.cos(math.radians(latitude))) * Cos(Radians(F('latitude'))) * Power(Sin(half_lng), 2)
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def nearby(queryset, latitude, longitude, radius_km):
+    """
+    Rows within ``radius_km`` of the point, closest first, annotated with ``distance`` in km.
+    """
+    cells = covering_cells(latitude, longitude, radius_km)
+    if cells:
+        condition = Q()
+        for cell in cells:
+            condition |= Q(geohash__startswith=cell)
+        queryset = queryset.filter(condition)
+
+    lat_delta = radius_km / KM_PER_DEGREE
+    queryset = queryset.filter(
+        latitude__isnull=False,
+        longitude__isnull=False,
+        latitude__range=(latitude - lat_delta, latitude + lat_delta),
+    )
+    return (
+        queryset.annotate(distance=distance_expression(latitude, longitude))
+        .filter(distance__lte=radius_km)
+        .order_by('distance')
+    )
+
+
+def within_bbox(queryset, min_lng, min_lat, max_lng, max_lat):
+    """
+    Rows inside the bounding box, ordered by distance from its centre.
+    """
+    queryset = queryset.filter(
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lng, max_lng),
+    )
+    # Every point in the box shares the geohash prefix of its corners
+    south_west = encode_geohash(min_lat, min_lng)
+    north_east = encode_geohash(max_lat, max_lng)
+    prefix = ''
+    for a, b in zip(south_west, north_east):
+        if a != b:
+            break
+        prefix += a
+    if prefix:
+        queryset = queryset.filter(geohash__startswith=prefix)
+
+    center = ((min_lat + max_lat) / 2, (min_lng + max_lng) / 2)
+    return queryset.annotate(distance=distance_expression(*center)).order_by('distance')
+
+
+def apply_geo_filter(queryset, params):
+    """
+    Apply ``?lat=&lng=&radius=`` (km) or ``?bbox=min_lng,min_lat,max_lng,max_lat``.
+    Returns the queryset unchanged when neither is given; raises ValueError
+    on malformed input.
+    """
+    bbox = params.get('bbox')
+    if bbox:
+        min_lng, min_lat, max_lng, max_lat = (float(value) for value in bbox.split(','))
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ValueError('bbox must be min_lng,min_lat,max_lng,max_lat')
+        return within_bbox(queryset, min_lng, min_lat, max_lng, max_lat)
+
+    if 'radius' in params:
+        latitude = float(params['lat'])
+        longitude = float(params['lng'])
+        radius = float(params['radius'])
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius <= 0:
+            raise ValueError('lat, lng or radius out of range')
+        return nearby(queryset, latitude, longitude, radius)
+
+    return queryset
+
+
+def has_geo_filter(params):
+    return bool(params.get('bbox')) or 'radius' in params
+
+
+def normalize_location(location):
+    return ' '.join((location or '').lower().split())[:255]
+
+
+def google_geocode(location):
+    api_key = settings.GOOGLE_MAPS_API_KEY
+    if not api_key:
+        raise LookupError('No geocoder configured')
+
+    url = 'https://maps.googleapis.com/maps/api/geocode/json?' + urlencode({'address': location, 'key': api_key})
+    with urlopen(url, timeout=5) as response:
+        payload = json.load(response)
+
+    if payload.get('status') == 'ZERO_RESULTS':
+        return None
+    if payload.get('status') != 'OK':
+        raise LookupError(payload.get('status'))
+    point = payload['results'][0]['geometry']['location']
+    return point['lat'], point['lng']
+
+
+def cached_geocode(location):
+    """
+    (True, coordinates or None) for a location resolved before, (False, None)
+    for one that still has to be looked up.
+    """
+    query = normalize_location(location)
+    if not query:
+        return True, None
+
+    cached = GeocodeCache.objects.filter(query=query).first()
+    if cached is None:
+        return False, None
+    return True, None if cached.latitude is None else (cached.latitude, cached.longitude)
+
+
+def geocode(location):
+    """
+    Coordinates for a free-text location, or None. Every string is resolved at
+    most once: answers, including "not found", are kept in GeocodeCache.
+    """
+    known, point = cached_geocode(location)
+    if known:
+        return point
+
+    try:
+        point = import_string(settings.GEOCODER)(location)
+    except (LookupError, URLError, OSError, ValueError, KeyError):
+        # Not cached: the next save retries
+        logger.warning('Could not geocode %r', location, exc_info=True)
+        return None
+
+    GeocodeCache.objects.get_or_create(
+        query=normalize_location(location),
+        defaults={
+            'latitude': point[0] if point else None,
+            'longitude': point[1] if point else None,
+        },
+    )
+    return point
+
+
+def _set_point(obj, point):
+    if point is None:
+        obj.latitude = obj.longitude = None
+        obj.geohash = ''
+    else:
+        obj.latitude, obj.longitude = point
+        obj.geohash = encode_geohash(*point)
+
+
+def locate(obj, data):
+    """
+    Set ``obj`` coordinates from explicit ``latitude``/``longitude`` in the
+    request data, or from its ``location`` when that was changed. A location
+    that is not cached yet leaves ``obj`` without coordinates until
+    schedule_geocode, called once ``obj`` is saved, has looked it up.
+    """
+    obj._geocode_location = None
+    if data.get('latitude') not in (None, '') and data.get('longitude') not in (None, ''):
+        point = (float(data['latitude']), float(data['longitude']))
+    elif 'location' in data:
+        known, point = cached_geocode(obj.location)
+        if not known:
+            obj._geocode_location = obj.location
+    else:
+        return
+
+    _set_point(obj, point)
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.GEOCODER_WORKERS, thread_name_prefix='geocoder')
+    return _executor
+
+
+def geocode_object(label, pk, location):
+    point = geocode(location)
+    if point is None:
+        return
+
+    model = apps.get_model(label)
+    values = {'latitude': point[0], 'longitude': point[1], 'geohash': encode_geohash(*point)}
+    if hasattr(model, 'updated_at'):
+        # .update() skips auto_now; profiles are picked up by delta sync
+        values['updated_at'] = timezone.now()
+
+    # Only if the location was not changed again in the meantime
+    model.objects.filter(pk=pk, location=location).update(**values)
+
+
+def _geocode(label, pk, location):
+    try:
+        geocode_object(label, pk, location)
+    except Exception:
+        logger.exception('Geocoding failed for %s %s', label, pk)
+
+
+def _run(label, pk, location):
+    close_old_connections()
+    try:
+        _geocode(label, pk, location)
+    finally:
+        close_old_connections()
+
+
+def schedule_geocode(obj):
+    """
+    Look up the location locate() left pending on the saved ``obj`` once the
+    current transaction commits.
+    """
+    location = getattr(obj, '_geocode_location', None)
+    if location is None:
+        return
+    obj._geocode_location = None
+
+    label = obj._meta.label_lower
+    pk = obj.pk
+    if settings.GEOCODER_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(_run, label, pk, location))
+    else:
+        transaction.on_commit(lambda: _geocode(label, pk, location))
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+
+# Resized copies of album images and avatars. Generation runs on a small
+# thread pool after the request's transaction commits (Pillow releases the GIL
+# while resizing and encoding), so request workers only queue the job. With
+# IMAGE_VARIANT_WORKERS = 0 it runs inline on commit instead, e.g. in tests.
+# Variants are named after the SHA-256 of the original, which makes them
+# immutable: identical uploads share variants and can be cached forever. They
+# are stored next to the original, in the S3 bucket when it lives there.
+
+VARIANTS = {
+    'thumbnail': {'size': (200, 200), 'format': 'JPEG', 'extension': 'jpg'},
+    'medium': {'size': (800, 800), 'format': 'JPEG', 'extension': 'jpg'},
+    'webp': {'size': (1600, 1600), 'format': 'WEBP', 'extension': 'webp'},
+}
+
+VARIANT_PREFIX = 'variants/'
+VARIANT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# model label -> (image field, JSON field holding the variant names)
+VARIANT_FIELDS = {
+    'base.postimage': ('album', 'variants'),
+    'base.customuser': ('avi', 'avi_variants'),
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants')
+    return _executor
+
+
+def variant_name(digest, kind):
+    return f"{VARIANT_PREFIX}{digest[:2]}/{digest}-{kind}.{VARIANTS[kind]['extension']}"
+
+
+def render_variant(image, kind):
+    spec = VARIANTS[kind]
+    resized = image.copy()
+    resized.thumbnail(spec['size'], Image.LANCZOS)
+
+    if spec['format'] == 'JPEG' and resized.mode != 'RGB':
+        resized = resized.convert('RGB')
+    elif resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA' if 'A' in resized.getbands() else 'RGB')
+
+    output = io.BytesIO()
+    resized.save(output, format=spec['format'], quality=85, optimize=spec['format'] == 'JPEG')
+    return output.getvalue()
+
+
+def build_variants(field_file):
+    """
+    Create any missing variants of ``field_file`` and return the stored names
+    keyed by kind, plus the ``source`` they were made from.
+    """
+    with field_file.open('rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    storage = field_file.storage
+    # Content-addressed storages would rename the variants after their own hash
+    save = getattr(storage, 'save_as', storage.save)
+
+    names = {'source': field_file.name}
+    image = None
+    for kind in VARIANTS:
+        name = variant_name(digest, kind)
+        if not storage.exists(name):
+            if image is None:
+                image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+            save(name, ContentFile(render_variant(image, kind)))
+        names[kind] = name
+    return names
+
+
+def generate_variants(label, pk):
+    model = apps.get_model(label)
+    image_field, variants_field = VARIANT_FIELDS[label]
+
+    obj = model.objects.filter(pk=pk).first()
+    if obj is None:
+        return None
+
+    field_file = getattr(obj, image_field)
+    if not field_file:
+        return None
+
+    try:
+        names = build_variants(field_file)
+    except (OSError, UnidentifiedImageError, SuspiciousFileOperation):
+        logger.warning('Could not build image variants for %s %s', label, pk, exc_info=True)
+        # Remember the attempt so every later save does not retry it
+        names = {'source': field_file.name}
+
+    values = {variants_field: names}
+    if hasattr(model, 'updated_at'):
+        # .update() skips auto_now; profiles are picked up by delta sync
+        values['updated_at'] = timezone.now()
+
+    # Only store them if the image was not replaced in the meantime
+    model.objects.filter(pk=pk, **{image_field: field_file.name}).update(**values)
+    return names if len(names) > 1 else None
+
+
+def _generate(label, pk):
+    try:
+        generate_variants(label, pk)
+    except Exception:
+        logger.exception('Image variant job failed for %s %s', label, pk)
+
+
+def _run(label, pk):
+    close_old_connections()
+    try:
+        _generate(label, pk)
+    finally:
+        close_old_connections()
+
+
+def needs_variants(obj):
+    image_field, variants_field = VARIANT_FIELDS[obj._meta.label_lower]
+    field_file = getattr(obj, image_field)
+    if not field_file or field_file.name == obj._meta.get_field(image_field).get_default():
+        # Nothing uploaded, or the shared default avatar
+        return False
+    return (getattr(obj, variants_field) or {}).get('source') != field_file.name
+
+
+def schedule_variants(obj):
+    """
+    Queue variant generation for ``obj`` once the current transaction commits.
+    """
+    if not needs_variants(obj):
+        return
+    label = obj._meta.label_lower
+    pk = obj.pk
+    if settings.IMAGE_VARIANT_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(_run, label, pk))
+    else:
+        transaction.on_commit(lambda: _generate(label, pk))
+
+
+def variant_urls(field_file, variants):
+    # Variants live in the storage of the image they were made from
+    return {
+        kind: field_file.storage.url(name)
+        for kind, name in (variants or {}).items()
+        if kind in VARIANTS
+    }
@@ -0,0 +1,21 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from base.images import VARIANT_FIELDS, generate_variants, needs_variants
+
+
+class Command(BaseCommand):
+    help = 'Build missing resized variants for post album images and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants even if they look up to date')
+
+    def handle(self, *args, **options):
+        for label, (image_field, _) in VARIANT_FIELDS.items():
+            model = apps.get_model(label)
+            built = 0
+            for obj in model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True}).iterator():
+                if options['force'] or needs_variants(obj):
+                    if generate_variants(label, obj.pk):
+                        built += 1
+
+            self.stdout.write(self.style.SUCCESS(f'Built variants for {built} {model._meta.verbose_name_plural}'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from base.messaging import rebuild_conversations
+
+
+class Command(BaseCommand):
+    help = 'Recompute direct message conversations and their unread counts from the messages'
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_conversations()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} conversations'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from base.search import SEARCH_FIELDS, index_objects
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for posts and trades'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model in SEARCH_FIELDS:
+            indexed = 0
+            batch = []
+            for obj in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+                batch.append(obj)
+                if len(batch) == batch_size:
+                    with transaction.atomic():
+                        index_objects(model, batch)
+                    indexed += len(batch)
+                    batch = []
+            if batch:
+                with transaction.atomic():
+                    index_objects(model, batch)
+                indexed += len(batch)
+
+            self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} {model._meta.verbose_name_plural}'))
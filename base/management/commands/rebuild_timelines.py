@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from base.models import Follow
+from base.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuild precomputed feed timelines (all followers, or the given user ids)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='Only rebuild these users')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if not user_ids:
+            user_ids = Follow.objects.values_list('follower_id', flat=True).distinct().order_by('follower_id').iterator()
+
+        rebuilt = 0
+        entries = 0
+        for user_id in user_ids:
+            entries += rebuild_timeline(user_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timelines ({entries} entries)'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from base.timeline import trim_timelines
+
+
+class Command(BaseCommand):
+    help = 'Cut every feed timeline back to TIMELINE_MAX_LENGTH entries; run periodically'
+
+    def handle(self, *args, **options):
+        deleted = trim_timelines()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} timeline entries'))
@@ -0,0 +1,140 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Conversation, Message
+
+
+# Conversations for direct messages. Each participant of a thread has a
+# Conversation row holding the last message, their unread count and a read
+# watermark: every message they received with an id up to last_read_message_id
+# is read. Sending a message updates both rows; opening the thread moves the
+# reader's watermark to the last message with one conditional UPDATE, so read
+# state costs no per-message writes. The inbox and message lists read these
+# rows instead of aggregating Message, and rebuild_conversations recomputes
+# them if they ever drift.
+
+PREVIEW_LENGTH = 100
+
+
+def _touch(user_id, peer_id, message, unread):
+    values = {
+        'last_message': message,
+        'last_message_at': message.timestamp,
+        'preview': message.content[:PREVIEW_LENGTH],
+        'updated_at': timezone.now(),
+    }
+    conversations = Conversation.objects.filter(user_id=user_id, peer_id=peer_id)
+    if conversations.update(unread_count=F('unread_count') + unread, **values):
+        return
+
+    try:
+        with transaction.atomic():
+            Conversation.objects.create(user_id=user_id, peer_id=peer_id, unread_count=unread, **values)
+    except IntegrityError:
+        # Created by a concurrent message in the meantime
+        conversations.update(unread_count=F('unread_count') + unread, **values)
+
+
+def record_message(message):
+    """
+    Move a newly sent ``message`` to the top of both participants'
+    conversations and count it as unread for its receiver.
+    """
+    _touch(message.sender_id, message.receiver_id, message, 0)
+    _touch(message.receiver_id, message.sender_id, message, 1)
+
+
+def mark_read(user, peer):
+    """
+    Mark everything ``user`` received from ``peer`` as read. Returns whether
+    anything was unread.
+    """
+    return bool(
+        Conversation.objects.filter(user=user, peer=peer, last_read_message_id__lt=F('last_message_id'))
+        .update(last_read_message_id=F('last_message_id'), unread_count=0, updated_at=timezone.now())
+    )
+
+
+def conversation_states(pairs):
+    """
+    {(user_id, peer_id): (unread_count, last_read_message_id)} for the given
+    pairs, in both directions, in one query.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+
+    condition = Q()
+    for user_id, peer_id in pairs:
+        condition |= Q(user_id=user_id, peer_id=peer_id) | Q(user_id=peer_id, peer_id=user_id)
+
+    return {
+        (user_id, peer_id): (count, last_read)
+        for user_id, peer_id, count, last_read in
+        Conversation.objects.filter(condition).values_list('user_id', 'peer_id', 'unread_count', 'last_read_message_id')
+    }
+
+
+def message_states(messages):
+    return conversation_states((message.sender_id, message.receiver_id) for message in messages)
+
+
+def pair_unread_count(states, user_id, peer_id):
+    # Unread messages between the two users, whichever of them has not read them
+    return states.get((user_id, peer_id), (0, 0))[0] + states.get((peer_id, user_id), (0, 0))[0]
+
+
+def is_read(states, message):
+    # For the sender this is the read receipt: the receiver's watermark passed it
+    return message.id <= states.get((message.receiver_id, message.sender_id), (0, 0))[1]
+
+
+def rebuild_conversations():
+    """
+    Recompute every Conversation from Message. Returns the number of rows written.
+    """
+    last_ids = {}
+    for sender_id, receiver_id, last_id in (
+        Message.objects.values_list('sender_id', 'receiver_id').annotate(last_id=Max('id')).order_by()
+    ):
+        for key in ((sender_id, receiver_id), (receiver_id, sender_id)):
+            if last_id > last_ids.get(key, 0):
+                last_ids[key] = last_id
+
+    # Read state is kept only in the watermarks, so carry them over
+    watermarks = {
+        (user_id, peer_id): last_read
+        for user_id, peer_id, last_read in Conversation.objects.values_list('user_id', 'peer_id', 'last_read_message_id')
+    }
+    # Messages marked read before there were watermarks; see Message.is_read
+    for receiver_id, sender_id, last_read in (
+        Message.objects.filter(is_read=True).values_list('receiver_id', 'sender_id').annotate(last_read=Max('id')).order_by()
+    ):
+        if last_read > watermarks.get((receiver_id, sender_id), 0):
+            watermarks[receiver_id, sender_id] = last_read
+
+    messages = Message.objects.in_bulk(set(last_ids.values()))
+    conversations = [
+        Conversation(
+            user_id=user_id,
+            peer_id=peer_id,
+            last_message=messages[last_id],
+            last_message_at=messages[last_id].timestamp,
+            preview=messages[last_id].content[:PREVIEW_LENGTH],
+            last_read_message_id=watermarks.get((user_id, peer_id), 0),
+        )
+        for (user_id, peer_id), last_id in last_ids.items()
+    ]
+
+    with transaction.atomic():
+        Conversation.objects.all().delete()
+        Conversation.objects.bulk_create(conversations, batch_size=1000)
+
+        unread = (
+            Message.objects.filter(receiver_id=OuterRef('user_id'), sender_id=OuterRef('peer_id'), id__gt=OuterRef('last_read_message_id'))
+            .order_by().values('receiver_id').annotate(count=Count('id')).values('count')
+        )
+        Conversation.objects.update(unread_count=Coalesce(Subquery(unread), 0), updated_at=timezone.now())
+    return len(conversations)
@@ -8,6 +8,7 @@ from django.urls import reverse
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import AbstractUser, BaseUserManager, Permission
 from base.validators import file_size
+from base.storage import media_storage
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from Skill.models import *
@@ -44,13 +45,21 @@ class CustomUser(AbstractUser):
     bio = models.TextField(null=True, blank=True)
     date_joined = models.DateTimeField(auto_now_add=True)
     avi = models.ImageField(null=True, blank=True, default='/avatar.png')
+    avi_variants = models.JSONField(default=dict, blank=True)  # Resized copies, see base.images
     isPrivate = models.BooleanField(default=False)
     is_verified = models.BooleanField(default=False)
     skills_offered = models.ManyToManyField(Skill, related_name='users_offering')
     skills_needed = models.ManyToManyField(Skill, related_name='users_needing')
+    skills_offered_bits = models.BinaryField(default=b'', editable=False)  # Bitsets of skill ids, see Skill.skillsets
+    skills_needed_bits = models.BinaryField(default=b'', editable=False)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)  # Optional for trust building
     trade_history = models.ManyToManyField(Trade, related_name='trades', blank=True)  # Keeps track of past trades
     location = models.CharField(max_length=255, blank=True)  # Optional: Can be used for nearby trade filtering
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)  # Set by base.geo.locate
+    followers_count = models.PositiveIntegerField(default=0)  # Kept in sync by base.signals, decides fan-out vs pull for the feed
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Delta sync, see base.sync
 
 
     objects = CustomUserManager()
@@ -61,6 +70,16 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.email
+
+    def save(self, *args, **kwargs):
+        # The skill bitsets are written by Skill.skillsets with UPDATEs; a full
+        # save would write back the ones loaded with this instance over them
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('skills_offered_bits', 'skills_needed_bits')
+            ]
+        super().save(*args, **kwargs)
     
     def tokens(self):    
         refresh = RefreshToken.for_user(self)
@@ -70,6 +89,18 @@ class CustomUser(AbstractUser):
         }
 
 
+class Follow(models.Model):
+    follower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='following')
+    following = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('follower', 'following')
+
+    def __str__(self):
+        return f'{self.follower} follows {self.following}'
+
+
 from django.db import models
 from django.conf import settings
 from decimal import Decimal
@@ -82,6 +113,9 @@ class Post(models.Model):
     isSlice = models.BooleanField(default=False)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     location = models.CharField(max_length=100, blank=True, null=True)  # New location field
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)  # Set by base.geo.locate
 
     @property
     def user_avi(self):
@@ -98,14 +132,29 @@ class Post(models.Model):
         ordering = ['-created_date']
 
 
+class TimelineEntry(models.Model):
+    # Precomputed feed row: written for every follower when a post is published,
+    # so a feed page is a single range scan on (owner, -created_date).
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_date = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_date', '-id']),
+        ]
+
+
 class PostImage(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name = "albums")
-    album = models.ImageField( null=True, blank=True)
+    album = models.ImageField( null=True, blank=True, storage=media_storage)
+    variants = models.JSONField(default=dict, blank=True)  # Resized copies, see base.images
 
 
 class Video(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name = "videos")
-    video=models.FileField(validators=[file_size])
+    video=models.FileField(validators=[file_size], storage=media_storage)
 
         
 
@@ -146,8 +195,11 @@ class Message(models.Model):
     receiver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_messages')
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # No longer written: read state is Conversation.last_read_message_id. Kept
+    # until rebuild_conversations has seeded the watermarks from it
     is_read = models.BooleanField(default=False)
     is_archived = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     @property
     def name(self):
@@ -158,14 +210,91 @@ class Message(models.Model):
         """
         Get the total number of unread messages between two users.
         """
-        unread_count = cls.objects.filter(
-            Q(sender=user1, receiver=user2, is_read=False) |
-            Q(sender=user2, receiver=user1, is_read=False)
-        ).count()
-        return unread_count
+        unread_count = Conversation.objects.filter(
+            Q(user=user1, peer=user2) |
+            Q(user=user2, peer=user1)
+        ).aggregate(total=models.Sum('unread_count'))['total']
+        return unread_count or 0
 
     class Meta:
         ordering = ['-timestamp']
 
     def __str__(self):
         return f'{self.sender} to {self.receiver}: {self.content}'
+
+
+class Conversation(models.Model):
+    # A user's side of a direct message thread, kept by base.messaging so the
+    # inbox is one range scan on (user, -last_message_at)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversations')
+    peer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField()
+    preview = models.CharField(max_length=100, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)  # Messages ``user`` has not read yet
+    last_read_message_id = models.BigIntegerField(default=0)  # Everything ``user`` received up to this id is read
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'peer')
+        indexes = [
+            models.Index(fields=['user', '-last_message_at', '-id']),
+        ]
+
+
+class SearchToken(models.Model):
+    # Inverted index used by base.search when the database has no FTS5
+    label = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    token = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('label', 'object_id', 'token')
+        indexes = [
+            models.Index(fields=['label', 'token']),
+        ]
+
+
+class GeocodeCache(models.Model):
+    # Resolved free-text locations; a null point records a lookup that found nothing
+    query = models.CharField(max_length=255, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.query
+
+
+class UploadSession(models.Model):
+    # A multipart upload the client sends straight to the bucket, see base.direct_upload
+    KIND_CHOICES = (
+        ('image', 'Image'),
+        ('video', 'Video'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='upload_sessions')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=255, unique=True)
+    upload_id = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+
+class Tombstone(models.Model):
+    # A deleted row some user had synced, reported by base.sync until SYNC_TOMBSTONE_RETENTION passes
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tombstones')
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+        ]
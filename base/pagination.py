@@ -0,0 +1,195 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# Shared pagination for the list endpoints. Page numbers stay the default so
+# existing clients keep working; ?cursor= (or ?pagination=cursor for the first
+# page) switches to keyset pagination, which never COUNTs or OFFSETs.
+
+MAX_PAGE_SIZE = 100
+
+# ?count=estimate stops counting after this many rows on backends without a
+# planner estimate
+COUNT_ESTIMATE_CAP = 1000
+
+
+def get_paginator(request, ordering):
+    """
+    Pick the paginator the client asked for. ``ordering`` must end with a
+    unique column (usually ``id``) so cursors are stable.
+    """
+    if 'cursor' in request.query_params or request.query_params.get('pagination') == 'cursor':
+        return KeysetPagination(ordering)
+    return SizedPageNumberPagination(ordering)
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        # The planner's row estimate costs nothing compared to a real COUNT(*)
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    return queryset.values('pk')[:COUNT_ESTIMATE_CAP].count()
+
+
+class SizedPageNumberPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+    def __init__(self, ordering=None):
+        self.ordering = ordering
+        self.estimate = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.ordering and isinstance(queryset, QuerySet):
+            queryset = queryset.order_by(*self.ordering)
+
+        self.estimate = request.query_params.get('count') == 'estimate' and isinstance(queryset, QuerySet)
+        if not self.estimate:
+            return super().paginate_queryset(queryset, request, view)
+
+        # Skip Django's Paginator (and its exact COUNT): fetch one extra row to
+        # know whether there is a next page
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound('Invalid page.')
+        if self.number < 1:
+            raise NotFound('Invalid page.')
+
+        offset = (self.number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.count = max(estimate_count(queryset), offset + len(rows))
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if not self.estimate:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number + 1)
+
+    def get_previous_link(self):
+        if not self.estimate:
+            return super().get_previous_link()
+        if self.number == 1:
+            return None
+        if self.number == 2:
+            return remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number - 1)
+
+    def get_paginated_response(self, data):
+        if not self.estimate:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'count_is_estimate': True,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request)
+        if isinstance(queryset, QuerySet):
+            queryset = queryset.order_by(*self.ordering)
+            if position is not None:
+                queryset = queryset.filter(self.after(position))
+        elif position is not None:
+            # A sequence already in ``ordering`` that seeks itself (e.g. Skill.rankings)
+            queryset = queryset.after(position)
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_position = self.position(rows[-1]) if self.has_next else None
+        return rows
+
+    def after(self, position):
+        # (a, b, id) > (x, y, z) spelled out as ORs so every backend can use the index
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def position(self, row):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            values.append(None if value is None else str(value))
+        return values
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound('Invalid cursor.')
+
+    def encode_cursor(self, position):
+        encoded = urlsafe_b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'pagination')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+
+from .geo import locate, schedule_geocode
+from .images import schedule_variants
+from .models import Post, PostImage, Video
+from .search import index_objects
+from .timeline import fan_out_post
+
+
+# Publishing posts in a single request. Posts and their media are written with
+# bulk inserts in one transaction; bulk_create sends no post_save signals, so
+# the work base.signals would do per row (search index, image variants,
+# geocoding, timelines) is done here for the whole batch.
+
+PUBLISH_BATCH_LIMIT = 100
+
+
+def publish_posts(user, items):
+    """
+    Create a post for every validated PublishPostSerializer payload in ``items``
+    and return them with ``albums`` and ``videos`` loaded. Each item may carry
+    its raw request data under ``raw`` for explicit coordinates.
+    """
+    posts = []
+    media = []
+    for item in items:
+        item = dict(item)
+        raw = item.pop('raw', item)
+        albums = item.pop('albums', [])
+        videos = item.pop('videos', [])
+
+        post = Post(user=user, **item)
+        # Coordinates, or a cached answer for the location; new ones are looked up after commit
+        locate(post, raw)
+        posts.append(post)
+        media.append((post, albums, videos))
+
+    with transaction.atomic():
+        Post.objects.bulk_create(posts)
+
+        images = []
+        clips = []
+        for post, albums, videos in media:
+            images.extend(PostImage(post=post, album=album) for album in albums)
+            clips.extend(Video(post=post, video=video) for video in videos)
+        PostImage.objects.bulk_create(images)
+        Video.objects.bulk_create(clips)
+
+        index_objects(Post, posts)
+        for post in posts:
+            schedule_geocode(post)
+        for image in images:
+            schedule_variants(image)
+        transaction.on_commit(lambda: [fan_out_post(post) for post in posts])
+
+    prefetch_related_objects(posts, 'albums', 'videos')
+    return posts
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+
+# Push channel for direct messages, trade messages, queue changes and trade
+# status transitions. Clients connect to the WebSocket at
+# REALTIME_WEBSOCKET_PATH (routed in projectx.asgi) or to the events/
+# server-sent events stream, authenticating with their access token. Both are
+# only served by the ASGI application: under WSGI a stream would hold a worker
+# for as long as the client stays connected, so events/ answers 501. Views
+# publish after their transaction commits; the broker hands each event to the
+# connections of the users it concerns.
+#
+# The default broker only reaches connections served by the same process, so
+# it fits a single ASGI process. Deployments with several processes point
+# REALTIME_BROKER at a shared implementation (e.g. Redis pub/sub) with the same
+# subscribe/unsubscribe/publish methods.
+
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 25
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        """
+        asyncio.Queue receiving the events for ``user_id``. Must be called from
+        the event loop that will consume it.
+        """
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers[user_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self.lock:
+            subscribers = self.subscribers.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self.subscribers.pop(user_id, None)
+
+    def publish(self, user_ids, event):
+        # Called from request threads: hand the event over to each connection's loop
+        with self.lock:
+            targets = [entry for user_id in set(user_ids) for entry in self.subscribers.get(user_id, ())]
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, event)
+            except RuntimeError:
+                # The connection's loop has already closed
+                pass
+
+
+def _deliver(queue, event):
+    if queue.full():
+        # A client that stopped reading loses its oldest events, not the server's memory
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
+
+
+def publish(user_ids, event_type, data):
+    """
+    Send an event to ``user_ids`` once the current transaction commits.
+    """
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return
+    event = json.dumps({'type': event_type, 'data': data}, cls=DjangoJSONEncoder)
+    transaction.on_commit(lambda: get_broker().publish(user_ids, event))
+
+
+def authenticate_token(raw_token):
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def request_token(query_string, authorization=''):
+    # Browsers cannot set headers on WebSocket or EventSource connections, so ?token= is accepted too
+    token = parse_qs(query_string).get('token', [''])[0]
+    if not token and authorization.startswith('Bearer '):
+        token = authorization[len('Bearer '):]
+    return token
+
+
+async def websocket_application(scope, receive, send):
+    """
+    Raw ASGI WebSocket endpoint that streams a user's events as JSON text frames.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    headers = dict(scope.get('headers', ()))
+    token = request_token(scope.get('query_string', b'').decode(), headers.get(b'authorization', b'').decode())
+    user = await sync_to_async(authenticate_token)(token) if token else None
+    if user is None or not user.is_active:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    await send({'type': 'websocket.accept'})
+    broker = get_broker()
+    queue = broker.subscribe(user.id)
+
+    async def forward():
+        while True:
+            await send({'type': 'websocket.send', 'text': await queue.get()})
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'websocket.disconnect':
+            # Nothing is expected from the client; ignore whatever it sends
+            pass
+
+    tasks = [asyncio.ensure_future(forward()), asyncio.ensure_future(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        broker.unsubscribe(user.id, queue)
+
+
+async def event_stream(request):
+    """
+    The same events as server-sent events, for clients that cannot use WebSockets.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'Events are only served by the ASGI application.'}, status=501)
+
+    token = request_token(request.META.get('QUERY_STRING', ''), request.headers.get('Authorization', ''))
+    user = await sync_to_async(authenticate_token)(token) if token else None
+    if user is None or not user.is_active:
+        return HttpResponse(status=401)
+
+    async def stream():
+        broker = get_broker()
+        queue = broker.subscribe(user.id)
+        try:
+            yield ': connected\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {event}\n\n'
+        finally:
+            broker.unsubscribe(user.id, queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,171 @@
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+
+from Skill.models import Trade
+from .models import Post, SearchToken
+
+
+# Full-text search for posts and trades. On SQLite every searchable model gets
+# an FTS5 table ranked with bm25(); other backends (or SQLite builds without
+# FTS5) fall back to the SearchToken inverted index. Both are kept in sync by
+# the post_save/post_delete receivers in base.signals.
+
+# field -> weight; earlier fields count for more when ranking
+SEARCH_FIELDS = {
+    Post: {'caption': 3, 'description': 1},
+    Trade: {'title': 3, 'description': 1, 'initiator_terms': 1},
+}
+
+# Only the best matches are ranked and paged through
+SEARCH_RESULT_LIMIT = 1000
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TOKEN_LENGTH = 64
+
+_fts_tables = {}
+
+
+def tokenize(text):
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall((text or '').lower())]
+
+
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def create_fts_tables(connection):
+    """
+    Create the FTS5 tables on a new SQLite connection. This runs before the
+    connection can be inside a transaction, so a rollback cannot take back a
+    table that uses_fts has already reported as there.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    for model, fields in SEARCH_FIELDS.items():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table(model)} "
+                    f"USING fts5({', '.join(fields)}, tokenize='unicode61 remove_diacritics 2')"
+                )
+            _fts_tables[connection.alias, model] = True
+        except DatabaseError:
+            # SQLite compiled without FTS5
+            _fts_tables[connection.alias, model] = False
+
+
+def uses_fts(model, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+
+    connection.ensure_connection()
+    return _fts_tables.get((connection.alias, model), False)
+
+
+def index_objects(model, objs):
+    """
+    Add or refresh ``objs`` in the search index of ``model``.
+    """
+    objs = list(objs)
+    if not objs:
+        return
+
+    fields = SEARCH_FIELDS[model]
+    ids = [obj.pk for obj in objs]
+    remove_objects(model, ids)
+
+    if uses_fts(model):
+        columns = ', '.join(fields)
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        rows = [[obj.pk] + [getattr(obj, field) or '' for field in fields] for obj in objs]
+        with connections['default'].cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {fts_table(model)} (rowid, {columns}) VALUES ({placeholders})', rows
+            )
+        return
+
+    label = model._meta.label_lower
+    tokens = []
+    for obj in objs:
+        weights = {}
+        for field, weight in fields.items():
+            for token in tokenize(getattr(obj, field)):
+                weights[token] = weights.get(token, 0) + weight
+        tokens.extend(
+            SearchToken(label=label, object_id=obj.pk, token=token, weight=weight)
+            for token, weight in weights.items()
+        )
+    SearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+def index_object(obj):
+    index_objects(type(obj), [obj])
+
+
+def remove_objects(model, ids):
+    ids = list(ids)
+    if uses_fts(model):
+        with connections['default'].cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {fts_table(model)} WHERE rowid = %s', [[pk] for pk in ids])
+    else:
+        SearchToken.objects.filter(label=model._meta.label_lower, object_id__in=ids).delete()
+
+
+def remove_object(obj):
+    remove_objects(type(obj), [obj.pk])
+
+
+def search_ids(model, query, limit=SEARCH_RESULT_LIMIT):
+    """
+    Ids of ``model`` rows matching ``query``, best match first. Every term is
+    matched as a prefix so results show up while the user is still typing.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    if uses_fts(model):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for weight in SEARCH_FIELDS[model].values())
+        table = fts_table(model)
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY bm25({table}, {weights}) LIMIT %s',
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    condition = Q()
+    for token in tokens:
+        condition |= Q(token__startswith=token)
+    rows = (
+        SearchToken.objects.filter(label=model._meta.label_lower).filter(condition)
+        .values('object_id')
+        .annotate(matched=Count('id'), score=Sum('weight'))
+        .order_by('-matched', '-score', '-object_id')
+        .values_list('object_id', flat=True)
+    )
+    return list(rows[:limit])
+
+
+def search(queryset, query):
+    """
+    Restrict ``queryset`` to rows matching ``query``, ordered by relevance.
+    A query without any words leaves the queryset untouched.
+    """
+    if not tokenize(query):
+        return queryset
+
+    ids = search_ids(queryset.model, query)
+    if not ids:
+        return queryset.none()
+
+    rank = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(rank)
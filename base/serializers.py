@@ -14,6 +14,9 @@ from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.contrib.sites.shortcuts import get_current_site
 from django.urls import reverse
 from .utils import *
+from .images import variant_urls
+from .validators import file_size
+from .messaging import is_read, message_states, pair_unread_count
 from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 from rest_framework import serializers
 from django.conf import settings
@@ -29,12 +32,39 @@ from .utils import *
 
 
 
+class PostImageSerializer(serializers.ModelSerializer):
+    variants = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = PostImage
+        fields = ['id', 'album', 'variants']
+
+    def get_variants(self, obj):
+        return variant_urls(obj.album, obj.variants)
+
+
+class VideoSerializer(serializers.ModelSerializer):
+    stream_url = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = Video
+        fields = ['id', 'video', 'stream_url']
+
+    def get_stream_url(self, obj):
+        # Seekable playback through StreamVideoView
+        return reverse('stream-video', args=[obj.id])
+
+
 class PostSerializer(serializers.ModelSerializer):
 
 
 
     user_avi = serializers.ImageField(read_only=True)
+    user_avi_variants = serializers.SerializerMethodField(read_only=True)
     user_name = serializers.CharField(read_only=True)
+    albums = PostImageSerializer(many=True, read_only=True)
+    videos = VideoSerializer(many=True, read_only=True)
+    distance = serializers.FloatField(read_only=True)  # Only present on proximity searches
 
 
 
@@ -51,6 +81,22 @@ class PostSerializer(serializers.ModelSerializer):
         post = Post.objects.create(**validated_data)
 
         return post
+
+    def get_user_avi_variants(self, obj):
+        return variant_urls(obj.user.avi, obj.user.avi_variants) if obj.user else {}
+
+
+class PublishPostSerializer(serializers.ModelSerializer):
+    # Everything needed to publish a post in one request, media included
+    albums = serializers.ListField(child=serializers.ImageField(), max_length=20, required=False, write_only=True)
+    videos = serializers.ListField(child=serializers.FileField(validators=[file_size]), max_length=20, required=False, write_only=True)
+
+    class Meta:
+        model = Post
+        fields = ['caption', 'description', 'isSlice', 'price', 'location', 'latitude', 'longitude', 'albums', 'videos']
+        extra_kwargs = {
+            'description': {'required': False, 'allow_blank': True},
+        }
         
 
         
@@ -72,6 +118,8 @@ class UserSerializer(serializers.ModelSerializer):
     isAdmin = serializers.SerializerMethodField(read_only=True)
     bio = serializers.SerializerMethodField(read_only=True)
     date_joined = serializers.SerializerMethodField(read_only=True)
+    distance = serializers.FloatField(read_only=True)  # Only present on proximity searches
+    avi_variants = serializers.SerializerMethodField(read_only=True)
    
 
 
@@ -82,7 +130,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Userr
-        fields = '__all__'
+        exclude = ['skills_offered_bits', 'skills_needed_bits']
 
 
 
@@ -112,6 +160,9 @@ class UserSerializer(serializers.ModelSerializer):
 
         return avi
 
+    def get_avi_variants(self, obj):
+        return variant_urls(obj.avi, obj.avi_variants)
+
 
     def get_date_joined(self, obj):
         date_joined = obj.date_joined
@@ -166,16 +217,26 @@ from base.utils import send_normal_email
 
 class MessageSerializer(serializers.ModelSerializer):
     name = serializers.CharField(read_only=True)
+    is_read = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
 
 
     class Meta:
         model = Message
-        fields = ["sender", "receiver", "content", "timestamp", "is_read", "name", "unread_count"]
+        fields = ["id", "sender", "receiver", "content", "timestamp", "is_read", "name", "unread_count"]
+
+    def get_states(self, obj):
+        # Views serializing many messages pass these in, see base.messaging.message_states
+        states = self.context.get('conversation_states')
+        if states is None:
+            states = message_states([obj])
+        return states
+
+    def get_is_read(self, obj):
+        return is_read(self.get_states(obj), obj)
 
     def get_unread_count(self, obj):
-        # Assuming obj.sender and obj.receiver are instances of CustomUser
-        return Message.get_unread_count(obj.sender, obj.receiver)
+        return pair_unread_count(self.get_states(obj), obj.sender_id, obj.receiver_id)
 
 
 
@@ -0,0 +1,86 @@
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from Skill.models import Message as TradeMessage
+from Skill.models import Queue, Review, Trade
+from .geo import schedule_geocode
+from .images import schedule_variants
+from .models import CustomUser, Follow, Message, Post, PostImage
+from .search import create_fts_tables, index_object, remove_object
+from .sync import record_deletion
+from .timeline import backfill_follow, drop_follow
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    CustomUser.objects.filter(id=instance.following_id).update(followers_count=F('followers_count') + 1, updated_at=timezone.now())
+    instance.following.refresh_from_db(fields=['followers_count'])
+    backfill_follow(instance.follower_id, instance.following)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    CustomUser.objects.filter(id=instance.following_id, followers_count__gt=0).update(followers_count=F('followers_count') - 1, updated_at=timezone.now())
+    drop_follow(instance.follower_id, instance.following_id)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    create_fts_tables(connection)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Trade)
+def searchable_saved(sender, instance, **kwargs):
+    index_object(instance)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Trade)
+def searchable_deleted(sender, instance, **kwargs):
+    remove_object(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=CustomUser)
+def location_saved(sender, instance, **kwargs):
+    schedule_geocode(instance)
+
+
+@receiver(post_save, sender=PostImage)
+@receiver(post_save, sender=CustomUser)
+def image_saved(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Trade)
+def trade_deleted(sender, instance, origin=None, **kwargs):
+    record_deletion('trades', instance.id, [instance.initiator_id, instance.responder_id], origin)
+
+
+@receiver(post_delete, sender=Queue)
+def queue_deleted(sender, instance, origin=None, **kwargs):
+    # The trade is gone already when the whole trade is being deleted
+    initiator_id = Trade.objects.filter(id=instance.trade_id).values_list('initiator_id', flat=True).first()
+    record_deletion('queue', instance.id, [instance.user_id, initiator_id], origin)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, origin=None, **kwargs):
+    record_deletion('reviews', instance.id, [instance.reviewer_id, instance.reviewee_id], origin)
+
+
+@receiver(post_delete, sender=TradeMessage)
+def trade_message_deleted(sender, instance, origin=None, **kwargs):
+    record_deletion('trade_messages', instance.id, [instance.sender_id, instance.receiver_id], origin)
+
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance, origin=None, **kwargs):
+    record_deletion('messages', instance.id, [instance.sender_id, instance.receiver_id], origin)
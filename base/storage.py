@@ -0,0 +1,76 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+
+# Media files are stored under the SHA-256 of their contents, so the same image
+# or video uploaded twice (reposts, retries) is written to disk once and both
+# rows point at the same name.
+
+CONTENT_PREFIX = 'media/'
+
+
+def content_hash(content):
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+
+    hasher = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+def content_name(digest, name):
+    extension = os.path.splitext(name)[1].lower()
+    return f'{CONTENT_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+class ContentAddressedMixin:
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = content_name(content_hash(content), name)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def save_as(self, name, content):
+        # For names already derived from content elsewhere, e.g. image variants
+        if self.exists(name):
+            return name
+        return super().save(name, content)
+
+
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    pass
+
+
+content_addressed_storage = ContentAddressedStorage()
+_s3_storage = None
+
+
+def media_storage():
+    """
+    Storage for post media: the S3 bucket when AWS_STORAGE_BUCKET_NAME is set
+    (clients then upload straight to it, see base.direct_upload), otherwise
+    MEDIA_ROOT.
+    """
+    global _s3_storage
+    if not settings.AWS_STORAGE_BUCKET_NAME:
+        return content_addressed_storage
+
+    if _s3_storage is None:
+        from storages.backends.s3 import S3Storage
+
+        class ContentAddressedS3Storage(ContentAddressedMixin, S3Storage):
+            pass
+
+        _s3_storage = ContentAddressedS3Storage()
+    return _s3_storage
@@ -0,0 +1,120 @@
+import mimetypes
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+
+# Range-aware file responses for large media. Responses are built on
+# FileResponse, so a WSGI server with a file_wrapper (gunicorn) sends the bytes
+# with sendfile(): the file descriptor is positioned at the start of the range
+# and Content-Length bounds the transfer, which keeps a worker free of copying.
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+MEDIA_CACHE_CONTROL = 'public, max-age=86400'
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header, size):
+    """
+    (start, end) byte positions, both inclusive, for a single-range ``Range``
+    header. Returns None when the whole file should be sent (no header, or one
+    we do not support such as multiple ranges); raises RangeNotSatisfiable when
+    the range lies outside the file.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else None
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+class RangeFile:
+    """
+    File-like view of ``length`` bytes starting at ``start``. It exposes the
+    underlying fileno() so servers can hand it to sendfile().
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def ranged_file_response(request, path, content_type=None):
+    """
+    Serve the file at ``path`` honouring Range, If-Range and If-None-Match.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{int(stat.st_mtime):x}-{size:x}"'
+    last_modified = http_date(stat.st_mtime)
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    # A stale If-Range means the client's partial copy is out of date: send everything
+    if if_range is None or if_range in (etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = MEDIA_CACHE_CONTROL
+    return response
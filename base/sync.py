@@ -0,0 +1,157 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from Skill.models import Message as TradeMessage
+from Skill.models import Queue, Review, Trade
+from .models import Conversation, CustomUser, Message, Tombstone
+
+
+# Delta sync for mobile clients. Every synced model has an indexed updated_at
+# (remember to set it by hand in QuerySet.update() calls) and deletions leave a
+# Tombstone per user that had the row. A sync token holds, per entity, the time
+# up to which the client is current; a sync returns the rows changed since then,
+# the ids deleted since then and a new token. Rows are read with a small overlap
+# so a row committed slightly out of order is not missed; clients upsert, so a
+# row seen twice is harmless. When a page is cut short the token holds the
+# (time, id) of its last row instead and the next page continues right after
+# it, so any number of rows sharing a timestamp is paged through. Tokens older
+# than SYNC_TOMBSTONE_RETENTION_DAYS get a reset: the client refetches the
+# lists and continues from the new token.
+
+SYNC_PAGE_SIZE = 500
+SYNC_OVERLAP = timedelta(seconds=5)
+ENTITIES = ('trades', 'queue', 'trade_messages', 'reviews', 'messages', 'conversations', 'profile', 'deleted')
+
+
+# A mark is a time the client is current up to, or the (time, id) of the last
+# row of a page that was cut short
+
+
+def mark_time(mark):
+    return mark[0] if isinstance(mark, tuple) else mark
+
+
+def encode_token(marks):
+    payload = json.dumps({
+        name: [mark[0].isoformat(), mark[1]] if isinstance(mark, tuple) else mark.isoformat()
+        for name, mark in marks.items()
+    })
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_mark(value):
+    if isinstance(value, list):
+        time, last_id = value
+        return (parse_datetime(time), int(last_id))
+    return parse_datetime(value)
+
+
+def decode_token(token):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        marks = {name: decode_mark(payload[name]) for name in ENTITIES}
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+        raise ValueError('Invalid sync token')
+    if any(mark_time(mark) is None for mark in marks.values()):
+        raise ValueError('Invalid sync token')
+    return marks
+
+
+def deleting_user_ids(origin):
+    # Users whose own deletion cascaded to the row: they need no tombstones,
+    # and rows for them would outlive them
+    if isinstance(origin, CustomUser):
+        return {origin.pk}
+    if isinstance(origin, QuerySet) and origin.model is CustomUser:
+        # Once per cascade; the users are deleted after the rows that point at them
+        if '_deleting_user_ids' not in origin.__dict__:
+            origin._deleting_user_ids = set(origin.values_list('id', flat=True))
+        return origin._deleting_user_ids
+    return set()
+
+
+def record_deletion(entity, object_id, user_ids, origin=None):
+    """
+    Leave a tombstone of ``entity`` ``object_id`` for ``user_ids``. ``origin``
+    is the delete signal's, to skip users being deleted themselves.
+    """
+    Tombstone.objects.bulk_create([
+        Tombstone(user_id=user_id, model=entity, object_id=object_id)
+        for user_id in set(user_ids) - deleting_user_ids(origin) if user_id is not None
+    ])
+
+
+def synced_querysets(user):
+    # What each list endpoint shows this user
+    return {
+        'trades': Trade.objects.filter(Q(initiator=user) | Q(responder=user) | Q(queue__user=user)).distinct()
+        .prefetch_related('initiator_skills', 'responder_skills', 'desired_skills'),
+        'queue': Queue.objects.filter(Q(user=user) | Q(trade__initiator=user)),
+        'trade_messages': TradeMessage.objects.filter(Q(sender=user) | Q(receiver=user)),
+        'reviews': Review.objects.filter(Q(reviewer=user) | Q(reviewee=user)).select_related('reviewer', 'reviewee'),
+        'messages': Message.objects.filter(Q(sender=user) | Q(receiver=user)).select_related('sender'),
+        # The peer's side carries the read receipt for messages this user sent
+        'conversations': Conversation.objects.filter(Q(user=user) | Q(peer=user)),
+    }
+
+
+def changed_rows(queryset, mark, now, field='updated_at'):
+    """
+    Rows changed since ``mark``, oldest first, and the mark to continue from:
+    after the last row when more are left, else ``now``. Returns (rows, more, mark).
+    """
+    if isinstance(mark, tuple):
+        time, last_id = mark
+        condition = Q(**{f'{field}__gt': time}) | Q(**{field: time, 'id__gt': last_id})
+    else:
+        condition = Q(**{f'{field}__gte': mark - SYNC_OVERLAP})
+    rows = list(queryset.filter(condition).order_by(field, 'id')[:SYNC_PAGE_SIZE + 1])
+    more = len(rows) > SYNC_PAGE_SIZE
+    rows = rows[:SYNC_PAGE_SIZE]
+    return rows, more, (getattr(rows[-1], field), rows[-1].id) if more else now
+
+
+def sync(user, token=None):
+    """
+    Changes visible to ``user`` since ``token`` as {entity: [rows]}, plus
+    'deleted', 'profile', 'has_more', 'reset' and the next 'token'. Rows are
+    model instances; the view serializes them.
+    """
+    now = timezone.now()
+    marks = decode_token(token) if token else None
+    if marks is None or min(mark_time(mark) for mark in marks.values()) < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+        # First sync, or older than the tombstones we keep
+        return {'reset': True, 'has_more': False, 'token': encode_token({name: now for name in ENTITIES})}
+
+    result = {'reset': False, 'has_more': False}
+    new_marks = {}
+    for name, queryset in synced_querysets(user).items():
+        rows, more, new_marks[name] = changed_rows(queryset, marks[name], now)
+        result[name] = rows
+        result['has_more'] |= more
+
+    tombstones, more, new_marks['deleted'] = changed_rows(Tombstone.objects.filter(user=user), marks['deleted'], now, field='deleted_at')
+    deleted = {}
+    for tombstone in tombstones:
+        deleted.setdefault(tombstone.model, []).append(tombstone.object_id)
+    result['deleted'] = deleted
+    result['has_more'] |= more
+
+    result['profile'] = user if user.updated_at >= mark_time(marks['profile']) - SYNC_OVERLAP else None
+    new_marks['profile'] = now
+
+    result['token'] = encode_token(new_marks)
+    return result
+
+
+def purge_tombstones():
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -1,3 +1,418 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from Skill.models import Trade
+from .direct_upload import complete_upload
+from .geo import apply_geo_filter, distance_km, encode_geohash
+from .images import VARIANTS, build_variants, variant_urls
+from .messaging import rebuild_conversations
+from .pagination import KeysetPagination, SizedPageNumberPagination
+from .search import search
+from .models import Conversation, CustomUser, Follow, Message, Post, PostImage, TimelineEntry, Tombstone, UploadSession, Video
+from .sync import sync
+from .timeline import trim_timelines
+
+
+@mock.patch('base.sync.SYNC_PAGE_SIZE', 5)
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='user', email='user@example.com')
+        self.peer = CustomUser.objects.create(username='peer', email='peer@example.com')
+        self.token = sync(self.user)['token']
+
+    def sync_all(self, key):
+        # Follow has_more to the end, collecting what every page returned under ``key``
+        seen = []
+        for _ in range(20):
+            changes = sync(self.user, self.token)
+            self.token = changes['token']
+            seen.extend(changes[key] if key != 'deleted' else changes['deleted'].get('messages', []))
+            if not changes['has_more']:
+                return seen
+        self.fail('Sync never caught up')
+
+    def test_pages_through_rows_sharing_a_timestamp(self):
+        messages = Message.objects.bulk_create([
+            Message(sender=self.peer, receiver=self.user, content=str(index)) for index in range(23)
+        ])
+        Message.objects.filter(id__in=[message.id for message in messages]).update(updated_at=timezone.now())
+
+        seen = [message.id for message in self.sync_all('messages')]
+        self.assertEqual(sorted(set(seen)), sorted(message.id for message in messages))
+
+    def test_reports_deletions(self):
+        message = Message.objects.create(sender=self.peer, receiver=self.user, content='hi')
+        self.sync_all('messages')
+        message_id = message.id
+        message.delete()
+
+        self.assertEqual(self.sync_all('deleted'), [message_id])
+
+    def test_pages_through_tombstones_sharing_a_timestamp(self):
+        Tombstone.objects.bulk_create([
+            Tombstone(user=self.user, model='messages', object_id=object_id) for object_id in range(1, 24)
+        ])
+        Tombstone.objects.filter(user=self.user).update(deleted_at=timezone.now())
+
+        self.assertEqual(sorted(set(self.sync_all('deleted'))), list(range(1, 24)))
+
+    def test_deleting_a_user_leaves_tombstones_only_for_others(self):
+        trade = Trade.objects.create(initiator=self.peer, responder=self.user, title='trade')
+        message = Message.objects.create(sender=self.peer, receiver=self.user, content='hi')
+
+        self.peer.delete()
+
+        self.assertFalse(Tombstone.objects.filter(user_id=self.peer.id).exists())
+        self.assertEqual(
+            set(Tombstone.objects.filter(user=self.user).values_list('model', 'object_id')),
+            {('trades', trade.id), ('messages', message.id)},
+        )
+
+    def test_deleting_users_in_bulk_skips_their_tombstones(self):
+        Message.objects.create(sender=self.peer, receiver=self.user, content='hi')
+
+        CustomUser.objects.filter(id__in=[self.user.id, self.peer.id]).delete()
+
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class RebuildConversationsTests(TestCase):
+    def test_seeds_watermarks_from_messages_read_before_them(self):
+        user = CustomUser.objects.create(username='user', email='user@example.com')
+        peer = CustomUser.objects.create(username='peer', email='peer@example.com')
+        received = [Message.objects.create(sender=peer, receiver=user, content=str(index)) for index in range(3)]
+        sent = Message.objects.create(sender=user, receiver=peer, content='reply')
+        Message.objects.filter(id__in=[received[0].id, received[1].id]).update(is_read=True)
+
+        rebuild_conversations()
+
+        conversation = Conversation.objects.get(user=user, peer=peer)
+        self.assertEqual((conversation.last_read_message_id, conversation.unread_count), (received[1].id, 1))
+        conversation = Conversation.objects.get(user=peer, peer=user)
+        self.assertEqual((conversation.last_read_message_id, conversation.unread_count), (0, 1))
+        self.assertEqual(conversation.last_message_id, sent.id)
+
+
+class EventStreamTests(TestCase):
+    def test_not_served_under_wsgi(self):
+        self.assertEqual(self.client.get('/api/v1/events/').status_code, 501)
+
+
+class CompleteUploadTests(TestCase):
+    # The uploaded object is not really there to render variants from
+    @mock.patch('base.signals.schedule_variants')
+    @mock.patch('base.direct_upload.get_client')
+    def test_first_image_fans_the_post_out(self, get_client, schedule_variants):
+        author = CustomUser.objects.create(username='author', email='author@example.com')
+        follower = CustomUser.objects.create(username='follower', email='follower@example.com')
+        Follow.objects.create(follower=follower, following=author)
+        post = Post.objects.create(user=author, caption='caption', description='description')
+        session = UploadSession.objects.create(
+            user=author, post=post, kind='image', key='uploads/a/image.jpg', upload_id='upload', size=10, content_type='image/jpeg',
+        )
+        get_client.return_value.head_object.return_value = {'ContentLength': 10}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_upload(session, [{'part_number': 1, 'etag': 'etag'}])
+
+        self.assertTrue(TimelineEntry.objects.filter(owner=follower, post=post).exists())
+
+
+class FeedTests(TestCase):
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_reading_the_feed_writes_nothing(self):
+        author = CustomUser.objects.create(username='author', email='author@example.com')
+        owner = CustomUser.objects.create(username='owner', email='owner@example.com')
+        Follow.objects.create(follower=owner, following=author)
+        posts = Post.objects.bulk_create([Post(user=author, caption=str(index), description='', isSlice=True) for index in range(3)])
+        TimelineEntry.objects.bulk_create([TimelineEntry(owner=owner, post=post, created_date=post.created_date) for post in posts])
+        client = APIClient()
+        client.force_authenticate(owner)
+
+        response = client.get('/api/v1/feed/')
+
+        self.assertEqual([post['id'] for post in response.data['results']], [posts[2].id, posts[1].id])
+        self.assertEqual(TimelineEntry.objects.filter(owner=owner).count(), 3)
+
+
+class TrimTimelinesTests(TestCase):
+    def test_trims_timelines_their_owners_never_open(self):
+        author = CustomUser.objects.create(username='author', email='author@example.com')
+        owners = [CustomUser.objects.create(username=name, email=f'{name}@example.com') for name in ('long', 'short')]
+        posts = Post.objects.bulk_create([Post(user=author, caption=str(index), description='') for index in range(5)])
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(owner=owners[0], post=post, created_date=post.created_date) for post in posts
+        ] + [
+            TimelineEntry(owner=owners[1], post=post, created_date=post.created_date) for post in posts[:2]
+        ])
+
+        self.assertEqual(trim_timelines(length=3), 2)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(owner=owners[0]).order_by('post_id').values_list('post_id', flat=True)),
+            [post.id for post in posts[2:]],
+        )
+        self.assertEqual(TimelineEntry.objects.filter(owner=owners[1]).count(), 2)
+
+
+class ImageVariantTests(TestCase):
+    def png(self):
+        output = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(output, format='PNG')
+        return output.getvalue()
+
+    def test_variants_are_stored_next_to_the_original(self):
+        storage = InMemoryStorage(base_url='https://bucket.example.com/')
+        name = storage.save('media/original.png', ContentFile(self.png()))
+        field_file = SimpleNamespace(name=name, storage=storage, open=lambda mode: storage.open(name, mode))
+
+        names = build_variants(field_file)
+
+        self.assertTrue(all(storage.exists(names[kind]) for kind in VARIANTS))
+        self.assertEqual(
+            variant_urls(field_file, names),
+            {kind: f'https://bucket.example.com/{names[kind]}' for kind in VARIANTS},
+        )
+
+    def test_builds_variants_inline_without_workers(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        user = CustomUser.objects.create(username='user', email='user@example.com')
+        post = Post.objects.create(user=user, caption='caption', description='description')
+
+        with override_settings(MEDIA_ROOT=media_root, IMAGE_VARIANT_WORKERS=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                image = PostImage.objects.create(post=post, album=ContentFile(self.png(), name='original.png'))
+
+        image.refresh_from_db()
+        self.assertEqual(image.variants['source'], image.album.name)
+        self.assertEqual(set(image.variants) - {'source'}, set(VARIANTS))
+
+
+class UploadLimitTests(TestCase):
+    @override_settings(MAX_UPLOAD_SIZE=1000)
+    def test_oversized_upload_is_refused_before_the_view_runs(self):
+        user = CustomUser.objects.create(username='user', email='user@example.com', bio='old')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.put('/api/v1/profile/update/', {
+            'bio': 'new', 'avi': SimpleUploadedFile('avi.png', b'x' * 2000, content_type='image/png'),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 413)
+        user.refresh_from_db()
+        self.assertEqual(user.bio, 'old')
+
+
+geocoded = []
+
+
+def fake_geocode(location):
+    geocoded.append(location)
+    return (-1.286, 36.817)
+
+
+@override_settings(GEOCODER='base.tests.fake_geocode', GEOCODER_WORKERS=0)
+class GeocodeTests(TestCase):
+    def setUp(self):
+        geocoded.clear()
+        self.user = CustomUser.objects.create(username='user', email='user@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_new_locations_are_geocoded_after_the_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/v1/profile/update/', {'location': 'Nairobi'}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(geocoded, [])
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.latitude, self.user.longitude), (-1.286, 36.817))
+        self.assertEqual(geocoded, ['Nairobi'])
+
+        # Known now: answered from the cache while saving
+        post = Post.objects.create(user=self.user, caption='caption', description='description')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/v1/update/{post.id}/', {'location': 'nairobi '}, format='json')
+        post.refresh_from_db()
+        self.assertEqual(post.latitude, -1.286)
+        self.assertEqual(geocoded, ['Nairobi'])
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username='user', email='user@example.com')
+        self.posts = Post.objects.bulk_create([Post(user=user, caption=str(index), description='') for index in range(7)])
+        # Ties on the first column are broken by id
+        Post.objects.filter(id__in=[post.id for post in self.posts[2:5]]).update(created_date=timezone.now())
+        self.ordering = ('-created_date', '-id')
+        self.expected = list(Post.objects.order_by(*self.ordering).values_list('id', flat=True))
+
+    def request(self, url):
+        return Request(APIRequestFactory().get(url))
+
+    def test_keyset_pages_cover_every_row_once(self):
+        seen = []
+        url = '/posts/?pagination=cursor&page_size=3'
+        while url:
+            paginator = KeysetPagination(self.ordering)
+            page = paginator.paginate_queryset(Post.objects.all(), self.request(url))
+            seen.extend(post.id for post in page)
+            url = paginator.get_next_link()
+            self.assertNotIn('pagination=', url or '')
+        self.assertEqual(seen, self.expected)
+
+    def test_rejects_a_tampered_cursor(self):
+        with self.assertRaises(NotFound):
+            KeysetPagination(self.ordering).paginate_queryset(Post.objects.all(), self.request('/posts/?cursor=bm9wZQ'))
+
+    def test_estimated_count_pages_without_counting(self):
+        paginator = SizedPageNumberPagination(self.ordering)
+        page = paginator.paginate_queryset(Post.objects.all(), self.request('/posts/?count=estimate&page_size=3&page=3'))
+
+        self.assertEqual([post.id for post in page], self.expected[6:])
+        response = paginator.get_paginated_response([])
+        self.assertEqual((response.data['count'], response.data['next']), (7, None))
+        self.assertTrue(response.data['count_is_estimate'])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='user', email='user@example.com')
+
+    def post(self, caption, description=''):
+        return Post.objects.create(user=self.user, caption=caption, description=description)
+
+    def check_search(self):
+        in_description = self.post('Weekend', 'Selling a guitar amplifier')
+        in_caption = self.post('Guitar lessons', 'Evenings only')
+        self.post('Bread', 'Sourdough')
+        deleted = self.post('Guitar strings')
+        deleted.delete()
+
+        # Prefixes match while typing; caption hits rank above description hits
+        self.assertEqual(list(search(Post.objects.all(), 'guit')), [in_caption, in_description])
+        self.assertEqual(list(search(Post.objects.all(), 'Sourdough bread').values_list('caption', flat=True)), ['Bread'])
+        self.assertFalse(search(Post.objects.all(), 'violin').exists())
+
+        in_caption.caption = 'Violin lessons'
+        in_caption.save()
+        self.assertEqual(list(search(Post.objects.all(), 'guitar')), [in_description])
+        self.assertEqual(list(search(Post.objects.all(), 'violin')), [in_caption])
+
+    def test_fts(self):
+        self.check_search()
+
+    @mock.patch('base.search.uses_fts', return_value=False)
+    def test_token_index(self, uses_fts):
+        self.check_search()
+
+
+class GeoTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='user', email='user@example.com')
+
+    def post(self, latitude, longitude):
+        return Post.objects.create(
+            user=self.user, caption='caption', description='description',
+            latitude=latitude, longitude=longitude, geohash=encode_geohash(latitude, longitude),
+        )
+
+    def test_radius_returns_rows_inside_it_closest_first(self):
+        cbd = self.post(-1.2864, 36.8172)
+        westlands = self.post(-1.2676, 36.8108)
+        self.post(-4.0435, 39.6682)  # Mombasa
+
+        nearby = apply_geo_filter(Post.objects.all(), {'lat': '-1.2921', 'lng': '36.8219', 'radius': '5'})
+
+        self.assertEqual(list(nearby), [cbd, westlands])
+        self.assertAlmostEqual(nearby[0].distance, distance_km(-1.2921, 36.8219, -1.2864, 36.8172), places=6)
+
+    def test_radius_reaches_across_the_antimeridian(self):
+        east = self.post(0.0, 179.99)
+        west = self.post(0.0, -179.99)
+
+        nearby = apply_geo_filter(Post.objects.all(), {'lat': '0', 'lng': '179.995', 'radius': '5'})
+
+        self.assertEqual(set(nearby), {east, west})
+
+    def test_bbox(self):
+        inside = self.post(-1.29, 36.82)
+        self.post(-1.29, 37.5)
+
+        rows = apply_geo_filter(Post.objects.all(), {'bbox': '36.7,-1.4,36.9,-1.2'})
+
+        self.assertEqual(list(rows), [inside])
+
+    def test_rejects_bad_input(self):
+        for params in ({'lat': '91', 'lng': '0', 'radius': '5'}, {'lat': '0', 'lng': '0', 'radius': '-1'}, {'bbox': '1,1,0,0'}):
+            with self.assertRaises(ValueError):
+                apply_geo_filter(Post.objects.all(), params)
+
+
+class StreamVideoTests(TestCase):
+    data = bytes(range(256)) * 4
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        user = CustomUser.objects.create(username='user', email='user@example.com')
+        post = Post.objects.create(user=user, caption='caption', description='description')
+        video = Video.objects.create(post=post, video=ContentFile(self.data, name='clip.mp4'))
+        self.url = f'/api/v1/videos/{video.id}/stream/'
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body, response['Content-Type']), (200, self.data, 'video/mp4'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_ranges(self):
+        response, body = self.get(Range='bytes=10-19')
+        self.assertEqual((response.status_code, body), (206, self.data[10:20]))
+        self.assertEqual((response['Content-Length'], response['Content-Range']), ('10', 'bytes 10-19/1024'))
+
+        response, body = self.get(Range='bytes=-4')
+        self.assertEqual((response.status_code, body), (206, self.data[-4:]))
+
+        response, body = self.get(Range='bytes=1000-')
+        self.assertEqual((body, response['Content-Range']), (self.data[1000:], 'bytes 1000-1023/1024'))
+
+        for header in ('bytes=1024-', 'bytes=2000-2010'):
+            response, _ = self.get(Range=header)
+            self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */1024'))
+
+        # Not a range we serve: the whole file
+        response, body = self.get(Range='bytes=20-10')
+        self.assertEqual((response.status_code, body), (200, self.data))
+
+    def test_conditional_requests(self):
+        etag = self.get()[0]['ETag']
+
+        self.assertEqual(self.get(**{'If-None-Match': etag})[0].status_code, 304)
+        self.assertEqual(self.get(Range='bytes=0-9', **{'If-Range': etag})[0].status_code, 206)
+        # The client's partial copy is of another version: it gets the whole file
+        response, body = self.get(Range='bytes=0-9', **{'If-Range': '"stale"'})
+        self.assertEqual((response.status_code, body), (200, self.data))
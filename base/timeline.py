@@ -0,0 +1,164 @@
+from heapq import merge
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import CustomUser, Follow, Post, TimelineEntry
+
+
+# Fan-out on write: publishing a post copies a TimelineEntry to every follower,
+# so GetFeedView reads one indexed range of TimelineEntry instead of sorting
+# every followed post in Python. Authors with more than TIMELINE_FANOUT_LIMIT
+# followers are not fanned out; their posts are merged in when the feed is read.
+# Neither fan-out nor reading the feed trims: the periodic trim_timelines
+# command cuts timelines back to TIMELINE_MAX_LENGTH, and reads only ever look
+# at that many entries.
+
+
+def feed_posts():
+    # Posts that belong in a feed: slices, or posts with at least one album image
+    return Post.objects.filter(Q(isSlice=True) | Q(albums__isnull=False)).distinct()
+
+
+def is_published(post):
+    return post.isSlice or post.albums.exists()
+
+
+def uses_fanout(author):
+    return author.followers_count <= settings.TIMELINE_FANOUT_LIMIT
+
+
+def pulled_author_ids(owner_id):
+    """
+    Ids of accounts followed by ``owner_id`` that are too big to fan out and
+    have to be pulled on read.
+    """
+    return list(
+        CustomUser.objects.filter(
+            followers__follower_id=owner_id,
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+        ).values_list('id', flat=True)
+    )
+
+
+def fan_out_post(post):
+    """
+    Push ``post`` onto the timeline of every follower of its author.
+    Returns the number of timelines written to.
+    """
+    if not is_published(post):
+        # Unpublished (or unpublished again by an edit): nothing to show
+        TimelineEntry.objects.filter(post=post).delete()
+        return 0
+
+    if not uses_fanout(post.user):
+        return 0
+
+    # created_date is auto_now, so an edited post moves back to the top
+    TimelineEntry.objects.filter(post=post).update(created_date=post.created_date)
+
+    follower_ids = Follow.objects.filter(following_id=post.user_id).values_list('follower_id', flat=True)
+    entries = [
+        TimelineEntry(owner_id=owner_id, post=post, created_date=post.created_date)
+        for owner_id in follower_ids.iterator()
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+    return len(entries)
+
+
+def trim_timeline(owner_id, length=None):
+    """
+    Keep only the newest ``length`` entries (TIMELINE_MAX_LENGTH by default).
+    """
+    length = length or settings.TIMELINE_MAX_LENGTH
+    entries = TimelineEntry.objects.filter(owner_id=owner_id)
+
+    cutoff = entries.order_by('-created_date', '-id').values_list('created_date', 'id')[length:length + 1]
+    if not cutoff:
+        return 0
+
+    created_date, pk = cutoff[0]
+    deleted, _ = entries.filter(
+        Q(created_date__lt=created_date) | Q(created_date=created_date, id__lte=pk)
+    ).delete()
+    return deleted
+
+
+def trim_timelines(length=None):
+    """
+    Trim every timeline holding more than ``length`` entries. Returns the
+    number of entries deleted.
+    """
+    length = length or settings.TIMELINE_MAX_LENGTH
+    owner_ids = list(
+        TimelineEntry.objects.values('owner_id').annotate(entries=Count('id'))
+        .filter(entries__gt=length).values_list('owner_id', flat=True)
+    )
+    return sum(trim_timeline(owner_id, length) for owner_id in owner_ids)
+
+
+def backfill_follow(follower_id, author):
+    """
+    Copy the recent posts of a newly followed author into the follower's timeline.
+    """
+    if not uses_fanout(author):
+        return 0
+
+    posts = feed_posts().filter(user=author).order_by('-created_date').values_list('id', 'created_date')
+    entries = [
+        TimelineEntry(owner_id=follower_id, post_id=post_id, created_date=created_date)
+        for post_id, created_date in posts[:settings.TIMELINE_MAX_LENGTH]
+    ]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def drop_follow(follower_id, author_id):
+    TimelineEntry.objects.filter(owner_id=follower_id, post__user_id=author_id).delete()
+
+
+def rebuild_timeline(owner_id):
+    """
+    Recompute a timeline from scratch, e.g. for backfills or after changing
+    TIMELINE_FANOUT_LIMIT.
+    """
+    pulled = pulled_author_ids(owner_id)
+    followed = Follow.objects.filter(follower_id=owner_id).exclude(following_id__in=pulled).values('following_id')
+
+    posts = feed_posts().filter(user__in=followed).order_by('-created_date').values_list('id', 'created_date')
+    entries = [
+        TimelineEntry(owner_id=owner_id, post_id=post_id, created_date=created_date)
+        for post_id, created_date in posts[:settings.TIMELINE_MAX_LENGTH]
+    ]
+
+    TimelineEntry.objects.filter(owner_id=owner_id).delete()
+    TimelineEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(entries)
+
+
+def merged_feed(owner_id, pulled):
+    """
+    Timeline posts merged with the latest posts of pull-on-read authors,
+    newest first and bounded by TIMELINE_MAX_LENGTH.
+    """
+    length = settings.TIMELINE_MAX_LENGTH
+
+    timeline = (
+        entry.post for entry in
+        TimelineEntry.objects.filter(owner_id=owner_id)
+        .select_related('post', 'post__user')
+        .order_by('-created_date', '-id')[:length]
+    )
+    pulled_posts = feed_posts().filter(user_id__in=pulled).select_related('user').order_by('-created_date')[:length]
+
+    feed = []
+    seen = set()
+    for post in merge(timeline, pulled_posts, key=lambda post: post.created_date, reverse=True):
+        # An author can cross the fan-out limit while their old entries are still stored
+        if post.id in seen:
+            continue
+        seen.add(post.id)
+        feed.append(post)
+        if len(feed) == length:
+            break
+    return feed
@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+
+# Upload handler for media: every file is streamed to a temporary file in
+# chunks and hashed on the way, so memory per upload stays at one chunk and
+# base.storage.ContentAddressedStorage can name it without reading it again.
+# A request that grows past MAX_UPLOAD_SIZE is cut off at that chunk instead
+# of being received in full and only then failing the file_size validator;
+# UploadLimitMultiPartParser, the API's multipart parser, then answers 413 so
+# no view goes on without the files that were dropped.
+
+
+class HashedUploadedFile(TemporaryUploadedFile):
+    sha256 = None
+
+
+class ContentAddressedUploadHandler(FileUploadHandler):
+    chunk_size = 1024 * 1024
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # The whole body is already over the limit: stop at the first file chunk
+        self.too_large = content_length > settings.MAX_UPLOAD_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = HashedUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hash = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.too_large or self.received > settings.MAX_UPLOAD_SIZE:
+            self.request.upload_too_large = True
+            raise StopUpload(connection_reset=True)
+
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hash.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            temp_location = self.file.temporary_file_path()
+            try:
+                self.file.close()
+                os.remove(temp_location)
+            except FileNotFoundError:
+                pass
+
+
+def upload_too_large(request):
+    """
+    True when ContentAddressedUploadHandler cut the request off; the files
+    it carried are missing from request.FILES.
+    """
+    return getattr(request, 'upload_too_large', False)
+
+
+class UploadTooLarge(APIException):
+    status_code = 413
+    default_detail = 'Upload exceeds the maximum size.'
+    default_code = 'upload_too_large'
+
+
+class UploadLimitMultiPartParser(MultiPartParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        data = super().parse(stream, media_type, parser_context)
+        if upload_too_large(parser_context['request']):
+            raise UploadTooLarge()
+        return data
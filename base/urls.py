@@ -1,5 +1,6 @@
 from base.views.post_views import *
 from base.views.user_views import *
+from base.realtime import event_stream
 from django.urls import path
 
 
@@ -8,13 +9,21 @@ from django.urls import path
 urlpatterns = [
 
     path('posts/', GetPostsView.as_view(), name='get_posts'), 
+    path('feed/', GetFeedView.as_view(), name='feed'),
+    path('videos/<int:pk>/stream/', StreamVideoView.as_view(), name='stream-video'),
+    path('uploads/', StartUploadView.as_view(), name='start-upload'),
+    path('uploads/<int:pk>/', CompleteUploadView.as_view(), name='complete-upload'),
     path('album/', GetAlbumView.as_view(), name='album'),
     path('new/', createPost.as_view(), name='new-post'),
+    path('publish/', PublishPostView.as_view(), name='publish-post'),
     path('login/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'), ##
     path('register/', RegisterUser.as_view(), name='register'), ##
     path('profile/', GetUserProfile.as_view(), name='user-profile'),#
+    path('profile/update/', UpdateUserProfile.as_view(), name='user-profile-update'),
     path('delete/', deleteAccount.as_view(), name='delete'), ##
+    path('sync/', SyncView.as_view(), name='sync'),
     path('chat/', Chat.as_view()),
+    path('events/', event_stream, name='events'),
     path('conversations/', UsersEngagedInConversation.as_view()),
     path('chats/<int:pk>/', AllMessagesWithUser.as_view()),
     path('update/<str:pk>/', updatePost.as_view(), name='post-update'), 
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
 def file_size(value):
     filesize = value.size
-    if filesize > 419430400:
-        raise ValidationError("maximum size is 50 mb")
+    if filesize > settings.MAX_UPLOAD_SIZE:
+        raise ValidationError("maximum size is 400 mb")
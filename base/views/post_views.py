@@ -45,6 +45,9 @@ class deletePost(APIView):
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from base.pagination import SizedPageNumberPagination, get_paginator
+from base.search import search
+from base.geo import apply_geo_filter, has_geo_filter, locate
 
 
 class GetPostsView(APIView):
@@ -52,17 +55,27 @@ class GetPostsView(APIView):
         # Retrieve posts excluding posts from private accounts
         qs = Post.objects.all(
         )
-        qs = Post.objects.exclude(caption__isnull=True).exclude(caption="").order_by('-created_date')
+        qs = Post.objects.exclude(caption__isnull=True).exclude(caption="").select_related('user').prefetch_related('albums', 'videos').order_by('-created_date')
 
 
 
         name = request.query_params.get('name')
-        if name is not None:
-            qs = qs.filter(caption__icontains=name)
+        if name:
+            # Relevance-ranked through the full-text index, paged by number
+            qs = search(qs, name)
+            paginator = SizedPageNumberPagination()
+        else:
+            # Page numbers by default, keyset pagination with ?cursor=
+            paginator = get_paginator(request, ordering=('-created_date', '-id'))
+
+        if has_geo_filter(request.query_params):
+            # ?lat=&lng=&radius= or ?bbox=, closest first and paged by number
+            try:
+                qs = apply_geo_filter(qs, request.query_params)
+            except (KeyError, ValueError):
+                return Response({"detail": "Invalid location filter."}, status=status.HTTP_400_BAD_REQUEST)
+            paginator = SizedPageNumberPagination()
 
-        # Use Django REST framework's built-in pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of posts per page
         result_page = paginator.paginate_queryset(qs, request)
         
         serializer = PostSerializer(result_page, many=True)
@@ -89,8 +102,10 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError
 from better_profanity import profanity
-from itertools import chain
 from django.shortcuts import get_object_or_404
+from django.db.models import prefetch_related_objects
+from django.conf import settings
+from base.timeline import fan_out_post, merged_feed, pulled_author_ids
 
 
 class GetFeedView(APIView):
@@ -98,37 +113,32 @@ class GetFeedView(APIView):
 
     def get(self, request):
         user = request.user
-        following = user.following.all()
 
 
 
-        if not following:
+        if not user.following.exists():
             return Response({"detail": "You are not following anyone yet."})
 
-        qs = Post.objects.filter(user__in=following.values('following'))
-        vs = Post.objects.filter(user__in=following.values('following'), isSlice=True).order_by('-created_date')
-
         fs = Post.objects.filter(user=user, isSlice=False)
-
-
-        qs = qs.exclude(albums__isnull=True).order_by('-created_date')
         fs = fs.exclude(albums__isnull=False)
 
         fs.delete()
 
-
-
-        combined_qs = list(chain(qs, vs))
-
-        combined_qs = sorted(combined_qs, key=lambda x: x.created_date, reverse=True)
-
-
-
-        # Use Django REST framework's built-in pagination
+        # Posts are fanned out to TimelineEntry when published, so a page is
+        # one indexed range scan instead of sorting every followed post here
         paginator = PageNumberPagination()
         paginator.page_size = 10  # Set the number of posts per page
-        result_page = paginator.paginate_queryset(combined_qs, request)
 
+        pulled = pulled_author_ids(user.id)
+        if pulled:
+            # Accounts with very many followers are pulled on read and merged in
+            result_page = paginator.paginate_queryset(merged_feed(user.id, pulled), request)
+        else:
+            # Bounded like merged_feed, whether or not trim_timelines has run since the last posts
+            timeline = TimelineEntry.objects.filter(owner=user).select_related('post', 'post__user').order_by('-created_date', '-id')[:settings.TIMELINE_MAX_LENGTH]
+            result_page = [entry.post for entry in paginator.paginate_queryset(timeline, request)]
+
+        prefetch_related_objects(result_page, 'albums', 'videos')
         serializer = PostSerializer(result_page, many=True)
         return paginator.get_paginated_response(serializer.data)
 
@@ -148,14 +158,13 @@ class GetAlbumView(generics.RetrieveAPIView):
 
         # Your existing logic to retrieve and return data
 
-        qs = Post.objects.filter(user=user).exclude(caption__isnull=True).exclude(caption="").order_by('-created_date')
+        qs = Post.objects.filter(user=user).exclude(caption__isnull=True).exclude(caption="").select_related('user').prefetch_related('albums', 'videos').order_by('-created_date')
 
 
 
 
-        # Use Django REST framework's built-in pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of posts per page
+        # Page numbers by default, keyset pagination with ?cursor=
+        paginator = get_paginator(request, ordering=('-created_date', '-id'))
         result_page = paginator.paginate_queryset(qs, request)
 
         serializer = PostSerializer(result_page, many=True)
@@ -173,6 +182,7 @@ class createPost(APIView):
             caption = '',
             description = '',
         )
+        fan_out_post(post)
         serializer = PostSerializer(post, many=False)
         return Response(serializer.data)
 
@@ -195,15 +205,78 @@ class updatePost(APIView):
         if 'location' in data:
             post.location = data['location']
 
+        try:
+            locate(post, data)
+        except ValueError:
+            return Response({"detail": "Invalid latitude or longitude."}, status=status.HTTP_400_BAD_REQUEST)
+
         # Save the updated post
         post.save()
+        fan_out_post(post)
 
         # Serialize the updated post
         serializer = PostSerializer(post, many=False)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+from base.publishing import PUBLISH_BATCH_LIMIT, publish_posts
+
+
+@permission_classes([IsAuthenticated])
+class PublishPostView(APIView):
+    """
+    Create a complete post in one multipart request: fields plus any number of
+    ``albums`` and ``videos`` files. A JSON list (or ``{"posts": [...]}``)
+    publishes a batch; valid items are created and invalid ones reported by index.
+    """
+
+    def post(self, request):
+        data = request.data
+
+        if isinstance(data, list) or isinstance(data.get('posts'), list):
+            return self.publish_batch(request, data if isinstance(data, list) else data['posts'])
+
+        serializer = PublishPostSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            post, = publish_posts(request.user, [{**serializer.validated_data, 'raw': data}])
+        except ValueError:
+            return Response({"detail": "Invalid latitude or longitude."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(PostSerializer(post, many=False).data, status=status.HTTP_201_CREATED)
+
+    def publish_batch(self, request, items):
+        if len(items) > PUBLISH_BATCH_LIMIT:
+            return Response({"detail": f"At most {PUBLISH_BATCH_LIMIT} posts can be published at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+        valid = []
+        errors = []
+        for index, item in enumerate(items):
+            serializer = PublishPostSerializer(data=item)
+            if serializer.is_valid():
+                valid.append({**serializer.validated_data, 'raw': item})
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        try:
+            posts = publish_posts(request.user, valid) if valid else []
+        except ValueError:
+            return Response({"detail": "Invalid latitude or longitude."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'posts': PostSerializer(posts, many=True).data,
+            'errors': errors,
+        }, status=status.HTTP_201_CREATED if posts else status.HTTP_400_BAD_REQUEST)
+
+
+
+
 
+from base.messaging import mark_read, message_states, record_message
+from base.realtime import publish
+from base.models import Conversation
 
 
 @permission_classes([IsAuthenticated])
@@ -225,15 +298,18 @@ class Chat(APIView):
             return Response({'detail': "Can't message yourself silly"}, status=400)
 
         # Create the message
-        message = Message.objects.create(
-            sender=sender,
-            receiver=receiver,
-            content=content
-        )
-
+        with transaction.atomic():
+            message = Message.objects.create(
+                sender=sender,
+                receiver=receiver,
+                content=content
+            )
+            record_message(message)
 
+            data = MessageSerializer(message).data
+            publish([receiver.id, sender.id], 'message', data)
 
-        return Response(MessageSerializer(message).data)
+        return Response(data)
 
 
 @permission_classes([IsAuthenticated])
@@ -243,14 +319,13 @@ class ChatList(APIView):
         user = request.user
 
         # Retrieve all messages involving the user
-        messages = Message.objects.filter(models.Q(sender=user) | models.Q(receiver=user)).order_by('-timestamp')
+        messages = Message.objects.filter(models.Q(sender=user) | models.Q(receiver=user)).select_related('sender').order_by('-timestamp')
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of posts per page
+        paginator = get_paginator(request, ordering=('-timestamp', '-id'))
         result_page = paginator.paginate_queryset(messages, request)
         
 
-        serializer = MessageSerializer(result_page, many=True)
+        serializer = MessageSerializer(result_page, many=True, context={'conversation_states': message_states(result_page)})
         return paginator.get_paginated_response(serializer.data)
 
 
@@ -285,22 +360,19 @@ class AllMessagesWithUser(APIView):
         messages = Message.objects.filter(
             (Q(sender=request.user, receiver=other_user) |
              Q(sender=other_user, receiver=request.user))
-        ).order_by('-timestamp')
+        ).select_related('sender').order_by('-timestamp')
 
-        # Update is_read only for messages where request.user is the receiver
-        for message in messages.filter(receiver=request.user):
-            message.is_read = True
-            message.save()
+        # Move the read watermark past everything request.user received from other_user
+        mark_read(request.user, other_user)
 
 
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set the number of posts per page
+        paginator = get_paginator(request, ordering=('-timestamp', '-id'))
         result_page = paginator.paginate_queryset(messages, request)
         
 
         # Serialize the messages
-        serializer = MessageSerializer(result_page, many=True)
+        serializer = MessageSerializer(result_page, many=True, context={'conversation_states': message_states(result_page)})
         return paginator.get_paginated_response(serializer.data)
 
 
@@ -312,42 +384,140 @@ class UsersEngagedInConversation(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Get a list of unique users with whom the authenticated user has exchanged messages
-        # Both as sender and receiver
-        users = CustomUser.objects.filter(
-            Q(sent_messages__receiver=request.user) |
-            Q(received_messages__sender=request.user)
-        ).distinct()
+        # The user's conversations, most recent first, straight from the Conversation index
+        conversations = (
+            Conversation.objects.filter(user=request.user)
+            .select_related('peer')
+            .prefetch_related('peer__groups', 'peer__user_permissions', 'peer__skills_offered', 'peer__skills_needed', 'peer__trade_history')
+            .order_by('-last_message_at', '-id')
+        )
+
+        paginator = get_paginator(request, ordering=('-last_message_at', '-id'))
+        result_page = paginator.paginate_queryset(conversations, request)
 
         # Serialize the users
-        serialized_users = UserSerializer(users, many=True, context={'request': request}).data
+        serialized_users = UserSerializer([conversation.peer for conversation in result_page], many=True, context={'request': request}).data
 
-        # Add unread_count and last_message_timestamp fields to each user data
-        for user_data in serialized_users:
-            user = CustomUser.objects.get(pk=user_data['id'])
+        # Add unread_count and the last message to each user data
+        for user_data, conversation in zip(serialized_users, result_page):
+            user_data['unread_count'] = conversation.unread_count
+            user_data['last_message_timestamp'] = conversation.last_message_at
+            user_data['last_message_id'] = conversation.last_message_id
+            user_data['last_message'] = conversation.preview
 
-            # Check if the last message sent between the two users had request.user as a receiver
-            last_message = Message.objects.filter(
-                Q(sender=request.user, receiver=user) | Q(sender=user, receiver=request.user)
-            ).order_by('-timestamp').first()
+        return paginator.get_paginated_response(serialized_users)
 
-            if last_message and last_message.receiver == request.user:
-                user_data['unread_count'] = Message.get_unread_count(request.user, user)
-                user_data['last_message_timestamp'] = last_message.timestamp
-            else:
-                user_data['unread_count'] = 0
-                user_data['last_message_timestamp'] = None
-
-        # Sort the list of users based on the last_message_timestamp in descending order
-        serialized_users = sorted(
-            serialized_users,
-            key=lambda x: x['last_message_timestamp'] if x['last_message_timestamp'] is not None else timezone.now(),
-            reverse=True
-        )
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from base.images import VARIANT_CACHE_CONTROL, VARIANT_PREFIX
 
-        # Apply pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10
-        result_page = paginator.paginate_queryset(serialized_users, request)
 
-        return paginator.get_paginated_response(result_page)
\ No newline at end of file
+class ServeImageVariantView(APIView):
+    # Variants are named after the content hash of their original, so they never change
+    def get(self, request, path):
+        name = VARIANT_PREFIX + path
+        if not default_storage.exists(name):
+            raise Http404
+
+        response = FileResponse(default_storage.open(name, 'rb'))
+        response['Cache-Control'] = VARIANT_CACHE_CONTROL
+        return response
+
+
+import os
+from django.http import HttpResponseRedirect
+from base.streaming import ranged_file_response
+
+
+class StreamVideoView(APIView):
+    # Seekable video playback: honours Range/If-Range and lets the server use sendfile
+    def get(self, request, pk):
+        video = get_object_or_404(Video, id=pk)
+
+        try:
+            path = video.video.path
+        except NotImplementedError:
+            # Remote storage (S3) already serves ranges itself
+            return HttpResponseRedirect(video.video.url)
+
+        if not os.path.exists(path):
+            raise Http404
+
+        return ranged_file_response(request, path)
+
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from base import direct_upload
+from base.models import UploadSession
+
+
+@permission_classes([IsAuthenticated])
+class StartUploadView(APIView):
+    # Presigned multipart upload straight to the bucket, for large albums and videos
+    def post(self, request):
+        if not direct_upload.is_enabled():
+            return Response({"detail": "Direct uploads are not configured."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        data = request.data
+        post = get_object_or_404(Post, id=data.get('post'))
+        if post.user != request.user:
+            return Response({"detail": "You are not allowed to upload to this post."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            size = int(data.get('size', 0))
+        except (TypeError, ValueError):
+            return Response({"detail": "size must be a number of bytes."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            session, urls = direct_upload.start_upload(
+                request.user,
+                post,
+                data.get('kind'),
+                str(data.get('filename', '')),
+                size,
+                str(data.get('content_type', '')),
+            )
+        except direct_upload.UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except (BotoCoreError, ClientError):
+            logger.exception('Could not start direct upload')
+            return Response({"detail": "Upload could not be started."}, status=status.HTTP_502_BAD_GATEWAY)
+
+        return Response({
+            'id': session.id,
+            'key': session.key,
+            'part_size': settings.DIRECT_UPLOAD_PART_SIZE,
+            'parts': [{'part_number': number, 'url': url} for number, url in enumerate(urls, 1)],
+        }, status=status.HTTP_201_CREATED)
+
+
+@permission_classes([IsAuthenticated])
+class CompleteUploadView(APIView):
+    def post(self, request, pk):
+        session = get_object_or_404(UploadSession, id=pk, user=request.user)
+
+        try:
+            media = direct_upload.complete_upload(session, request.data.get('parts') or [])
+        except direct_upload.UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except (BotoCoreError, ClientError):
+            logger.warning('Could not complete direct upload %s', session.key, exc_info=True)
+            return Response({"detail": "Upload could not be completed."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if isinstance(media, PostImage):
+            serializer = PostImageSerializer(media, many=False)
+        else:
+            serializer = VideoSerializer(media, many=False)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, pk):
+        session = get_object_or_404(UploadSession, id=pk, user=request.user)
+
+        try:
+            direct_upload.abort_upload(session)
+        except (BotoCoreError, ClientError):
+            logger.warning('Could not abort direct upload %s', session.key, exc_info=True)
+            session.delete()
+
+        return Response("The upload was cancelled")
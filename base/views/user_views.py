@@ -2,8 +2,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from pusher import Pusher
 from base.utils import *
+from base.geo import locate
+from Skill.ratings import rating_distribution
 from rest_framework import generics
 from ..serializers import *
 from django.db import IntegrityError
@@ -146,8 +147,9 @@ class GetUserProfile(APIView):
         user = request.user
         serializer = UserSerializer(user, many=False)
 
-
-        return Response(serializer.data)
+        data = serializer.data
+        data['rating_distribution'] = rating_distribution(user.id)
+        return Response(data)
     
 
 @permission_classes([IsAuthenticated])
@@ -186,13 +188,20 @@ class UpdateUserProfile(APIView):
         user.username = data.get('email', user.username)
         user.email = data.get('email', user.email)
         user.bio = data.get('bio', user.bio)
-        user.isPrivate = data.get('isPrivate', user.bio)
+        user.isPrivate = data.get('isPrivate', user.isPrivate)
+        user.location = data.get('location', user.location)
+
+        try:
+            locate(user, data)
+        except ValueError:
+            content = {'detail': 'Invalid latitude or longitude.'}
+            return Response(content, status=status.HTTP_400_BAD_REQUEST)
 
 
 
 
         # Save updated user profile
-        user.save()
+        user.save(update_fields=['first_name', 'username', 'email', 'bio', 'isPrivate', 'location', 'latitude', 'longitude', 'geohash', 'updated_at'])
 
         # Return updated user data
         return Response(serializer.data)
@@ -229,4 +238,53 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from rest_framework.permissions import IsAuthenticated
\ No newline at end of file
+from rest_framework.permissions import IsAuthenticated
+
+from base.messaging import message_states
+from base.sync import sync
+from Skill.serializers import TradeSerializer, QueueSerializer, ReviewSerializer
+from Skill.serializers import MessageSerializer as TradeMessageSerializer
+
+
+@permission_classes([IsAuthenticated])
+class SyncView(APIView):
+    """
+    Changes since ``?since=<token>``. Without a token, or with one that
+    expired, the response has ``reset`` set: refetch the lists, then keep
+    syncing from the returned token.
+    """
+
+    def get(self, request):
+        try:
+            changes = sync(request.user, request.query_params.get('since'))
+        except ValueError:
+            return Response({'detail': 'Invalid sync token.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if changes['reset']:
+            return Response(changes)
+
+        messages = changes['messages']
+        return Response({
+            'token': changes['token'],
+            'reset': False,
+            'has_more': changes['has_more'],
+            'trades': TradeSerializer(changes['trades'], many=True).data,
+            'queue': QueueSerializer(changes['queue'], many=True).data,
+            'trade_messages': TradeMessageSerializer(changes['trade_messages'], many=True).data,
+            'reviews': ReviewSerializer(changes['reviews'], many=True).data,
+            'messages': MessageSerializer(messages, many=True, context={'conversation_states': message_states(messages)}).data,
+            'conversations': [
+                {
+                    'user': conversation.user_id,
+                    'peer': conversation.peer_id,
+                    'last_message_id': conversation.last_message_id,
+                    'last_message_timestamp': conversation.last_message_at,
+                    'last_message': conversation.preview,
+                    'unread_count': conversation.unread_count,
+                    'last_read_message_id': conversation.last_read_message_id,
+                }
+                for conversation in changes['conversations']
+            ],
+            'profile': UserSerializer(changes['profile'], many=False).data if changes['profile'] else None,
+            'deleted': changes['deleted'],
+        })
@@ -13,4 +13,20 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'projectx.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from base.realtime import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # WebSocket push channel next to the regular Django app, see base.realtime
+    if scope['type'] == 'websocket':
+        if scope['path'] == settings.REALTIME_WEBSOCKET_PATH:
+            await websocket_application(scope, receive, send)
+        else:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    await django_application(scope, receive, send)
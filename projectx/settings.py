@@ -50,7 +50,12 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'base.uploads.UploadLimitMultiPartParser',
+    ),
 }
 
 
@@ -145,6 +150,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Transactions take the write lock when they begin and wait for it
+        # instead of failing with "database is locked" when they try to write;
+        # WAL lets reads carry on while a write is in progress
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
     }
 }
 
@@ -205,3 +218,63 @@ CORS_ALLOW_ALL_ORIGINS = True
 APPEND_SLASH = False
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Home feed: timelines are capped at TIMELINE_MAX_LENGTH entries, and authors with
+# more than TIMELINE_FANOUT_LIMIT followers are pulled on read instead of fanned out
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_FANOUT_LIMIT = 10000
+
+# Seconds before a process rebuilds its in-memory skill autocomplete index
+SKILL_INDEX_TTL = 300
+
+# Geocoding for free-text locations; results are cached in base.GeocodeCache
+GEOCODER = 'base.geo.google_geocode'
+GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY', '')
+# Threads per process that geocode saved locations; 0 geocodes inline on commit
+GEOCODER_WORKERS = 2
+
+# Threads per process that build resized image variants in the background;
+# 0 builds them inline when the request's transaction commits
+IMAGE_VARIANT_WORKERS = 2
+
+# Media uploads are hashed while streamed to disk and cut off past MAX_UPLOAD_SIZE bytes
+MAX_UPLOAD_SIZE = 419430400
+FILE_UPLOAD_HANDLERS = ['base.uploads.ContentAddressedUploadHandler']
+
+# Post media goes to S3 (or an S3-compatible endpoint such as MinIO) when a bucket
+# is configured; clients then upload to it directly with presigned multipart URLs
+AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME', '')
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL') or None
+AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME') or None
+AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID') or None
+AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY') or None
+DIRECT_UPLOAD_PART_SIZE = 16 * 1024 * 1024
+DIRECT_UPLOAD_URL_EXPIRY = 3600
+
+# Realtime push channel (base.realtime): the in-process broker only reaches
+# connections of the same ASGI process; multi-process deployments swap in a shared one
+REALTIME_BROKER = 'base.realtime.InProcessBroker'
+REALTIME_WEBSOCKET_PATH = '/ws/events/'
+
+# Delta sync (base.sync): deletions are remembered this long; older tokens are reset
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# Trade partner matchmaking (Skill.matchmaking): stored partners per user, and
+# seconds before a process reloads its skill bit matrices
+TRADE_MATCHES_PER_USER = 50
+MATCH_INDEX_TTL = 600
+
+# Multi-party barter cycles (Skill.barter): cycles kept per user, and seconds
+# before a user's stored cycles are searched again
+BARTER_CYCLES_PER_USER = 20
+BARTER_CYCLE_TTL = 24 * 60 * 60
+
+# Rating aggregates (Skill.ratings): the Bayesian score treats every user as
+# having RATING_PRIOR_WEIGHT extra reviews of RATING_PRIOR_MEAN stars
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5
+
+# Applicant fit scores (Skill.fit): weights of the skill, rating and proximity
+# parts, and the distance in km at which proximity counts half
+QUEUE_FIT_WEIGHTS = {'skills': 0.5, 'rating': 0.3, 'proximity': 0.2}
+QUEUE_FIT_PROXIMITY_KM = 25
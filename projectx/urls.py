@@ -5,12 +5,14 @@ from django.urls import path, include
 
 
 from .views import redirect_to_home  # Import your redirect view
+from base.views.post_views import ServeImageVariantView
 
 urlpatterns = [
     path('', TemplateView.as_view(template_name='index.html')),
     path('admin/', admin.site.urls),
     path('api/v1/', include('base.urls')),
     path('api/v2/', include('Skill.urls')),
+    re_path(r'^images/variants/(?P<path>[0-9a-f]{2}/[0-9a-f]{64}-\w+\.\w+)$', ServeImageVariantView.as_view(), name='image-variant'),
 
     # Add other app-specific routes here
 ]